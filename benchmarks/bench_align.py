@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Weather-to-timestamp alignment for the solar features.
+
+Aligns an hourly weather forecast (clouds, temp, wind) to forecast steps at
+15-minute resolution for horizons from a day to a week, and to 14 days of
+production steps for the training join. Compares:
+
+    argsort loop    the original per-step ``(df["datetime"] - t).abs().argsort()[:1]``
+    broadcast       a (targets x rows) distance matrix and ``argmin``
+    merge_asof      pandas' nearest-row join, as the training join used
+    align           ``align.align`` (one ``searchsorted``, linear interpolation)
+
+    python3 benchmarks/bench_align.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from align import align_frame  # noqa: E402
+from features import to_ns  # noqa: E402
+
+COLUMNS = ["clouds", "temp", "wind"]
+RESOLUTION = 15
+HORIZONS = (24, 72, 168)
+TRAINING_DAYS = 14
+TOLERANCE = pd.Timedelta("4h")
+
+
+def weather(start, hours, seed=3):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({"datetime": pd.date_range(start, periods=hours, freq="h", tz="UTC")})
+    for name in COLUMNS:
+        frame[name] = rng.random(hours) * 100
+    return frame
+
+
+def argsort_loop(targets, frame):
+    rows = [frame.iloc[(frame["datetime"] - t).abs().argsort()[:1]] for t in targets]
+    return {name: np.array([row[name].iloc[0] for row in rows]) for name in COLUMNS}
+
+
+def broadcast(targets, frame):
+    nearest = np.abs(to_ns(frame["datetime"])[None, :] - to_ns(targets)[:, None]).argmin(axis=1)
+    return {name: frame[name].to_numpy()[nearest] for name in COLUMNS}
+
+
+def merge_asof(targets, frame):
+    merged = pd.merge_asof(pd.DataFrame({"datetime": targets}), frame, on="datetime",
+                           direction="nearest", tolerance=TOLERANCE)
+    return {name: merged[name].to_numpy() for name in COLUMNS}
+
+
+def aligned(targets, frame):
+    return align_frame(targets, frame, COLUMNS, TOLERANCE)
+
+
+def best_of(fn, *args, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'case':<26} {'targets':>8} {'argsort loop':>13} {'broadcast':>11} {'merge_asof':>11} {'align':>9}")
+    forecast = weather("2024-06-01", 16 * 24)
+    for hours in HORIZONS:
+        targets = pd.date_range("2024-06-01", periods=hours * 60 // RESOLUTION, freq=f"{RESOLUTION}min", tz="UTC")
+        timings = [best_of(fn, targets, forecast, rounds=3 if fn is argsort_loop else 20)
+                   for fn in (argsort_loop, broadcast, merge_asof, aligned)]
+        print(f"{f'forecast, {hours}h':<26} {len(targets):>8} "
+              + " ".join(f"{t * 1e3:{w}.2f}ms" for t, w in zip(timings, (11, 9, 9, 7))))
+
+    # Training join: every production step of the training window against the past weather
+    past = weather("2024-05-18", TRAINING_DAYS * 24)
+    targets = pd.date_range("2024-05-18", periods=TRAINING_DAYS * 24 * 60 // RESOLUTION,
+                            freq=f"{RESOLUTION}min", tz="UTC")
+    timings = [best_of(fn, targets, past, rounds=20) for fn in (broadcast, merge_asof, aligned)]
+    print(f"{f'training join, {TRAINING_DAYS}d':<26} {len(targets):>8} {'-':>13} "
+          + " ".join(f"{t * 1e3:{w}.2f}ms" for t, w in zip(timings, (9, 9, 7))))
+
+
+if __name__ == "__main__":
+    main()
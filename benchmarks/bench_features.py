@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Feature construction: previous per-row/pandas code vs. bin/features.py.
+
+    training   calendar + lag + rolling columns for years of hourly data
+               (pandas shift/rolling as train_model.py did, vs. build_matrix)
+    inference  the 24 recursive steps of prediction.py, feature building only
+               (a dict and a DataFrame per hour, vs. recursive_forecast); the
+               model is a stub so predict() time is excluded from both
+    calendar   calendar_features on a fresh range vs. a memoized one
+
+    python3 benchmarks/bench_features.py
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+import features  # noqa: E402
+
+YEARS = 5
+ROUNDS = 5
+
+
+class StubModel:
+    def predict(self, X):
+        return np.zeros(len(X))
+
+
+def best(fn, rounds=ROUNDS):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# ---------------- Previous Code ----------------
+def pandas_training(times, values):
+    data = pd.DataFrame({"datetime": times, "consumption_kwh": values})
+    data['hour'] = data['datetime'].dt.hour
+    data['day_of_week'] = data['datetime'].dt.dayofweek
+    data['day'] = data['datetime'].dt.day
+    data['month'] = data['datetime'].dt.month
+    data['year'] = data['datetime'].dt.year
+    data['is_weekend'] = data['day_of_week'].isin([5, 6]).astype(int)
+    data['lag_1h'] = data['consumption_kwh'].shift(1)
+    data['lag_2h'] = data['consumption_kwh'].shift(2)
+    data['lag_3h'] = data['consumption_kwh'].shift(3)
+    data['lag_24h'] = data['consumption_kwh'].shift(24)
+    data['rolling_mean_3h'] = data['consumption_kwh'].shift(1).rolling(3).mean()
+    data['rolling_mean_6h'] = data['consumption_kwh'].shift(1).rolling(6).mean()
+    data = data.dropna()
+    return data[features.feature_names(features.CONSUMPTION_SPEC)], data['consumption_kwh']
+
+
+def per_row_inference(model, history, hours):
+    prediction_data = pd.DataFrame({
+        'datetime': hours,
+        'hour': [dt.hour for dt in hours],
+        'day_of_week': [dt.weekday() for dt in hours],
+        'day': [dt.day for dt in hours],
+        'month': [dt.month for dt in hours],
+        'year': [dt.year for dt in hours],
+        'is_weekend': [1 if dt.weekday() >= 5 else 0 for dt in hours],
+    })
+    last_1h, last_2h, last_3h, lag_24h = history[-1], history[-2], history[-3], history[-24]
+    predictions = []
+    for i in range(24):
+        row = prediction_data.iloc[i]
+        row_data = {
+            'hour': row['hour'], 'day_of_week': row['day_of_week'], 'day': row['day'],
+            'month': row['month'], 'year': row['year'], 'is_weekend': row['is_weekend'],
+            'lag_1h': last_1h, 'lag_2h': last_2h, 'lag_3h': last_3h, 'lag_24h': lag_24h,
+            'rolling_mean_3h': np.mean([last_1h, last_2h, last_3h]),
+            'rolling_mean_6h': np.mean([last_1h, last_2h, last_3h, lag_24h, lag_24h, lag_24h]),
+        }
+        pred = model.predict(pd.DataFrame([row_data]))[0]
+        predictions.append(pred)
+        last_3h, last_2h, last_1h = last_2h, last_1h, pred
+    return predictions
+
+
+# ---------------- Benchmark ----------------
+def main():
+    spec = features.CONSUMPTION_SPEC
+    times = pd.date_range("2020-01-01", periods=YEARS * 8760, freq="h", tz="UTC")
+    values = np.random.default_rng(42).gamma(2.0, 0.3, len(times)).astype(np.float32)
+
+    def vectorized_training():
+        X = features.build_matrix(spec, times, values)
+        keep = features.complete_rows(X, values)
+        return X[keep], values[keep]
+
+    features._CALENDAR_CACHE.clear()
+    old_train = best(lambda: pandas_training(times, values))
+    new_train = best(lambda: (features._CALENDAR_CACHE.clear(), vectorized_training()))
+
+    model = StubModel()
+    history = values[-48:]
+    start = datetime(2026, 1, 1)
+    hours = [start + timedelta(hours=i) for i in range(24)]
+    old_infer = best(lambda: per_row_inference(model, history, hours), 20)
+    new_infer = best(lambda: (features._CALENDAR_CACHE.clear(),
+                              features.recursive_forecast(model, spec, history, hours)), 20)
+
+    features._CALENDAR_CACHE.clear()
+    cold = best(lambda: (features._CALENDAR_CACHE.clear(), features.calendar_features(times)))
+    warm = best(lambda: features.calendar_features(times))
+
+    print(f"training features, {len(times)} hourly rows:")
+    print(f"  pandas shift/rolling     {old_train * 1e3:9.1f} ms")
+    print(f"  build_matrix             {new_train * 1e3:9.1f} ms  ({old_train / new_train:.1f}x)")
+    print("inference features, 24 recursive steps:")
+    print(f"  dict + DataFrame per row {old_infer * 1e3:9.2f} ms")
+    print(f"  recursive_forecast       {new_infer * 1e3:9.2f} ms  ({old_infer / new_infer:.0f}x)")
+    print(f"calendar features, {len(times)} rows:")
+    print(f"  computed                 {cold * 1e3:9.2f} ms")
+    print(f"  memoized                 {warm * 1e3:9.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Fleet throughput by number of worker processes.
+
+Every synthetic site trains the default forest on 180 days of its own
+hourly consumption and forecasts the next 24 hours from the packed artifact,
+the work fleet.py does per site minus the InfluxDB round trips. Sites run
+through ``fleet.run_pool`` with 1, 2, 4 ... workers up to the CPU count;
+"speedup" is relative to one worker, so linear scaling shows as
+speedup == workers. "import" is what a fresh interpreter per site would
+pay on top just to import scikit-learn, which the reused workers avoid.
+
+    python3 benchmarks/bench_fleet.py [--sites 32]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin")
+sys.path.insert(0, BIN)
+
+import features  # noqa: E402
+from fleet import run_pool  # noqa: E402
+from forecaster import ForecastModel, forecast_times  # noqa: E402
+from model_artifact import store_model  # noqa: E402
+from model_backends import make_model  # noqa: E402
+
+DAYS = 180
+
+
+def synthetic_site(seed):
+    rng = np.random.default_rng(seed)
+    hours = DAYS * 24
+    t = np.arange(hours)
+    base = rng.uniform(0.2, 0.5)
+    evening = rng.uniform(0.2, 0.6) * np.exp(-((t % 24 - rng.uniform(17, 21)) ** 2) / 8)
+    weekend = np.where((t // 24) % 7 >= 5, rng.uniform(1.0, 1.3), 1.0)
+    return (base + evening) * weekend + rng.gamma(2.0, 0.04, hours)
+
+
+def run_site(seed):
+    start = time.perf_counter()
+    spec = features.CONSUMPTION_SPEC
+    values = synthetic_site(seed)
+    times = pd.date_range("2024-01-01", periods=len(values), freq="h", tz="UTC")
+    X = features.build_matrix(spec, times, values)
+    keep = features.complete_rows(X, values)
+    model = make_model("rf", spec, n_jobs=1).fit(X[keep], values[keep])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "energy_model.pkl")
+        store_model(model, path, {"feature_spec": spec, "forecast_mode": "recursive"})
+        forecaster = ForecastModel(path, log=lambda message: None).load()
+        future = forecast_times(times[-1].to_pydatetime().replace(tzinfo=None), 24)
+        forecaster.forecast(values[-forecaster.history_needed:], future)
+    return time.perf_counter() - start
+
+
+def import_seconds():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import model_backends, model_artifact"], cwd=BIN, check=True)
+    return time.perf_counter() - start
+
+
+def main(sites):
+    cpus = os.cpu_count() or 1
+    counts = sorted({1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus} | {cpus})
+    print(f"{sites} sites, {cpus} CPUs, fresh interpreter import {import_seconds() * 1e3:.0f}ms per site")
+    print(f"{'workers':>7} {'wall':>8} {'per site':>9} {'sites/min':>10} {'speedup':>8}")
+    baseline = None
+    for workers in counts:
+        start = time.perf_counter()
+        seconds = list(run_pool(run_site, list(range(sites)), workers))
+        wall = time.perf_counter() - start
+        baseline = baseline or wall
+        print(f"{workers:>7} {wall:7.1f}s {np.mean(seconds):8.2f}s {sites / wall * 60:10.0f} {baseline / wall:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=32)
+    main(parser.parse_args().sites)
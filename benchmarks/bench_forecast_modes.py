@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Recursive vs. direct multi-horizon forecasting: latency and accuracy.
+
+Both modes train the same backend on two years of synthetic hourly
+consumption and forecast the next 24 hours from every midnight of the
+following eight weeks (as prediction.py does):
+
+    recursive  24 single-row predict calls, each prediction fed back as a lag
+    direct     one multi-output model, one predict call for all 24 hours
+
+    python3 benchmarks/bench_forecast_modes.py [backend ...]    # default: rf hgb
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+import features  # noqa: E402
+from bench_model_backends import TEST_HOURS, TRAIN_HOURS, synthetic_consumption  # noqa: E402
+from model_artifact import is_forest, pack_forest  # noqa: E402
+from model_backends import make_model  # noqa: E402
+
+HORIZON = 24
+
+
+def evaluate(model, spec, mode, values, times, origins):
+    need = features.history_needed(spec)
+    errors, latencies = [], []
+    for origin in origins:
+        history, future = values[origin - need:origin], times[origin:origin + HORIZON]
+        start = time.perf_counter()
+        forecast = features.forecast(model, spec, history, future, mode)
+        latencies.append(time.perf_counter() - start)
+        errors.append(np.abs(forecast - values[origin:origin + HORIZON]))
+    errors = np.asarray(errors)
+    return np.median(latencies), errors.mean(), errors.mean(axis=0)
+
+
+def main(backends):
+    spec = features.CONSUMPTION_SPEC
+    times = pd.date_range("2023-01-01", periods=TRAIN_HOURS + TEST_HOURS, freq="h", tz="UTC")
+    values = synthetic_consumption(len(times))
+    X = features.build_matrix(spec, times, values)
+    origins = [i for i in range(TRAIN_HOURS, len(values) - HORIZON) if times[i].hour == 0]
+
+    print(f"{'model':>14} {'mode':>10} {'fit':>8} {'latency':>9} {'MAE':>7} {'MAE h1':>7} {'MAE h24':>7}")
+    for backend in backends:
+        for mode in ("recursive", "direct"):
+            y = values if mode == "recursive" else features.direct_targets(values, HORIZON)
+            train = features.complete_rows(X, y) & (np.arange(len(values)) < TRAIN_HOURS - HORIZON + 1)
+            model = make_model(backend, spec, outputs=1 if mode == "recursive" else HORIZON)
+            start = time.perf_counter()
+            model.fit(X[train], y[train])
+            fit = time.perf_counter() - start
+            variants = [(backend, model)]
+            if is_forest(model):
+                variants.append((f"{backend} packed", pack_forest(model)))
+            for name, fitted in variants:
+                latency, mae, by_horizon = evaluate(fitted, spec, mode, values, times, origins)
+                print(f"{name:>14} {mode:>10} {fit:7.1f}s {latency * 1e3:7.1f}ms "
+                      f"{mae:7.4f} {by_horizon[0]:7.4f} {by_horizon[-1]:7.4f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["rf", "hgb"])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Forecast latency by horizon and resolution.
+
+Trains the default forest on 180 days of synthetic consumption sampled at
+each resolution, then times recursive forecasts over 24h, 48h and one week
+as prediction.py and the forecast service run them, for the scikit-learn
+forest and the packed artifact. "calls" is the number of predict calls: at
+sub-hourly resolution every feature looks at least an hour back, so one call
+covers a whole hour of steps.
+
+    python3 benchmarks/bench_forecast_resolution.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+import features  # noqa: E402
+from model_artifact import load_model, save_model  # noqa: E402
+from model_backends import make_model  # noqa: E402
+
+DAYS = 180
+RESOLUTIONS = (60, 15)
+HORIZONS = (24, 48, 168)
+ROUNDS = 5
+
+
+def synthetic_consumption(steps, per_hour, seed=42):
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps) / per_hour
+    hour, day = t % 24, (t // 24) % 7
+    daily = 0.25 + 0.35 * np.exp(-((hour - 19) ** 2) / 8) + 0.2 * np.exp(-((hour - 8) ** 2) / 4)
+    weekly = np.where(day >= 5, 1.15, 1.0)
+    return daily * weekly + rng.gamma(2.0, 0.04, steps)
+
+
+def main():
+    print(f"{'resolution':>10} {'horizon':>8} {'steps':>6} {'calls':>6} {'sklearn':>10} {'packed':>10}")
+    for minutes in RESOLUTIONS:
+        spec = features.with_resolution(features.CONSUMPTION_SPEC, minutes)
+        per_hour = features.steps_per_hour(spec)
+        steps = DAYS * 24 * per_hour
+        times = pd.date_range("2024-01-01", periods=steps, freq=f"{minutes}min", tz="UTC")
+        values = synthetic_consumption(steps, per_hour)
+        X = features.build_matrix(spec, times, values)
+        keep = features.complete_rows(X, values)
+        model = make_model("rf", spec).fit(X[keep], values[keep])
+        with tempfile.TemporaryDirectory() as tmp:
+            packed, _ = load_model(save_model(model, os.path.join(tmp, "model.pkl")))
+
+            need = features.history_needed(spec)
+            history = values[-need:]
+            for hours in HORIZONS:
+                future = times[-1] + pd.to_timedelta(np.arange(1, hours * per_hour + 1) * minutes, unit="min")
+                latencies = {}
+                for name, forecaster in (("sklearn", model), ("packed", packed)):
+                    best = float("inf")
+                    for _ in range(ROUNDS):
+                        start = time.perf_counter()
+                        features.recursive_forecast(forecaster, spec, history, future)
+                        best = min(best, time.perf_counter() - start)
+                    latencies[name] = best
+                print(f"{minutes:>8}min {hours:>7}h {len(future):>6} {len(future) // per_hour:>6} "
+                      f"{latencies['sklearn'] * 1e3:8.1f}ms {latencies['packed'] * 1e3:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Writing a week of hourly forecast points: one request per point versus one batch.
+
+A local HTTP/1.1 server stands in for InfluxDB's /api/v2/write endpoint and
+counts requests, lines and newly opened TCP connections. "per point" calls
+``write_api.write`` once per Point, as prediction.py and the solar scripts
+did; "batched" is ``InfluxDB.write_points``. Both go through the same pooled
+client, so the difference is the per-request cost alone. ``--latency-ms``
+adds a server-side delay per request to mimic a slower InfluxDB host.
+
+    python3 benchmarks/bench_influx_writes.py [--latency-ms 2]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from influx_db import InfluxConfig, InfluxDB  # noqa: E402
+from forecaster import prediction_points  # noqa: E402
+
+POINTS = 168
+ROUNDS = 5
+
+
+class Counts:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = self.lines = self.connections = 0
+
+    def reset(self):
+        with self.lock:
+            self.requests = self.lines = self.connections = 0
+
+
+def stand_in_server(counts, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with counts.lock:
+                counts.connections += 1
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if latency:
+                time.sleep(latency)
+            with counts.lock:
+                counts.requests += 1
+                counts.lines += body.count(b"\n") + 1
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(latency_ms):
+    counts = Counts()
+    server = stand_in_server(counts, latency_ms / 1000)
+    influx = InfluxDB(InfluxConfig(f"http://127.0.0.1:{server.server_port}", "bench", "bench", "bench"))
+
+    start = datetime(2024, 6, 1)
+    times = [start + timedelta(hours=i) for i in range(POINTS)]
+    points = prediction_points(times, [0.5 + 0.01 * i for i in range(POINTS)])
+
+    def per_point():
+        for point in points:
+            influx.write_api.write(bucket=influx.bucket, org=influx.org, record=point)
+
+    def batched():
+        influx.write_points(points)
+
+    print(f"{POINTS} points, {latency_ms:g} ms server latency per request")
+    print(f"{'path':>10} {'time':>9} {'requests':>9} {'lines':>6} {'new conns':>10}")
+    results = {}
+    for name, fn in (("per point", per_point), ("batched", batched)):
+        fn()  # warm up the connection pool
+        best = float("inf")
+        for _ in range(ROUNDS):
+            counts.reset()
+            began = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - began)
+        results[name] = best
+        print(f"{name:>10} {best * 1e3:7.1f}ms {counts.requests:>9} {counts.lines:>6} {counts.connections:>10}")
+    print(f"batched is {results['per point'] / results['batched']:.0f}x faster")
+
+    influx.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    main(parser.parse_args().latency_ms)
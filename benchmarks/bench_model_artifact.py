@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Size and cold load time: joblib pickle vs. the packed .model artifact.
+
+Trains the default 100-tree forest on three years of synthetic hourly
+consumption, saves it in every format, then loads each file in a fresh
+Python process (as the daily prediction.py run does) and times the load
+and one 24-row predict. "drift" is the mean absolute difference from the
+original forest's predictions on held-out rows.
+
+    python3 benchmarks/bench_model_artifact.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin")
+sys.path.insert(0, BIN)
+
+import features  # noqa: E402
+from bench_model_backends import synthetic_consumption  # noqa: E402
+from model_artifact import save_model  # noqa: E402
+from model_backends import make_model  # noqa: E402
+
+HOURS = 3 * 365 * 24
+ROUNDS = 3
+
+VARIANTS = [
+    ("joblib", {}),
+    ("joblib compress=3", {"compress": 3}),
+    ("packed", {}),
+    ("packed zlib", {"compression": "zlib"}),
+    ("packed lzma", {"compression": "lzma"}),
+    ("packed max_depth=14", {"max_depth": 14}),
+    ("packed max_leaf_nodes=2048", {"max_leaf_nodes": 2048}),
+]
+
+CHILD = """
+import sys, time, json
+sys.path.insert(0, {bin!r})
+import numpy as np
+X = np.load({rows!r})
+start = time.perf_counter()
+if {joblib!r}:
+    import joblib
+    model = joblib.load({path!r})
+else:
+    from model_artifact import load_model
+    model, header = load_model({path!r})
+loaded = time.perf_counter()
+pred = model.predict(X)
+done = time.perf_counter()
+np.save({out!r}, pred)
+print(json.dumps({{"load": loaded - start, "predict": done - loaded}}))
+"""
+
+
+def cold_load(path, rows_path, out_path, is_joblib):
+    code = CHILD.format(bin=BIN, rows=rows_path, joblib=is_joblib, path=path, out=out_path)
+    best = None
+    for _ in range(ROUNDS):
+        result = json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True,
+                                           check=True, text=True).stdout)
+        if best is None or result["load"] < best["load"]:
+            best = result
+    return best
+
+
+def main():
+    spec = features.CONSUMPTION_SPEC
+    times = pd.date_range("2022-01-01", periods=HOURS, freq="h", tz="UTC")
+    values = synthetic_consumption(HOURS)
+    X = features.build_matrix(spec, times, values)
+    keep = features.complete_rows(X, values)
+    X, y = X[keep], values[keep]
+
+    start = time.perf_counter()
+    model = make_model("rf", spec).fit(X[:-24], y[:-24])
+    print(f"trained 100 trees on {len(y) - 24} rows in {time.perf_counter() - start:.1f}s")
+    rows = X[-24:]
+    reference = model.predict(rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows_path = os.path.join(tmp, "rows.npy")
+        out_path = os.path.join(tmp, "pred.npy")
+        np.save(rows_path, rows)
+        print(f"{'format':>28} {'size':>10} {'load':>9} {'predict':>9} {'drift':>9}")
+        for name, options in VARIANTS:
+            model_path = os.path.join(tmp, name.replace(" ", "_") + ".pkl")
+            is_joblib = name.startswith("joblib")
+            if is_joblib:
+                joblib.dump(model, model_path, **options)
+                path = model_path
+            else:
+                path = save_model(model, model_path, {"feature_spec": spec}, **options)
+            result = cold_load(model_path, rows_path, out_path, is_joblib)
+            drift = np.mean(np.abs(np.load(out_path) - reference))
+            print(f"{name:>28} {os.path.getsize(path) / 2**20:8.1f}MB {result['load'] * 1e3:7.0f}ms "
+                  f"{result['predict'] * 1e3:7.1f}ms {drift:9.5f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Fit time, prediction latency, artifact size and accuracy per model backend.
+
+All backends train on the same synthetic two years of hourly consumption
+(daily and weekly pattern, seasonal drift, noise) and are scored on the
+following eight weeks:
+
+    fit         seconds to fit on the training split
+    24-step     latency of one recursive 24-hour forecast (as prediction.py)
+    artifact    size of the joblib pickle
+    MAE 1h      one-step-ahead error with observed lags
+    MAE 24h     error of recursive day-ahead forecasts from each midnight
+
+    python3 benchmarks/bench_model_backends.py [backend ...]
+"""
+
+import io
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+import features  # noqa: E402
+from model_backends import BACKENDS, make_model  # noqa: E402
+
+TRAIN_HOURS = 2 * 365 * 24
+TEST_HOURS = 8 * 7 * 24
+LATENCY_ROUNDS = 20
+
+
+def synthetic_consumption(hours, seed=42):
+    rng = np.random.default_rng(seed)
+    t = np.arange(hours)
+    hour, day = t % 24, (t // 24) % 7
+    daily = 0.25 + 0.35 * np.exp(-((hour - 19) ** 2) / 8) + 0.2 * np.exp(-((hour - 8) ** 2) / 4)
+    weekly = np.where(day >= 5, 1.15, 1.0)
+    seasonal = 1.0 + 0.25 * np.cos(2 * np.pi * t / (365 * 24))
+    return (daily * weekly * seasonal + rng.gamma(2.0, 0.04, hours)).astype(np.float64)
+
+
+def main(names):
+    spec = features.CONSUMPTION_SPEC
+    times = pd.date_range("2023-01-01", periods=TRAIN_HOURS + TEST_HOURS, freq="h", tz="UTC")
+    values = synthetic_consumption(len(times))
+    X = features.build_matrix(spec, times, values)
+    keep = features.complete_rows(X, values)
+    train = keep & (np.arange(len(values)) < TRAIN_HOURS)
+    test = keep & ~train
+
+    origins = [i for i in range(TRAIN_HOURS, len(values) - 24) if times[i].hour == 0]
+    need = features.history_needed(spec)
+
+    print(f"{'backend':>15} {'fit':>8} {'24-step':>9} {'artifact':>10} {'MAE 1h':>8} {'MAE 24h':>8}")
+    for name in names:
+        model = make_model(name, spec)
+        start = time.perf_counter()
+        model.fit(X[train], values[train])
+        fit = time.perf_counter() - start
+
+        mae_1h = np.mean(np.abs(model.predict(X[test]) - values[test]))
+        errors = []
+        for origin in origins:
+            forecast = features.recursive_forecast(model, spec, values[origin - need:origin],
+                                                   times[origin:origin + 24])
+            errors.append(np.abs(forecast - values[origin:origin + 24]))
+        mae_24h = np.mean(errors)
+
+        origin = origins[0]
+        history, future = values[origin - need:origin], times[origin:origin + 24]
+        latencies = []
+        for _ in range(LATENCY_ROUNDS):
+            start = time.perf_counter()
+            features.recursive_forecast(model, spec, history, future)
+            latencies.append(time.perf_counter() - start)
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        print(f"{name:>15} {fit:7.2f}s {min(latencies) * 1e3:7.1f}ms "
+              f"{buffer.tell() / 1024:8.0f}KB {mae_1h:8.4f} {mae_24h:8.4f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or list(BACKENDS))
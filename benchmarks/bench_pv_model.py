@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""PV physics model over a full year of 15-minute steps.
+
+Times each stage of ``pv_model.power`` on the 35 136 timestamps of 2024,
+with synthetic weather (radiation from the clear sky and random cloud
+cover), then the whole call with and without forecast radiation. The last
+line compares the year's energy with the previous
+``radiation * PANEL_AREA * EFFICIENCY`` estimate of
+``get_solar_prediction.py`` for the same weather.
+
+    python3 benchmarks/bench_pv_model.py [--tilt 35] [--azimuth 180]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from pv_model import (PVSystem, cell_temperature, clear_sky, cloudy_ghi, decompose, extraterrestrial,  # noqa: E402
+                      plane_of_array, power, solar_position)
+
+LAT, LON = 50.883785, 3.424479
+PANEL_AREA, EFFICIENCY = 10.0, 0.2
+ROUNDS = 10
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(tilt, azimuth):
+    rng = np.random.default_rng(5)
+    times = pd.date_range("2024-01-01", "2025-01-01", freq="15min", tz="UTC", inclusive="left")
+    ns = times.values.astype("datetime64[ns]").astype("int64")
+    system = PVSystem(tilt=tilt, azimuth=azimuth, peak_kw=PANEL_AREA * EFFICIENCY)
+    clouds = np.clip(rng.normal(60, 35, len(ns)), 0, 100)
+    temp = 10 + 10 * rng.random(len(ns))
+    wind = rng.gamma(2, 1.5, len(ns))
+
+    print(f"{len(ns)} steps (one year at 15 minutes), tilt {tilt}, azimuth {azimuth}")
+    elapsed, (zenith, sun_azimuth) = best_of(solar_position, ns, LAT, LON)
+    print(f"{'solar_position':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, e0 = best_of(extraterrestrial, ns)
+    print(f"{'extraterrestrial':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, (clear_ghi, _, _) = best_of(clear_sky, zenith, e0)
+    print(f"{'clear_sky':<22} {elapsed * 1e3:7.2f}ms")
+    ghi = cloudy_ghi(clear_ghi, clouds)
+    elapsed, (dni, dhi) = best_of(decompose, ghi, zenith, e0)
+    print(f"{'decompose':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, poa = best_of(plane_of_array, ghi, dni, dhi, zenith, sun_azimuth, tilt, azimuth)
+    print(f"{'plane_of_array':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, _ = best_of(cell_temperature, poa, temp, wind)
+    print(f"{'cell_temperature':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, kw = best_of(power, system, ns, LAT, LON, ghi, temp, wind)
+    print(f"{'power (radiation)':<22} {elapsed * 1e3:7.2f}ms")
+    elapsed, _ = best_of(power, system, ns, LAT, LON, None, temp, wind, clouds)
+    print(f"{'power (clouds only)':<22} {elapsed * 1e3:7.2f}ms")
+
+    previous = ghi * PANEL_AREA * EFFICIENCY / 1000
+    print(f"year's energy: {kw.sum() / 4:.0f} kWh with the PV model, {previous.sum() / 4:.0f} kWh with "
+          f"radiation * PANEL_AREA * EFFICIENCY")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tilt", type=float, default=35.0)
+    parser.add_argument("--azimuth", type=float, default=180.0)
+    args = parser.parse_args()
+    main(args.tilt, args.azimuth)
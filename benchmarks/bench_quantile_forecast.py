@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Overhead of P10/P50/P90 bands over the point forecast.
+
+Trains the default forest on two years of synthetic hourly consumption
+(the data of bench_model_backends.py) and times recursive forecasts from
+the packed artifact, with and without quantiles, next to a Python loop
+over the scikit-learn trees. "coverage" is the share of actual values
+inside the P10-P90 band over eight weeks of day-ahead forecasts.
+
+    python3 benchmarks/bench_quantile_forecast.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+import features  # noqa: E402
+from bench_model_backends import TEST_HOURS, TRAIN_HOURS, synthetic_consumption  # noqa: E402
+from model_artifact import load_model, save_model  # noqa: E402
+from model_backends import make_model  # noqa: E402
+
+QUANTILES = [0.1, 0.5, 0.9]
+HORIZONS = (24, 168)
+ROUNDS = 20
+
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def tree_loop_forecast(model, spec, history, future_times):
+    """Quantiles by predicting every tree separately at every step."""
+    calendar = features.calendar_features(future_times, spec["calendar"])
+    buffer = list(history)
+    bands = []
+    for i in range(len(future_times)):
+        lags = [buffer[-lag] for lag in spec["lags"]] + [np.mean(buffer[-w:]) for w in spec["rolling_means"]]
+        row = np.concatenate([calendar[i], lags]).astype(np.float32)[None, :]
+        trees = np.array([tree.predict(row)[0] for tree in model.estimators_])
+        buffer.append(trees.mean())
+        bands.append(np.quantile(trees, QUANTILES))
+    return np.asarray(buffer[len(history):]), np.asarray(bands).T
+
+
+def main():
+    spec = features.CONSUMPTION_SPEC
+    times = pd.date_range("2023-01-01", periods=TRAIN_HOURS + TEST_HOURS, freq="h", tz="UTC")
+    values = synthetic_consumption(len(times))
+    X = features.build_matrix(spec, times, values)
+    keep = features.complete_rows(X, values)
+    train = keep & (np.arange(len(values)) < TRAIN_HOURS)
+    model = make_model("rf", spec).fit(X[train], values[train])
+    need = features.history_needed(spec)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        packed, _ = load_model(save_model(model, os.path.join(tmp, "model.pkl")))
+
+        print(f"{'horizon':>8} {'point':>9} {'quantiles':>10} {'overhead':>9} {'tree loop':>10}")
+        origin = TRAIN_HOURS
+        history = values[origin - need:origin]
+        for hours in HORIZONS:
+            future = times[origin:origin + hours]
+            point = best_of(lambda: features.recursive_forecast(packed, spec, history, future))
+            bands = best_of(lambda: features.recursive_forecast(packed, spec, history, future,
+                                                                quantiles=QUANTILES))
+            loop = best_of(lambda: tree_loop_forecast(model, spec, history, future)) if hours == 24 else None
+            loop_text = f"{loop * 1e3:8.1f}ms" if loop is not None else f"{'-':>10}"
+            print(f"{hours:>7}h {point * 1e3:7.1f}ms {bands * 1e3:8.1f}ms {bands / point - 1:8.0%} {loop_text}")
+
+        inside = total = 0
+        for origin in range(TRAIN_HOURS, len(values) - 24, 24):
+            _, band = features.recursive_forecast(packed, spec, values[origin - need:origin],
+                                                  times[origin:origin + 24], quantiles=QUANTILES)
+            actual = values[origin:origin + 24]
+            inside += np.count_nonzero((actual >= band[0]) & (actual <= band[-1]))
+            total += len(actual)
+        print(f"P10-P90 coverage on {total} test hours: {inside / total:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Peak memory of loading training data: query_data_frame vs. influx_stream.
+
+A local stand-in for the InfluxDB query endpoint serves synthetic minute
+readings as Flux CSV, generated on the fly. Each loader runs in a fresh
+child process and its peak RSS is taken from the kernel when it exits.
+
+    legacy  query_data_frame on the unprojected query (every Flux column)
+    stream  read_series on the query with keep(columns: ["_time", "_value"])
+
+    python3 benchmarks/bench_query_memory.py            # 1, 3 and 5 years
+    python3 benchmarks/bench_query_memory.py 1 3        # selected sizes
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+YEARS = (1, 3, 5)
+ROWS_PER_YEAR = 365 * 24 * 60
+BLOCK = 100000
+
+QUERY = '''
+from(bucket: "bench")
+|> range(start: 0)
+|> filter(fn: (r) => r["_measurement"] == "energy_consumption" and r["_field"] == "consumption_kwh")
+'''
+PROJECTED = QUERY + '|> keep(columns: ["_time", "_value"])\n'
+
+
+def csv_blocks(rows, projected, annotated):
+    """Yield the Flux CSV response for ``rows`` minute readings as encoded blocks."""
+    start, stop = "1970-01-01T00:00:00Z", "2100-01-01T00:00:00Z"
+    if projected:
+        types, header = "#datatype,string,long,dateTime:RFC3339,double", ",result,table,_time,_value"
+        group, default = "#group,false,false,false,false", "#default,_result,,,"
+    else:
+        types = ("#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,"
+                 "double,string,string")
+        header = ",result,table,_start,_stop,_time,_value,_field,_measurement"
+        group = "#group,false,false,true,true,false,false,true,true"
+        default = "#default,_result,,,,,,,"
+    preamble = [types, group, default, header] if annotated else [header]
+    yield ("\r\n".join(preamble) + "\r\n").encode()
+
+    base = np.datetime64("2020-01-01T00:00:00", "s")
+    rng = np.random.default_rng(42)
+    for offset in range(0, rows, BLOCK):
+        n = min(BLOCK, rows - offset)
+        stamps = np.datetime_as_string(base + np.arange(offset, offset + n) * 60, unit="s", timezone="UTC")
+        values = np.round(rng.gamma(2.0, 0.05, n), 4)
+        if projected:
+            lines = [f",,0,{t},{v}" for t, v in zip(stamps, values)]
+        else:
+            lines = [f",,0,{start},{stop},{t},{v},consumption_kwh,energy_consumption"
+                     for t, v in zip(stamps, values)]
+        yield ("\r\n".join(lines) + "\r\n").encode()
+    yield b"\r\n"
+
+
+def serve(rows):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            projected = "keep(columns" in body.get("query", "")
+            annotated = bool((body.get("dialect") or {}).get("annotations"))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.end_headers()
+            for block in csv_blocks(rows, projected, annotated):
+                self.wfile.write(block)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------------- Child Process ----------------
+def child(mode, url):
+    from influxdb_client import InfluxDBClient
+    from influxdb_client.client.warnings import MissingPivotFunction
+
+    client = InfluxDBClient(url=url, token="bench", org="bench", timeout=600000)
+    query_api = client.query_api()
+    start = time.perf_counter()
+    if mode == "legacy":
+        warnings.simplefilter("ignore", MissingPivotFunction)
+        df = query_api.query_data_frame(QUERY, org="bench")
+        if isinstance(df, list):
+            df = df[0]
+        df = df.rename(columns={"_time": "datetime", "_value": "consumption_kwh"})
+        rows = len(df)
+    else:
+        from influx_stream import read_series, series_frame
+        times, values = read_series(query_api, PROJECTED, org="bench")
+        df = series_frame(times, values, "consumption_kwh")
+        rows = len(df)
+    print(json.dumps({"rows": rows, "seconds": time.perf_counter() - start}))
+
+
+def run_child(mode, url):
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", mode, url],
+                            stdout=subprocess.PIPE)
+    out = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        return None
+    result = json.loads(out)
+    result["peak_mb"] = usage.ru_maxrss / 1024
+    return result
+
+
+def main(years):
+    print(f"{'years':>5} {'rows':>9} {'path':>7} {'peak RSS':>10} {'time':>8}")
+    for y in years:
+        rows = y * ROWS_PER_YEAR
+        server = serve(rows)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        for mode in ("legacy", "stream"):
+            result = run_child(mode, url)
+            if result is None:
+                print(f"{y:>5} {rows:>9} {mode:>7} {'failed':>10}")
+                continue
+            print(f"{y:>5} {result['rows']:>9} {mode:>7} {result['peak_mb']:>8.0f}MB {result['seconds']:>7.1f}s")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or YEARS)
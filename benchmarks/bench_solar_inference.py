@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Cost of a solar forecast run with and without refitting the model.
+
+Builds 14 days of synthetic hourly production and weather, then times the
+part of prediction_solar.py that differs between the two: "refit every run"
+trains the forest, saves it and forecasts 24 hours (the previous behaviour);
+"saved model" loads the artifact, checks ``retrain_reason`` and forecasts.
+InfluxDB and the weather request are the same in both and left out.
+
+    python3 benchmarks/bench_solar_inference.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from features import SOLAR_SPEC, history_needed, recursive_forecast  # noqa: E402
+from model_artifact import load_model, store_model  # noqa: E402
+from solar_model import add_pv, retrain_reason, train  # noqa: E402
+
+DAYS = 14
+ROUNDS = 5
+
+
+def synthetic(days, seed=7):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2024-06-01", periods=days * 24, freq="h", tz="UTC")
+    hour = times.hour.to_numpy()
+    clouds = np.clip(rng.normal(50, 30, len(times)), 0, 100)
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+    production = sun * (1 - clouds / 130) * 2.5 + rng.normal(0, 0.05, len(times)).clip(0)
+    weather = add_pv(pd.DataFrame({"datetime": times, "clouds": clouds,
+                                   "temp": 15 + 8 * sun + rng.normal(0, 1, len(times)),
+                                   "wind": rng.gamma(2, 1.5, len(times))}), 50.88, 3.42)
+    return pd.DataFrame({"datetime": times, "production_kwh": production.astype(np.float32)}), weather
+
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    spec = SOLAR_SPEC
+    production, weather = synthetic(DAYS)
+    future = [t.to_pydatetime().replace(tzinfo=None) + pd.Timedelta(hours=24) for t in weather["datetime"][-24:]]
+    future_weather = {name: weather[name].to_numpy()[-24:] for name in spec["exogenous"]}
+    history = production["production_kwh"].to_numpy()[-history_needed(spec):]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "solar_model.pkl")
+
+        def refit_every_run():
+            model, metadata = train(spec, "rf", production, weather)
+            store_model(model, path, metadata)
+            recursive_forecast(model, spec, history, future, future_weather)
+
+        def saved_model():
+            model, header = load_model(path)
+            assert retrain_reason(header, spec, "rf", production["datetime"].iloc[-1]) is None
+            recursive_forecast(model, spec, history, future, future_weather)
+
+        refit = best_of(refit_every_run)
+        saved = best_of(saved_model)
+        print(f"{len(production)} training rows, 24-hour forecast")
+        print(f"{'refit every run':>16} {refit * 1e3:9.1f}ms")
+        print(f"{'saved model':>16} {saved * 1e3:9.1f}ms")
+        print(f"{'saved per run':>16} {(refit - saved) * 1e3:9.1f}ms ({refit / saved:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Throughput of MQTT topic routing as the number of routes grows.
+
+Compares TopicRouter (trie + per-topic cache) with a linear scan that
+matches every route pattern against every message, for 10 to 1000 routes
+and 120 distinct meter topics.
+
+    python3 benchmarks/bench_topic_router.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from topic_router import TopicRouter  # noqa: E402
+
+MESSAGES = 200000
+TOPICS = 120
+
+
+def make_routes(count):
+    routes = []
+    for i in range(count):
+        if i % 4 == 0:
+            routes.append({"topic": f"building/{i}/+/power", "measurement": "submeter_power",
+                           "field": "power_w", "tags": {"floor": "{1}", "meter": "{2}"}})
+        elif i % 4 == 1:
+            routes.append({"topic": f"building/{i}/#", "measurement": "building_misc", "field": "value"})
+        else:
+            routes.append({"topic": f"meters/m{i}/energy", "measurement": "energy_consumption",
+                           "field": "consumption_kwh", "tags": {"meter": f"m{i}"}})
+    routes.append({"topic": "home/energy/logs", "parser": "log"})
+    return routes
+
+
+def make_topics(count, routes):
+    topics = []
+    for i in range(count):
+        route = routes[(i * 7) % (len(routes) - 1)]["topic"]
+        topics.append(route.replace("+", f"meter{i}").replace("#", f"sensor{i}/value"))
+    return topics
+
+
+def linear_match(pattern, topic):
+    p_levels = pattern.split("/")
+    t_levels = topic.split("/")
+    for i, level in enumerate(p_levels):
+        if level == "#":
+            return True
+        if i >= len(t_levels) or (level != "+" and level != t_levels[i]):
+            return False
+    return len(p_levels) == len(t_levels)
+
+
+def bench_linear(routes, stream):
+    start = time.perf_counter()
+    hits = 0
+    for topic, payload in stream:
+        for route in routes:
+            if linear_match(route["topic"], topic):
+                float(payload)
+                hits += 1
+                break
+    return time.perf_counter() - start, hits
+
+
+def bench_router(routes, stream):
+    router = TopicRouter(routes)
+    start = time.perf_counter()
+    hits = 0
+    for topic, payload in stream:
+        route = router.resolve(topic)
+        if route is not None:
+            route.parse(payload)
+            hits += 1
+    return time.perf_counter() - start, hits
+
+
+def main():
+    print(f"{'routes':>7} {'linear msg/s':>14} {'router msg/s':>14} {'speedup':>8}")
+    for count in (10, 100, 300, 1000):
+        routes = make_routes(count)
+        topics = make_topics(TOPICS, routes)
+        stream = [(topics[i % len(topics)], f"{i * 0.001:.3f}") for i in range(MESSAGES)]
+        linear_time, linear_hits = bench_linear(routes, stream)
+        router_time, router_hits = bench_router(routes, stream)
+        assert linear_hits == router_hits == MESSAGES
+        print(f"{count:>7} {MESSAGES / linear_time:>14,.0f} {MESSAGES / router_time:>14,.0f} "
+              f"{linear_time / router_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Training join of archived weather forecasts with solar production.
+
+Fills a temporary ``weather_archive.WeatherArchive`` with two years of
+Open-Meteo-like forecasts (a 168-hour forecast issued every 6 hours, so
+every hour has ~28 archived forecasts) and joins the latest forecast of
+each hour to 15-minute production over windows from a month to two years:
+
+    full scan   every archived row into one DataFrame, ``groupby(...).last()``
+                and ``merge_asof``, what a table without an index would do
+    archive     ``archive.read`` (months outside the window are not opened,
+                the rest cut with ``searchsorted``) and ``align.align_frame``
+
+    python3 benchmarks/bench_weather_archive.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from align import align_frame  # noqa: E402
+from weather_archive import COLUMNS, WeatherArchive  # noqa: E402
+
+YEARS = 2
+ISSUE_HOURS = 6
+HORIZON = 168
+WINDOWS = (30, 365, 730)
+EXOGENOUS = ["clouds", "temp", "wind"]
+
+
+def fill(archive, end):
+    rng = np.random.default_rng(11)
+    issues = pd.date_range(end=end, periods=YEARS * 365 * 24 // ISSUE_HOURS, freq=f"{ISSUE_HOURS}h")
+    for issued in issues:
+        frame = pd.DataFrame({"datetime": pd.date_range(issued, periods=HORIZON, freq="h")})
+        for column in COLUMNS:
+            frame[column] = rng.random(HORIZON) * 100
+        archive.record(frame, issued=issued.value)
+    return issues[0]
+
+
+def full_scan(archive, targets):
+    parts = [archive.load_month(month, mmap=False) for month in archive.months()]
+    rows = pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in parts[0]})
+    latest = rows.sort_values(["valid", "issued"]).groupby("valid", as_index=False).last()
+    latest["datetime"] = pd.to_datetime(latest["valid"], utc=True)
+    merged = pd.merge_asof(pd.DataFrame({"datetime": targets.as_unit("ns")}), latest[["datetime"] + EXOGENOUS],
+                           on="datetime", direction="nearest", tolerance=pd.Timedelta("4h"))
+    return {name: merged[name].to_numpy() for name in EXOGENOUS}
+
+
+def indexed(archive, targets):
+    weather = archive.read(targets[0] - pd.Timedelta("4h"), targets[-1] + pd.Timedelta("4h"))
+    return align_frame(targets, weather, EXOGENOUS, pd.Timedelta("4h"))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = WeatherArchive(tmp, retention_days=YEARS * 365 + 31)
+        end = pd.Timestamp.now(tz="UTC").floor("h")
+        start = time.perf_counter()
+        first = fill(archive, end)
+        rows = sum(len(archive.load_month(month)["valid"]) for month in archive.months())
+        print(f"archive: {rows} rows in {len(archive.months())} months, filled in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'window':>8} {'targets':>8} {'full scan':>11} {'archive':>10}")
+        for days in WINDOWS:
+            window_start = max(first, end - pd.Timedelta(days=days))
+            targets = pd.date_range(window_start, end, freq="15min")
+            scan, expected = timed(full_scan, archive, targets)
+            fast, result = timed(indexed, archive, targets)
+            # Same weather at every step; only the interpolation between hours differs from merge_asof
+            on_hour = targets.minute == 0
+            assert all(np.allclose(result[name][on_hour], expected[name][on_hour], equal_nan=True) for name in EXOGENOUS)
+            print(f"{f'{days}d':>8} {len(targets):>8} {scan * 1e3:9.1f}ms {fast * 1e3:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
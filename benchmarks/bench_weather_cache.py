@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Weather cache paths against a local stand-in for Open-Meteo.
+
+The stand-in serves a 168-hour forecast with an ETag after a configurable
+delay, answers matching ``If-None-Match`` requests with 304 and can be
+switched to failing. Each row runs ``weather_cache.open_meteo`` the way
+both solar scripts do and shows the cache status, the requests and bytes
+the server saw and the latency; the last rows check that a failing provider
+falls back to the cached forecast, and fails cleanly when that is too old.
+
+    python3 benchmarks/bench_weather_cache.py [--latency-ms 300]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from weather_cache import OPEN_METEO_VARIABLES, WeatherCache, WeatherUnavailable, open_meteo  # noqa: E402
+
+HOURS = 168
+LAT, LON = 50.883785, 3.424479
+
+
+class StandIn:
+    def __init__(self, latency):
+        self.latency = latency
+        self.failing = False
+        self.requests = self.bytes = 0
+        start = int(time.time()) // 3600 * 3600
+        hourly = {"time": [start + 3600 * i for i in range(HOURS)]}
+        hourly.update({variable: [float(i % 24) for i in range(HOURS)] for variable in OPEN_METEO_VARIABLES})
+        self.body = json.dumps({"latitude": LAT, "longitude": LON, "hourly": hourly}).encode()
+        self.etag = '"forecast-1"'
+
+    def serve(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(stand_in.latency)
+                stand_in.requests += 1
+                if stand_in.failing:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == stand_in.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", stand_in.etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                stand_in.bytes += len(stand_in.body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", stand_in.etag)
+                self.send_header("Content-Length", str(len(stand_in.body)))
+                self.end_headers()
+                self.wfile.write(stand_in.body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main(latency_ms):
+    stand_in = StandIn(latency_ms / 1000)
+    server = stand_in.serve()
+    url = f"http://127.0.0.1:{server.server_port}/v1/forecast"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = WeatherCache(tmp, ttl=3600, max_stale=12 * 3600, timeout=5, log=lambda message: None)
+
+        def run(label, expect_rows=True):
+            requests_before, bytes_before = stand_in.requests, stand_in.bytes
+            start = time.perf_counter()
+            try:
+                hourly, _, status = open_meteo(cache, LAT, LON, HOURS, url=url)
+                rows = len(hourly)
+            except WeatherUnavailable:
+                status, rows = "unavailable", 0
+            elapsed = time.perf_counter() - start
+            print(f"{label:<34} {status:>12} {rows:>5} {stand_in.requests - requests_before:>9} "
+                  f"{stand_in.bytes - bytes_before:>8} {elapsed * 1e3:8.1f}ms")
+            assert (rows == HOURS) == expect_rows
+
+        print(f"{'scenario':<34} {'status':>12} {'rows':>5} {'requests':>9} {'bytes':>8} {'latency':>10}")
+        run("first run (cold cache)")
+        run("second script, same cycle")
+        cache.ttl = 0
+        run("next cycle, forecast unchanged")
+        stand_in.failing = True
+        run("next cycle, provider down")
+        cache.max_stale = 0
+        run("provider down, cache too old", expect_rows=False)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    main(parser.parse_args().latency_ms)
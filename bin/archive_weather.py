@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+from plugin_log import get_logger
+from weather_cache import PROVIDERS, WeatherUnavailable, cache_from_settings, location, open_meteo, openweathermap
+from weather_archive import archive_from_settings
+
+# Records the configured provider's forecast in the weather archive on a regular schedule, so the archive
+# keeps growing between the (weekly) solar forecast and training runs. The request is the one
+# prediction_solar.py makes, so within the cache TTL it is served from the weather cache.
+
+# ---------------- Logging Setup ----------------
+LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/archive_weather.log"
+
+logger = get_logger("archive_weather", LOGFILE, tag="WEATHER")
+log = logger.info
+
+# ---------------- Config & Settings ----------------
+SETTINGS_PATH = "/opt/loxberry/data/plugins/consumption_prediction/settings.json"
+
+try:
+    with open(SETTINGS_PATH, "r") as f:
+        settings = json.load(f)
+    WEATHER_PROVIDER = settings.get("weather_provider", "open-meteo")
+    API_KEY = settings.get("openweathermap_api_key")
+    LOCATION = location(settings)
+    FORECAST_HOURS = int(settings.get("forecast_horizon_hours", 24))
+    RESOLUTION = int(settings.get("forecast_resolution_minutes", 60))
+    if WEATHER_PROVIDER not in PROVIDERS:
+        log(f"[error] Unknown weather_provider '{WEATHER_PROVIDER}', expected one of {PROVIDERS}")
+        sys.exit(1)
+    if LOCATION is None or (WEATHER_PROVIDER == "openweathermap" and not API_KEY):
+        log("[error] Missing API key or location in settings.json")
+        sys.exit(1)
+    LAT, LON = LOCATION
+except Exception as e:
+    log(f"[error] Failed to load settings.json: {e}")
+    sys.exit(1)
+
+archive = archive_from_settings(settings, WEATHER_PROVIDER)
+if archive is None:
+    sys.exit(0)
+
+# ---------------- Fetch & Record ----------------
+cache = cache_from_settings(settings, log=log)
+try:
+    if WEATHER_PROVIDER == "openweathermap":
+        frame, status = openweathermap(cache, LAT, LON, API_KEY)
+    else:
+        frame, _, status = open_meteo(cache, LAT, LON, FORECAST_HOURS, RESOLUTION)
+except WeatherUnavailable as e:
+    log(f"[error] {e}")
+    sys.exit(1)
+
+if status == "fetched":
+    try:
+        log(f"{archive.record(frame)} {WEATHER_PROVIDER} forecast rows archived.")
+    except OSError as e:
+        log(f"[error] Could not archive the weather forecast: {e}")
+        sys.exit(1)
+else:
+    # Already recorded by whichever script downloaded it
+    log(f"{WEATHER_PROVIDER} forecast unchanged ({status}); nothing to archive.")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Lossy compression of meter readings before they are written to InfluxDB.
+
+Configured per route in settings.json::
+
+    {"topic": "...", "measurement": "...", "field": "...",
+     "compression": {"method": "swinging_door", "deviation": 0.01, "max_silence": 300}}
+
+Methods:
+    deadband       keep a reading only when it differs from the last kept one
+                   by more than ``deviation``. Holding the last kept value
+                   reconstructs the series within ``deviation``.
+    swinging_door  keep the turning points of the series. Linear interpolation
+                   between kept points reconstructs it within ``deviation``.
+                   A point is emitted one reading late, once the next reading
+                   shows the trend has changed, with its value placed on the
+                   centre line of the door so the bound holds for every
+                   reading in between.
+
+``max_silence`` (seconds) forces a point through after that long without
+one, so a flat series still shows up as a heartbeat.
+"""
+
+DEFAULT_DEVIATION = 0.0
+METHODS = ("deadband", "swinging_door")
+
+
+class DeadbandFilter:
+    def __init__(self, deviation, max_silence=None):
+        self.deviation = deviation
+        self.max_silence = max_silence
+        self._last = None  # (value, seconds)
+
+    def offer(self, value, timestamp):
+        t = timestamp.timestamp()
+        last = self._last
+        if (last is None or abs(value - last[0]) > self.deviation
+                or (self.max_silence and t - last[1] >= self.max_silence)):
+            self._last = (value, t)
+            return [(value, timestamp)]
+        return []
+
+    def flush(self):
+        return []
+
+
+class SwingingDoorFilter:
+    def __init__(self, deviation, max_silence=None):
+        self.deviation = deviation
+        self.max_silence = max_silence
+        self._archived = None  # (value, seconds) of the last emitted point
+        self._held = None      # (value, seconds, timestamp) of the newest unemitted reading
+        self._upper = float("inf")
+        self._lower = float("-inf")
+
+    def offer(self, value, timestamp):
+        t = timestamp.timestamp()
+        if self._archived is None:
+            self._archive(value, t)
+            return [(value, timestamp)]
+
+        a_value, a_t = self._archived
+        if self.max_silence and t - a_t >= self.max_silence:
+            out = self.flush()
+            self._archive(value, t)
+            out.append((value, timestamp))
+            return out
+
+        dt = t - a_t
+        if dt <= 0:
+            # Same or earlier timestamp than the archived point: nothing to interpolate
+            return []
+        upper = min(self._upper, (value + self.deviation - a_value) / dt)
+        lower = max(self._lower, (value - self.deviation - a_value) / dt)
+        if lower <= upper:
+            self._upper, self._lower = upper, lower
+            self._held = (value, t, timestamp)
+            return []
+
+        # The door closed: the held reading becomes the new archived point
+        out = self.flush()
+        if not out:
+            self._archive(value, t)
+            return [(value, timestamp)]
+        h_value, h_t = self._archived
+        dt = t - h_t
+        self._upper = (value + self.deviation - h_value) / dt if dt > 0 else float("inf")
+        self._lower = (value - self.deviation - h_value) / dt if dt > 0 else float("-inf")
+        self._held = (value, t, timestamp)
+        return out
+
+    def _archive(self, value, t):
+        self._archived = (value, t)
+        self._held = None
+        self._upper = float("inf")
+        self._lower = float("-inf")
+
+    def flush(self):
+        """Emit the held reading, e.g. on shutdown, so the series ends near its latest value."""
+        if self._held is None:
+            return []
+        _, t, timestamp = self._held
+        a_value, a_t = self._archived
+        value = a_value + (self._upper + self._lower) / 2 * (t - a_t)
+        self._archive(value, t)
+        return [(value, timestamp)]
+
+
+def make_filter(config):
+    method = config.get("method", "deadband")
+    if method not in METHODS:
+        raise ValueError(f"Unknown compression method '{method}', expected one of {METHODS}")
+    deviation = float(config.get("deviation", DEFAULT_DEVIATION))
+    max_silence = config.get("max_silence")
+    max_silence = float(max_silence) if max_silence else None
+    if method == "swinging_door":
+        return SwingingDoorFilter(deviation, max_silence)
+    return DeadbandFilter(deviation, max_silence)
+
+
+class CompressionStage:
+    """Keeps one filter per series and counts readings in and points out."""
+
+    def __init__(self):
+        self._filters = {}
+        self.received = 0
+        self.emitted = 0
+        # measurement -> [received, emitted]
+        self.by_measurement = {}
+
+    def offer(self, key, config, value, timestamp):
+        """Return the (value, timestamp) points to write for this reading of series ``key``."""
+        flt = self._filters.get(key)
+        if flt is None:
+            flt = self._filters[key] = make_filter(config)
+        points = flt.offer(value, timestamp)
+        self._count(key[0], 1, len(points))
+        return points
+
+    def flush(self):
+        """Return (key, value, timestamp) for every reading still held back by a filter."""
+        out = []
+        for key, flt in self._filters.items():
+            points = flt.flush()
+            self._count(key[0], 0, len(points))
+            out.extend((key, value, timestamp) for value, timestamp in points)
+        return out
+
+    def _count(self, measurement, received, emitted):
+        self.received += received
+        self.emitted += emitted
+        stats = self.by_measurement.get(measurement)
+        if stats is None:
+            stats = self.by_measurement[measurement] = [0, 0]
+        stats[0] += received
+        stats[1] += emitted
+
+    def ratio(self):
+        """Readings received per point written (1.0 means no compression)."""
+        return self.received / self.emitted if self.emitted else 1.0
+
+    def report(self):
+        parts = [
+            f"{m}: {r} -> {e} ({r / e if e else 1.0:.1f}x)"
+            for m, (r, e) in sorted(self.by_measurement.items())
+        ]
+        return f"Compression {self.received} -> {self.emitted} points ({self.ratio():.1f}x); " + ", ".join(parts)
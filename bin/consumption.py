@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Consumption pipeline runs, shared by the single-site scripts and fleet mode.
+
+Each function does one run for one settings dict: ``train`` is
+``train_model.py``, ``forecast`` and ``write_forecast`` are
+``prediction.py`` without the logging and MQTT, and ``BLOCK_SERIES`` / ``send_blocks`` are ``send_predictions.py``.
+``fleet.py`` calls the same functions with each site's merged settings.
+
+Besides the plugin settings, these keys select where a run reads and writes
+(fleet sites set them; a single site uses the defaults):
+
+    influx_bucket   bucket of the readings and predictions (default: the connection's bucket)
+    tags            tag values the readings carry in a shared bucket; filtered on and written on predictions
+    model_path      consumption model (default energy_model.pkl in the plugin data directory)
+    cache_dir       root of the local history caches (default history/ in the plugin data directory)
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import requests
+
+from features import (CONSUMPTION_SPEC, build_matrix, complete_rows, direct_targets, feature_names, save_spec,
+                      with_resolution)
+from forecaster import DAILY_MEASUREMENT, ROLLING_MEASUREMENT, forecast_times, prediction_points
+from history_cache import HistoryCache
+from incremental import add_trees, refit_reason, update_window
+from model_artifact import load_model, store_model
+from model_backends import DEFAULT_BACKEND, get_backend, make_model
+from model_search import save_search, search
+
+DATA_DIR = "/opt/loxberry/data/plugins/consumption_prediction"
+MODEL_PATH = os.path.join(DATA_DIR, "energy_model.pkl")
+CACHE_ROOT = os.path.join(DATA_DIR, "history")
+TRAINING_MODES = ("fixed", "search", "incremental")
+BLOCKS = ("0004", "0408", "0812", "1216", "1620", "2024")
+
+
+class NotEnoughData(ValueError):
+    """Too little history to train or forecast; a reason to skip the run rather than an error."""
+
+
+# ---------------- Settings ----------------
+def bucket(influx, settings):
+    return settings.get("influx_bucket") or influx.bucket
+
+
+def tag_filter(tags):
+    return "".join(f' and r["{key}"] == "{value}"' for key, value in sorted(tags.items()))
+
+
+def forecast_hours(settings):
+    # Forecast length; the step length is the resolution the model was trained at
+    return int(settings.get("forecast_horizon_hours", 24))
+
+
+def quantiles(settings):
+    # Quantile bands across the forest's trees, e.g. [0.1, 0.5, 0.9]; empty for point forecasts only
+    return [float(q) for q in settings.get("forecast_quantiles") or []]
+
+
+def series_query(influx, settings, measurements, field, start, stop=None, every="1h", tagged=True):
+    """Flux for ``field`` of the run's bucket (and tags, unless ``tagged`` is False), averaged per ``every`` window.
+
+    With several ``measurements``, each window takes the value of the one
+    listed first.
+    """
+    if isinstance(measurements, str):
+        measurements = (measurements,)
+    stop = f", stop: {stop}" if stop else ""
+    names = " or ".join(f'r._measurement == "{name}"' for name in measurements)
+    # Flux can only sort by name, so the preferred measurement's position is mapped to a column first
+    prefer = "" if len(measurements) == 1 else f'''
+  |> map(fn: (r) => ({{r with rank: {" ".join(f'if r._measurement == "{name}" then {i} else' for i, name in enumerate(measurements))} {len(measurements)}}}))
+  |> group(columns: ["_time"])
+  |> sort(columns: ["rank"])
+  |> first()
+  |> group()'''
+    return f'''
+from(bucket: "{bucket(influx, settings)}")
+  |> range(start: {start}{stop})
+  |> filter(fn: (r) => ({names}) and r._field == "{field}"{tag_filter(settings.get("tags") or {}) if tagged else ""})
+  |> aggregateWindow(every: {every}, fn: mean, createEmpty: false, timeSrc: "_start"){prefer}
+  |> keep(columns: ["_time", "_value"])
+'''
+
+
+# ---------------- Train ----------------
+def update_history(influx, settings, rebuild=False, log=print):
+    """Fetch the hours after the local cache's watermark and return all cached ``(times, values)``.
+
+    Each resolution has its own cache; only complete hours are cached.
+    """
+    resolution = int(settings.get("forecast_resolution_minutes", 60))
+    cache = HistoryCache(os.path.join(settings.get("cache_dir") or CACHE_ROOT,
+                                      "energy_consumption" if resolution == 60
+                                      else f"energy_consumption_{resolution}min"))
+    if rebuild:
+        log("Rebuilding local history cache.")
+        cache.clear()
+    watermark = cache.watermark
+    start = watermark.isoformat() if watermark else "1970-01-01T00:00:00Z"
+    stop = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    new_times, new_values = influx.read_series(series_query(influx, settings, "energy_consumption",
+                                                            "consumption_kwh", start, stop.isoformat(),
+                                                            f"{resolution}m"))
+    cache.append(new_times, new_values, stop)
+    log(f"History cache updated from {start}: {len(new_times)} new {resolution}-minute rows.")
+    return cache.read()
+
+
+def train(influx, settings, mode=None, rebuild=False, n_jobs=-1, log=print):
+    """Train and save the consumption model; returns its metadata, or None when there was nothing new.
+
+    ``mode`` overrides ``training_mode``: "fixed" fits the backend's defaults,
+    "search" runs the cross-validated search first, "incremental" adds trees
+    for the new data to the existing forest. Raises NotEnoughData, or any
+    other error of the failing stage.
+    """
+    model_path = settings.get("model_path") or MODEL_PATH
+    backend = settings.get("model_backend", DEFAULT_BACKEND)
+    mode = mode or settings.get("training_mode", "fixed")
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode '{mode}', expected one of {TRAINING_MODES}")
+    # "recursive" predicts one step at a time; "direct" predicts all steps of the horizon in one call
+    forecast_mode = settings.get("forecast_mode", "recursive")
+    resolution = int(settings.get("forecast_resolution_minutes", 60))
+    spec = with_resolution(CONSUMPTION_SPEC, resolution)
+    direct = forecast_mode == "direct"
+    horizon = int(settings.get("forecast_horizon_hours", 24)) * 60 // resolution if direct else 1
+
+    cached_times, cached_values = update_history(influx, settings, rebuild, log)
+    log(f"History cache holds {len(cached_times)} {resolution}-minute rows.")
+    if len(cached_times) < 72 * 60 // resolution:
+        raise NotEnoughData(f"Not enough data (got {len(cached_times)} rows).")
+
+    log("Preparing features...")
+    # Reindex onto a gapless grid so shift(n) always means n steps
+    result = pd.DataFrame(
+        {"consumption_kwh": np.asarray(cached_values, dtype=np.float32)},
+        index=pd.DatetimeIndex(pd.to_datetime(cached_times, utc=True), name="_time"),
+    )
+    result = result[~result.index.duplicated(keep="last")].asfreq(f"{resolution}min").reset_index()
+
+    target = result["consumption_kwh"].to_numpy()
+    X = build_matrix(spec, result["_time"], target)
+    if direct:
+        # Row i maps what is known before step i to steps i .. i + horizon - 1
+        target = direct_targets(target, horizon)
+    keep = complete_rows(X, target)
+    X, y = X[keep], target[keep]
+    trained_times = result["_time"][keep]
+    trained_through = trained_times.iloc[-1]
+    log(f"Training on {len(y)} rows ({forecast_mode}) with features {feature_names(spec)}.")
+    params = dict(get_backend(backend).defaults)
+
+    # ---------------- Incremental Update ----------------
+    previous_model, previous_header = None, {}
+    if mode == "incremental":
+        try:
+            previous_model, previous_header = load_model(model_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log(f"[warning] Could not load the existing model: {e}")
+        reason = refit_reason(previous_model, previous_header, spec, backend,
+                              int(settings.get("full_refit_days", 30)), forecast_mode, horizon)
+        if reason:
+            log(f"Full refit instead of incremental update: {reason}.")
+            previous_model = None
+
+    if previous_model is not None:
+        if trained_through <= datetime.fromisoformat(previous_header["trained_through"]):
+            log(f"No new data since {previous_header['trained_through']}; model unchanged.")
+            return None
+        params = previous_header.get("params") or params
+        new_trees = int(settings.get("incremental_trees", 10))
+        window = update_window(trained_times, previous_header["trained_through"],
+                               int(settings.get("incremental_window_days", 28)))
+        model = add_trees(previous_model, X[window], y[window], spec, params, new_trees,
+                          max_trees=params.get("n_estimators", 100),
+                          random_state=int(trained_through.timestamp() // 3600) % 2**31,
+                          max_depth=previous_header.get("max_depth"),
+                          max_leaf_nodes=previous_header.get("max_leaf_nodes"))
+        log(f"Added {new_trees} trees fitted on {int(window.sum())} recent rows.")
+        training_start = previous_header["training_range"]["start"]
+        last_full_training = previous_header["last_full_training"]
+        incremental_updates = previous_header.get("incremental_updates", 0) + 1
+
+    # ---------------- Full Training ----------------
+    else:
+        if mode == "search":
+            workers = settings.get("search_workers")
+            try:
+                search_result = search(X, y, spec, backend, folds=int(settings.get("search_folds", 4)),
+                                       budget_seconds=float(settings.get("search_budget_seconds", 2400)),
+                                       workers=int(workers) if workers else None,
+                                       gap=horizon - 1, log=log)
+                params = search_result["best_params"]
+                save_search(search_result, model_path)
+                log(f"Best configuration {params} with CV MAE {search_result['best_mae']}.")
+            except Exception as e:
+                log(f"[warning] Hyperparameter search failed, using defaults: {e}")
+        model = make_model(backend, spec, params, n_jobs=n_jobs, outputs=horizon)
+        model.fit(X, y)
+        log(f"Model trained successfully ({backend}, {params}).")
+        training_start = trained_times.iloc[0].isoformat()
+        last_full_training = datetime.now(timezone.utc).isoformat()
+        incremental_updates = 0
+
+    metadata = {
+        "backend": backend,
+        "params": params,
+        "feature_spec": spec,
+        "training_range": {"start": training_start, "end": trained_through.isoformat()},
+        "rows": int(len(y)),
+        "trained_through": trained_through.isoformat(),
+        "last_full_training": last_full_training,
+        "incremental_updates": incremental_updates,
+        "forecast_mode": forecast_mode,
+        "horizon": horizon,
+    }
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    # "packed" writes a compact .model artifact, "joblib" the previous .pkl
+    saved = store_model(model, model_path, metadata, settings.get("model_format", "packed"),
+                        compression=settings.get("model_compression"),
+                        max_depth=settings.get("model_max_depth"),
+                        max_leaf_nodes=settings.get("model_max_leaf_nodes"))
+    save_spec(spec, model_path)
+    log(f"Model saved to {saved} ({os.path.getsize(saved) / 1024:.0f} KB)")
+    return metadata
+
+
+# ---------------- Forecast ----------------
+def forecast(influx, settings, model, start=None):
+    """Forecast ``forecast_horizon_hours`` from ``start`` (default: today's midnight).
+
+    ``model`` is a loaded ``forecaster.ForecastModel``; its resolution sets the
+    step length. Returns ``(start, times, predictions, bands)``; raises
+    NotEnoughData when the history is too short.
+    """
+    resolution = model.resolution_minutes
+    # The last 48h, or as far back as the features look
+    history_minutes = max(48 * 60, model.history_needed * resolution)
+    times, values = influx.read_series(series_query(influx, settings, "energy_consumption", "consumption_kwh",
+                                                    f"-{history_minutes}m", every=f"{resolution}m"),
+                                       value_dtype=np.float64)
+    if not len(times):
+        raise NotEnoughData("No data received from InfluxDB.")
+    series = pd.Series(values, index=pd.to_datetime(times, utc=True)).resample(f"{resolution}min").mean().ffill()
+    history = series.to_numpy()[-(history_minutes // resolution):]
+    if len(history) < model.history_needed:
+        raise NotEnoughData(f"Not enough history for prediction (need {model.history_needed} steps, "
+                            f"got {len(history)}).")
+
+    start = start or datetime.combine(datetime.now().date(), datetime.min.time())
+    future = forecast_times(start, forecast_hours(settings), resolution)
+    # Recursive (each prediction becomes the next lag) or direct (all steps in one call),
+    # whichever the model was trained for
+    predictions, bands = model.forecast(history, future, quantiles(settings))
+    return start, future, predictions, bands
+
+
+def write_forecast(influx, settings, times, predictions, bands, measurement=DAILY_MEASUREMENT):
+    """Write a forecast in one request, tagged with the run's ``tags``; returns the points written."""
+    points = prediction_points(times, predictions, quantiles(settings), bands, measurement=measurement)
+    for point in points:
+        for key, value in (settings.get("tags") or {}).items():
+            point.tag(key, value)
+    return influx.write_points(points, bucket=bucket(influx, settings))
+
+
+# ---------------- Send ----------------
+def block_totals(times_ns, values, prefix="pred_"):
+    """Sums of hourly values per 4-hour block of the UTC day, keyed like the Loxone virtual inputs."""
+    totals = np.zeros(len(BLOCKS))
+    hours = (np.asarray(times_ns, dtype=np.int64) // (3600 * 10**9)) % 24
+    np.add.at(totals, hours // 4, values)
+    return {f"{prefix}{block}": float(total) for block, total in zip(BLOCKS, totals)}
+
+
+def _next_day():
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return now.isoformat(), (now + timedelta(hours=24)).isoformat()
+
+
+def consumption_blocks(influx, settings):
+    """Consumption block totals of the next 24 hours, or None without predictions.
+
+    Forecasts are averaged to hours first, so any resolution gives the same
+    totals. Per hour, the forecast service's latest re-forecast
+    (``predictions_rolling``) wins over the daily forecast.
+    """
+    start, stop = _next_day()
+    times, values = influx.read_series(series_query(influx, settings, (ROLLING_MEASUREMENT, DAILY_MEASUREMENT),
+                                                    "predicted_kwh", start, stop), value_dtype=np.float64)
+    return block_totals(times, values) if len(times) else None
+
+
+def solar_blocks(influx, settings):
+    """Solar block totals of the next 24 hours, or None without a solar forecast.
+
+    The solar forecast (``get_solar_prediction.py``) is written without site
+    tags, so it is read from the bucket without the run's ``tags``.
+    """
+    start, stop = _next_day()
+    times, values = influx.read_series(series_query(influx, settings, "solar_forecast", "forecast_kwh", start, stop,
+                                                    tagged=False), value_dtype=np.float64)
+    return block_totals(times, values, prefix="pred_sol_") if len(times) else None
+
+
+BLOCK_SERIES = {"consumption": consumption_blocks, "solar": solar_blocks}
+
+
+def loxone_target(settings):
+    """``{"ip", "user", "password"}`` of the Miniserver from the plugin's ``loxone_*`` keys."""
+    return {"ip": settings.get("loxone_ip", "192.168.1.10"),
+            "user": settings.get("loxone_user", "Q-Home"),
+            "password": settings.get("loxone_password", "qhome2018")}
+
+
+def send_blocks(target, totals, log=print):
+    """Set the Loxone virtual inputs to ``totals``; returns the number of inputs that failed."""
+    failed = 0
+    for virtual_input, value in totals.items():
+        rounded_value = round(value, 3)
+        url = f"http://{target['user']}:{target['password']}@{target['ip']}/dev/sps/io/{virtual_input}/{rounded_value}"
+        try:
+            response = requests.get(url, timeout=5)
+            if response.status_code == 200:
+                log(f"Sent to {virtual_input}: {rounded_value}")
+            else:
+                failed += 1
+                log(f"[error] Failed to send to {virtual_input}: {response.status_code} {response.text}")
+        except Exception as e:
+            failed += 1
+            log(f"[error] Exception sending to {virtual_input}: {e}")
+    return failed
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Self-instrumentation for the MQTT ingestion daemon.
+
+Counters and histograms are plain Python ints and lists updated without
+locks; under the GIL a dict lookup and an integer add is all the hot path
+pays. Values are exposed in Prometheus text format on a localhost HTTP
+endpoint and can be published as JSON on an MQTT status topic.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = defaultdict(int)
+
+    def inc(self, label_value=None, amount=1):
+        self.values[label_value] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(list(self.values.items()), key=lambda kv: str(kv[0])):
+            if self.label and label_value is not None:
+                lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+            else:
+                lines.append(f"{self.name} {value}")
+        if not self.values and not self.label:
+            lines.append(f"{self.name} 0")
+        return lines
+
+    def snapshot(self):
+        if self.label:
+            return {str(k): v for k, v in list(self.values.items())}
+        return self.values.get(None, 0)
+
+
+class Gauge:
+    """Value read from a callable at scrape time, so the hot path never touches it.
+
+    ``metric_type`` is "counter" for monotonic totals kept elsewhere (e.g. the batch writer).
+    """
+
+    def __init__(self, name, help_text, read, metric_type="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.metric_type = metric_type
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}",
+                f"{self.name} {self.read()}"]
+
+    def snapshot(self):
+        return self.read()
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        counts = list(self.counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, label=None):
+        return self._add(Counter(name, help_text, label))
+
+    def gauge(self, name, help_text, read):
+        return self._add(Gauge(name, help_text, read))
+
+    def counter_func(self, name, help_text, read):
+        return self._add(Gauge(name, help_text, read, metric_type="counter"))
+
+    def histogram(self, name, help_text, buckets):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+
+# ---------------- HTTP Endpoint ----------------
+class MetricsServer:
+    def __init__(self, registry, port, host="127.0.0.1", log=print):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        log(f"Metrics endpoint listening on http://{host}:{self.server.server_address[1]}/metrics")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def publish_status(mqtt_client, topic, registry):
+    """Publish a JSON snapshot of all metrics on ``topic``."""
+    mqtt_client.publish(topic, json.dumps(registry.snapshot()))
@@ -7,14 +7,11 @@ import joblib
 import os
 import sys
 from datetime import datetime, timedelta
-from influxdb_client import InfluxDBClient
+from influx_db import get_influx
 import subprocess
+from plugin_log import get_logger
 
 # ---------------- Configuration ----------------
-INFLUX_URL = "http://localhost:8086"
-INFLUX_ORG = "Q-Home"
-INFLUX_BUCKET = "Energy-prediction"
-TOKEN_FILE = "/opt/loxberry/data/plugins/consumption_prediction/.influx_token"
 LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/eval.log"
 
 # Thresholds to trigger retraining (adjust as needed)
@@ -24,35 +21,23 @@ RMSE_THRESHOLD = 0.5  # kWh
 # Paths
 TRAIN_SCRIPT = "/opt/loxberry/data/plugins/consumption_prediction/train_model.py"
 
-def log(msg):
-    os.makedirs(os.path.dirname(LOGFILE), exist_ok=True)
-    with open(LOGFILE, "a") as f:
-        f.write(f"[{datetime.now()}] {msg}\n")
+logger = get_logger("eval", LOGFILE)
+log = logger.info
 
-def read_token():
+def connect():
     try:
-        with open(TOKEN_FILE, "r") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        log(f"[error] Token file not found: {TOKEN_FILE}")
+        return get_influx()
+    except FileNotFoundError as e:
+        log(f"[error] Token file not found: {e.filename}")
         sys.exit(1)
 
-def get_data(client, query):
-    query_api = client.query_api()
+def get_data(influx, query):
     try:
-        tables = query_api.query(org=INFLUX_ORG, query=query)
+        times, values = influx.read_series(query, value_dtype=np.float64)
     except Exception as e:
         log(f"[error] InfluxDB query failed: {e}")
         sys.exit(1)
-    
-    records = []
-    for table in tables:
-        for record in table.records:
-            records.append({
-                "datetime": record.get_time(),
-                "value": record.get_value()
-            })
-    return pd.DataFrame(records)
+    return pd.DataFrame({"datetime": pd.to_datetime(times, utc=True), "value": values})
 
 def calculate_metrics(y_true, y_pred):
     mae = np.mean(np.abs(y_true - y_pred))
@@ -62,8 +47,7 @@ def calculate_metrics(y_true, y_pred):
 def main():
     log("Starting evaluation script.")
 
-    token = read_token()
-    client = InfluxDBClient(url=INFLUX_URL, token=token, org=INFLUX_ORG)
+    influx = connect()
 
     # Define time range: yesterday 00:00 to 23:00
     yesterday = datetime.now().date() - timedelta(days=1)
@@ -72,14 +56,14 @@ def main():
 
     # Query predicted values (assumed measurement: 'predictions' with field 'predicted_kwh')
     query_pred = f'''
-    from(bucket: "{INFLUX_BUCKET}")
+    from(bucket: "{influx.bucket}")
     |> range(start: "{start.isoformat()}", stop: "{end.isoformat()}")
     |> filter(fn: (r) => r._measurement == "predictions" and r._field == "predicted_kwh")
     |> aggregateWindow(every: 1h, fn: mean, createEmpty: false)
-    |> yield(name: "mean")
+    |> keep(columns: ["_time", "_value"])
     '''
 
-    df_pred = get_data(client, query_pred)
+    df_pred = get_data(influx, query_pred)
     if df_pred.empty:
         log("No prediction data found for yesterday. Exiting.")
         return
@@ -89,14 +73,14 @@ def main():
 
     # Query actual consumption values (measurement: 'energy_consumption', field 'consumption_kwh')
     query_actual = f'''
-    from(bucket: "{INFLUX_BUCKET}")
+    from(bucket: "{influx.bucket}")
     |> range(start: "{start.isoformat()}", stop: "{end.isoformat()}")
     |> filter(fn: (r) => r._measurement == "energy_consumption" and r._field == "consumption_kwh")
     |> aggregateWindow(every: 1h, fn: mean, createEmpty: false)
-    |> yield(name: "mean")
+    |> keep(columns: ["_time", "_value"])
     '''
 
-    df_actual = get_data(client, query_actual)
+    df_actual = get_data(influx, query_actual)
     if df_actual.empty:
         log("No actual consumption data found for yesterday. Exiting.")
         return
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Feature construction shared by training and inference.
+
+A feature spec is a plain dict saved next to the model as
+``<model>.features.json``, so prediction rebuilds exactly the columns the
+model was trained on::
+
+    {"target": "consumption_kwh",
+     "calendar": ["hour", "day_of_week", "day", "month", "year", "is_weekend"],
+     "exogenous": [],
+     "lags": [1, 2, 3, 24],
+     "rolling_means": [3, 6]}
+
+Columns are ordered calendar, exogenous, ``lag_<n>h``, ``rolling_mean_<n>h``.
+Lags and rolling means are positional: on a gapless hourly series ``lag_24h``
+is the value 24 hours earlier, and ``rolling_mean_<n>h`` is the mean of the
+``n`` values before the current one (NaN while any of them is missing), the
+same as ``shift(1).rolling(n).mean()``.
+
+A spec with ``"resolution_minutes"`` (a divisor of 60, see ``with_resolution``)
+describes a series sampled that often. Lags and windows stay in hours:
+``lag_1h`` is 4 steps back at 15 minutes, and ``rolling_mean_<n>h`` averages
+the ``n`` hours of steps ending with ``lag_1h``. Every feature therefore looks
+at least an hour back, so forecasting predicts a whole hour of steps at once.
+
+Timestamps are int64 nanoseconds. Naive datetimes are taken as UTC, as the
+InfluxDB writes do.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CALENDAR = ("hour", "day_of_week", "day", "month", "year", "is_weekend", "minute")
+
+CONSUMPTION_SPEC = {
+    "target": "consumption_kwh",
+    "calendar": ["hour", "day_of_week", "day", "month", "year", "is_weekend"],
+    "exogenous": [],
+    "lags": [1, 2, 3, 24],
+    "rolling_means": [3, 6],
+}
+
+SOLAR_SPEC = {
+    "target": "production_kwh",
+    "calendar": ["hour", "day_of_week", "day", "month", "year"],
+    "exogenous": ["clouds", "temp", "wind", "pv_kw"],
+    "lags": [1, 24],
+    "rolling_means": [],
+}
+
+_NS_PER_HOUR = 3600 * 10**9
+_NS_PER_DAY = 24 * _NS_PER_HOUR
+_CALENDAR_CACHE = OrderedDict()
+_CALENDAR_CACHE_SIZE = 16
+_UNIT_SCALE = {"s": 10**9, "ms": 10**6, "us": 10**3, "ns": 1}
+
+
+# ---------------- Spec ----------------
+def feature_names(spec):
+    return (list(spec["calendar"]) + list(spec["exogenous"])
+            + [f"lag_{n}h" for n in spec["lags"]]
+            + [f"rolling_mean_{n}h" for n in spec["rolling_means"]])
+
+
+def steps_per_hour(spec):
+    return 60 // spec.get("resolution_minutes", 60)
+
+
+def with_resolution(spec, minutes):
+    """Copy of ``spec`` for a series sampled every ``minutes``; sub-hourly specs get a ``minute`` column."""
+    minutes = int(minutes)
+    if minutes <= 0 or 60 % minutes:
+        raise ValueError(f"Resolution must divide an hour, got {minutes} minutes")
+    spec = {key: list(value) if isinstance(value, list) else value for key, value in spec.items()}
+    spec.pop("resolution_minutes", None)
+    if minutes < 60:
+        spec["resolution_minutes"] = minutes
+        if "minute" not in spec["calendar"]:
+            spec["calendar"].append("minute")
+    return spec
+
+
+def _offsets(spec):
+    """Lag offsets and rolling window lengths in steps."""
+    per_hour = steps_per_hour(spec)
+    return [lag * per_hour for lag in spec["lags"]], [window * per_hour for window in spec["rolling_means"]]
+
+
+def history_needed(spec):
+    """Number of past values (steps) the lag and rolling features look back over."""
+    per_hour = steps_per_hour(spec)
+    lags, windows = _offsets(spec)
+    return max(lags + [window + per_hour - 1 for window in windows] + [0])
+
+
+def spec_path(model_path):
+    return os.path.splitext(model_path)[0] + ".features.json"
+
+
+def save_spec(spec, model_path):
+    path = spec_path(model_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(spec, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_spec(model_path, default):
+    """Spec saved with the model, or ``default`` for models trained before specs were saved."""
+    try:
+        with open(spec_path(model_path), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+# ---------------- Calendar ----------------
+def to_ns(times):
+    """int64 UTC nanoseconds from datetimes, a DatetimeIndex/Series or an int64 array."""
+    if isinstance(times, np.ndarray) and times.dtype == np.int64:
+        return times
+    # asi8 is epoch-based for both naive and tz-aware indexes; scaling it is far
+    # cheaper than as_unit("ns"), which matters for memoized calendar lookups
+    index = pd.DatetimeIndex(times)
+    scale = _UNIT_SCALE[index.unit]
+    return index.asi8 * scale if scale != 1 else index.asi8
+
+
+def calendar_features(times, names=CALENDAR):
+    """Calendar columns for ``times`` as a read-only (n, len(names)) int16 array.
+
+    Evenly spaced grids are memoized per (first, step, count), so the
+    hourly grids that training, evaluation and prediction ask for repeatedly
+    are computed once per process. Irregular timestamps (production with
+    gaps) are not cached: their endpoints and count don't identify them.
+    """
+    ns = to_ns(times)
+    names = tuple(names)
+    key = None
+    if len(ns) > 1:
+        steps = np.diff(ns)
+        if np.all(steps == steps[0]):
+            key = (int(ns[0]), int(steps[0]), len(ns), names)
+    elif len(ns):
+        key = (int(ns[0]), 0, 1, names)
+    if key is not None and key in _CALENDAR_CACHE:
+        _CALENDAR_CACHE.move_to_end(key)
+        return _CALENDAR_CACHE[key]
+
+    stamps = ns.astype("datetime64[ns]")
+    years = stamps.astype("datetime64[Y]")
+    months = stamps.astype("datetime64[M]")
+    day_of_week = ((ns // _NS_PER_DAY) + 3) % 7  # 1970-01-01 was a Thursday
+    columns = {
+        "hour": (ns // _NS_PER_HOUR) % 24,
+        "day_of_week": day_of_week,
+        "day": (stamps.astype("datetime64[D]") - months).astype("int64") + 1,
+        "month": (months - years).astype("int64") + 1,
+        "year": years.astype("int64") + 1970,
+        "is_weekend": day_of_week >= 5,
+        "minute": (ns // (60 * 10**9)) % 60,
+    }
+    out = np.empty((len(ns), len(names)), dtype=np.int16)
+    for i, name in enumerate(names):
+        out[:, i] = columns[name]
+    out.flags.writeable = False
+
+    if key is not None:
+        _CALENDAR_CACHE[key] = out
+        if len(_CALENDAR_CACHE) > _CALENDAR_CACHE_SIZE:
+            _CALENDAR_CACHE.popitem(last=False)
+    return out
+
+
+# ---------------- Batch (training) ----------------
+def build_matrix(spec, times, target, exogenous=None):
+    """Feature matrix (n, k) float32 for every row of a series.
+
+    ``target`` is the series the lags are taken from, ``exogenous`` a mapping
+    of column name to array. Rows whose lags reach before the start are NaN;
+    use ``complete_rows`` to drop them.
+    """
+    target = np.asarray(target, dtype=np.float64)
+    n = len(target)
+    names = feature_names(spec)
+    lags, windows = _offsets(spec)
+    shift = steps_per_hour(spec) - 1
+    X = np.empty((n, len(names)), dtype=np.float32)
+    col = len(spec["calendar"])
+    X[:, :col] = calendar_features(times, spec["calendar"])
+    for name in spec["exogenous"]:
+        X[:, col] = exogenous[name]
+        col += 1
+    for lag in lags:
+        X[:lag, col] = np.nan
+        X[lag:, col] = target[:n - lag]
+        col += 1
+    if windows:
+        # Running sums give every window mean in O(n); windows containing a NaN stay NaN
+        missing = np.isnan(target)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(missing, 0.0, target))])
+        gaps = np.concatenate([[0], np.cumsum(missing)])
+    for window in windows:
+        # Row i averages the steps i - shift - window .. i - shift - 1
+        first = min(window + shift, n)
+        X[:first, col] = np.nan
+        if n > first:
+            means = (sums[window:n - shift] - sums[:n - shift - window]) / window
+            means[(gaps[window:n - shift] - gaps[:n - shift - window]) > 0] = np.nan
+            X[first:, col] = means
+        col += 1
+    return X
+
+
+def direct_targets(target, horizon):
+    """(n, horizon) targets for direct forecasting: row i holds the values at i .. i + horizon - 1.
+
+    Paired with ``build_matrix``, row i then maps the features known before
+    hour i to the next ``horizon`` hours. Targets past the end are NaN.
+    """
+    target = np.asarray(target, dtype=np.float64)
+    n = len(target)
+    Y = np.full((n, horizon), np.nan)
+    for h in range(horizon):
+        Y[:n - h, h] = target[h:]
+    return Y
+
+
+def complete_rows(X, y):
+    """Boolean mask of rows with no missing feature or target (``y`` may be 1-D or 2-D)."""
+    missing = np.isnan(np.asarray(y, dtype=np.float64))
+    if missing.ndim > 1:
+        missing = missing.any(axis=1)
+    return ~(np.isnan(X).any(axis=1) | missing)
+
+
+# ---------------- Inference ----------------
+def predict_rows(model, X, names):
+    """``model.predict`` on a float32 matrix, named if the model was fitted on a DataFrame."""
+    if getattr(model, "feature_names_in_", None) is not None:
+        X = pd.DataFrame(X, columns=names)
+    return model.predict(X)
+
+
+def _check_quantiles(model, quantiles):
+    if quantiles is not None and not hasattr(model, "predict_trees"):
+        raise ValueError("Quantile forecasts need a packed forest model")
+
+
+def predict_spread(model, X, quantiles):
+    """Mean (rows, outputs) and ``quantiles`` (q, rows, outputs) across the trees of a PackedForest.
+
+    All trees are evaluated in one vectorized pass; the mean equals ``model.predict``.
+    """
+    trees = model.predict_trees(X)
+    return trees.mean(axis=0, dtype=np.float64), np.quantile(trees, quantiles, axis=0)
+
+
+def recursive_forecast(model, spec, history, future_times, exogenous=None, quantiles=None):
+    """Predict step by step, feeding predictions back as the newest lags.
+
+    ``history`` holds the observed values immediately before the first
+    future step, at least ``history_needed(spec)`` of them. Steps closer
+    together than the shortest look-back (one hour at sub-hourly resolution)
+    are predicted in one call.
+
+    With ``quantiles`` (a forest model), returns ``(predictions, bands)``
+    where ``bands[i]`` is quantile ``i`` of the tree predictions per step,
+    taken along the path of mean predictions.
+    """
+    _check_quantiles(model, quantiles)
+    names = feature_names(spec)
+    steps = len(future_times)
+    buffer = np.concatenate([np.asarray(history, dtype=np.float64), np.empty(steps)])
+    base = len(history)
+    lags, windows = _offsets(spec)
+    lags = np.asarray(lags, dtype=np.int64)
+    per_hour = steps_per_hour(spec)
+    block = max(1, min(list(lags) + ([per_hour] if windows else []) + [steps]))
+
+    X = np.empty((steps, len(names)), dtype=np.float32)
+    col = len(spec["calendar"])
+    X[:, :col] = calendar_features(future_times, spec["calendar"])
+    for name in spec["exogenous"]:
+        X[:, col] = exogenous[name]
+        col += 1
+
+    predictions = np.empty(steps)
+    bands = np.empty((len(quantiles), steps)) if quantiles is not None else None
+    for start in range(0, steps, block):
+        stop = min(start + block, steps)
+        pos = np.arange(base + start, base + stop)
+        rows = X[start:stop]
+        rows[:, col:col + len(lags)] = buffer[pos[:, None] - lags[None, :]]
+        for j, window in enumerate(windows):
+            for r, p in enumerate(pos):
+                end = p - per_hour + 1
+                rows[r, col + len(lags) + j] = buffer[end - window:end].mean()
+        if bands is None:
+            predictions[start:stop] = predict_rows(model, rows, names)
+        else:
+            mean, spread = predict_spread(model, rows, quantiles)
+            predictions[start:stop] = mean[:, 0]
+            bands[:, start:stop] = spread[:, :, 0]
+        buffer[base + start:base + stop] = predictions[start:stop]
+    return predictions if bands is None else (predictions, bands)
+
+
+def direct_forecast(model, spec, history, future_times, exogenous=None, quantiles=None):
+    """All horizons from one predict call of a multi-output model trained on ``direct_targets``.
+
+    The single feature row is the one for the first future step, built from
+    ``history`` exactly as in training; returns ``len(future_times)`` values,
+    or ``(predictions, bands)`` with ``quantiles`` as in ``recursive_forecast``.
+    """
+    _check_quantiles(model, quantiles)
+    names = feature_names(spec)
+    history = np.asarray(history, dtype=np.float64)
+    row = np.empty((1, len(names)), dtype=np.float32)
+    col = len(spec["calendar"])
+    row[0, :col] = calendar_features(future_times[:1], spec["calendar"])[0]
+    for name in spec["exogenous"]:
+        row[0, col] = np.asarray(exogenous[name])[0]
+        col += 1
+    lags, windows = _offsets(spec)
+    end = len(history) - steps_per_hour(spec) + 1
+    for lag in lags:
+        row[0, col] = history[-lag]
+        col += 1
+    for window in windows:
+        row[0, col] = history[end - window:end].mean()
+        col += 1
+    if quantiles is None:
+        predictions = np.asarray(predict_rows(model, row, names), dtype=np.float64).reshape(-1)
+    else:
+        mean, spread = predict_spread(model, row, quantiles)
+        predictions, bands = mean[0], spread[:, 0, :]
+    steps = len(future_times)
+    if len(predictions) < steps:
+        raise ValueError(f"Model forecasts {len(predictions)} steps, {steps} requested")
+    return predictions[:steps] if quantiles is None else (predictions[:steps], bands[:, :steps])
+
+
+def forecast(model, spec, history, future_times, mode="recursive", exogenous=None, quantiles=None):
+    """Dispatch to ``recursive_forecast`` or ``direct_forecast``."""
+    if mode == "direct":
+        return direct_forecast(model, spec, history, future_times, exogenous, quantiles)
+    return recursive_forecast(model, spec, history, future_times, exogenous, quantiles)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Fleet mode: train, forecast and publish to Loxone for many households from one host.
+
+Sites are listed in ``fleet.json`` next to settings.json:
+
+    {
+      "workers": 8,
+      "defaults": {"forecast_horizon_hours": 24},
+      "sites": [
+        {"name": "house-1", "bucket": "house-1",
+         "loxone": {"ip": "192.168.1.10", "user": "admin", "password": "secret"}},
+        {"name": "house-2", "bucket": "shared", "tags": {"site": "house-2"},
+         "influx_url": "http://10.0.0.5:8086", "token_file": "/path/to/token"}
+      ]
+    }
+
+Every site takes the plugin settings, then ``defaults``, then its own keys,
+so any consumption setting (``model_backend``, ``forecast_resolution_minutes``,
+``forecast_quantiles`` ...) can differ per site. ``bucket`` and ``tags``
+select the site's readings (``tags`` become an extra filter and are written
+on its predictions), ``model_path`` defaults to ``sites/<name>/energy_model.pkl``
+and ``loxone`` is where its 4-hour block totals go.
+
+The tasks are the runs of ``train_model.py``, ``prediction.py`` and
+``send_predictions.py`` (see ``consumption.py``) with the site's settings:
+``training_mode`` "search" and "incremental" work per site, the search
+running inside the site's worker, and solar block totals are sent when the
+site's bucket has a ``solar_forecast``. Solar forecasts carry no site tags,
+so sites sharing a bucket share its solar forecast.
+
+Sites run in a pool of forked worker processes that is reused for every site,
+so NumPy and scikit-learn are imported once by the controller and each
+worker keeps its InfluxDB connections between sites. Each fit is
+single-threaded, so N workers use N cores. The timing of every site is
+logged and written to ``fleet_report.json``.
+
+    python3 fleet.py [train|forecast|send|all] [--sites house-1,house-2] [--workers N]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from threadpoolctl import threadpool_limits
+
+import consumption
+from plugin_log import get_logger
+from influx_db import InfluxDB, resolve_config, TOKEN_FILE
+from forecaster import ForecastModel
+
+DATA_DIR = "/opt/loxberry/data/plugins/consumption_prediction"
+SETTINGS_PATH = os.path.join(DATA_DIR, "settings.json")
+FLEET_PATH = os.path.join(DATA_DIR, "fleet.json")
+REPORT_PATH = os.path.join(DATA_DIR, "fleet_report.json")
+LOGFILE = os.path.join(DATA_DIR, "fleet.log")
+
+TASKS = ("train", "forecast", "send")
+
+
+# ---------------- Sites ----------------
+def load_sites(path=FLEET_PATH, settings_path=SETTINGS_PATH):
+    """(sites, workers) from the fleet file; every site is a complete settings dict with a ``name``."""
+    try:
+        with open(settings_path, "r") as f:
+            base = json.load(f)
+    except (FileNotFoundError, ValueError):
+        base = {}
+    with open(path, "r") as f:
+        fleet = json.load(f)
+
+    sites, names = [], set()
+    for entry in fleet.get("sites", []):
+        name = entry.get("name")
+        if not name or name in names:
+            raise ValueError(f"Every site needs a unique name, got {name!r}")
+        names.add(name)
+        site = {**base, **fleet.get("defaults", {}), **entry}
+        if "bucket" in entry:
+            site["influx_bucket"] = entry["bucket"]
+        site.setdefault("tags", {})
+        site.setdefault("model_path", os.path.join(DATA_DIR, "sites", name, "energy_model.pkl"))
+        site.setdefault("cache_dir", os.path.join(os.path.dirname(site["model_path"]), "history"))
+        sites.append(site)
+    return sites, fleet.get("workers")
+
+
+# ---------------- Workers ----------------
+# Per worker process: InfluxDB clients by (url, org, token), reused across sites
+_CLIENTS = {}
+# Per worker process: the thread limit, referenced so it stays in force
+_LIMITS = None
+
+
+def _init_worker():
+    global _LIMITS
+    _CLIENTS.clear()
+    # One thread per fit or forecast; the pool provides the parallelism
+    _LIMITS = threadpool_limits(1)
+
+
+def _influx(site):
+    """(client, site) for a site; the returned site names its bucket, since sites can share a client."""
+    config = resolve_config(site, token_file=site.get("token_file", TOKEN_FILE))
+    key = (config.url, config.org, config.token)
+    if key not in _CLIENTS:
+        _CLIENTS[key] = InfluxDB(config)
+    return _CLIENTS[key], {**site, "influx_bucket": config.bucket}
+
+
+def _problems(notes):
+    """A log function noting only warnings and errors, so a site's report stays one line."""
+    def log(line):
+        if line.startswith(("[warning]", "[error]")):
+            notes.append(line)
+    return log
+
+
+def train_site(site, notes):
+    """Train the site's model as train_model.py does, in the site's ``training_mode``."""
+    influx, site = _influx(site)
+    # The search runs in this worker; the pool provides the parallelism
+    metadata = consumption.train(influx, {**site, "search_workers": 1}, n_jobs=1, log=_problems(notes))
+    if metadata is None:
+        notes.append("no new data, model unchanged")
+    else:
+        notes.append(f"trained {metadata['backend']} on {metadata['rows']} rows "
+                     f"({metadata['incremental_updates']} incremental updates)")
+
+
+def forecast_site(site, notes):
+    """Forecast the next ``forecast_horizon_hours`` from midnight as prediction.py does."""
+    influx, site = _influx(site)
+    model = ForecastModel(site["model_path"], log=notes.append).load()
+    _, times, predictions, bands = consumption.forecast(influx, site, model)
+    notes.append(f"wrote {consumption.write_forecast(influx, site, times, predictions, bands)} predictions")
+
+
+def send_site(site, notes):
+    """Send the next 24 hours of block totals to the site's Loxone, as send_predictions.py does."""
+    loxone = site.get("loxone")
+    if not loxone:
+        notes.append("no Loxone target, nothing sent")
+        return
+    influx, site = _influx(site)
+    failed = sent = 0
+    unread = []
+    # Each series on its own, so a failing solar query still sends the consumption blocks
+    for name, fetch in consumption.BLOCK_SERIES.items():
+        try:
+            totals = fetch(influx, site)
+        except Exception as e:
+            notes.append(f"[error] Failed to fetch {name} predictions: {e}")
+            unread.append(name)
+            continue
+        if not totals:
+            notes.append(f"no {name} predictions found")
+            continue
+        failed += consumption.send_blocks(loxone, totals, log=_problems(notes))
+        sent += len(totals)
+    notes.append(f"sent {sent - failed} of {sent} inputs to {loxone['ip']}")
+    if failed or unread:
+        raise RuntimeError(f"{failed} Loxone inputs failed, {len(unread)} series not read")
+
+
+RUNNERS = {"train": train_site, "forecast": forecast_site, "send": send_site}
+
+
+def run_site(job):
+    """Run ``tasks`` for one site in order; returns a picklable report, never raises."""
+    site, tasks = job
+    report = {"site": site["name"], "status": "ok", "pid": os.getpid(), "seconds": {}, "notes": []}
+    for task in tasks:
+        start = time.perf_counter()
+        try:
+            RUNNERS[task](site, report["notes"])
+        except Exception as e:
+            report["status"] = f"{task} failed"
+            report["notes"].append(f"{task}: {e}")
+            break
+        finally:
+            report["seconds"][task] = round(time.perf_counter() - start, 3)
+    report["total_seconds"] = round(sum(report["seconds"].values()), 3)
+    return report
+
+
+# ---------------- Pool ----------------
+def start_pool(workers, initializer=_init_worker):
+    """``workers`` forked processes; start them before any thread (such as a logger's listener) runs."""
+    # fork: workers inherit the imported libraries instead of importing them again
+    context = multiprocessing.get_context("fork")
+    return context.Pool(workers, initializer=initializer)
+
+
+def run_pool(fn, jobs, workers=None, initializer=_init_worker):
+    """Yield ``fn(job)`` for every job, in completion order, from ``workers`` forked processes."""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    with start_pool(workers, initializer) as pool:
+        yield from pool.imap_unordered(fn, jobs)
+
+
+def run_fleet(pool, workers, sites, tasks, log=print):
+    """Run ``tasks`` for every site on ``pool`` (of ``workers`` processes) and return the report."""
+    log(f"Running {'+'.join(tasks)} for {len(sites)} sites on {workers} workers.")
+    started = time.perf_counter()
+    reports = []
+    for report in pool.imap_unordered(run_site, [(site, tasks) for site in sites]):
+        reports.append(report)
+        stages = ", ".join(f"{task} {seconds:.2f}s" for task, seconds in report["seconds"].items())
+        log(f"[{report['site']}] {report['status']} in {report['total_seconds']:.2f}s ({stages}): "
+            f"{'; '.join(report['notes'])}")
+    wall = time.perf_counter() - started
+    busy = sum(report["total_seconds"] for report in reports)
+    failed = [report["site"] for report in reports if report["status"] != "ok"]
+    log(f"Fleet done in {wall:.1f}s: {len(reports) - len(failed)} ok, {len(failed)} failed "
+        f"{failed if failed else ''}; {busy:.1f}s of site work, {busy / wall if wall else 0:.1f}x parallel "
+        f"on {workers} workers.")
+    return {"tasks": list(tasks), "workers": workers, "wall_seconds": round(wall, 3),
+            "finished": datetime.now(timezone.utc).isoformat(),
+            "sites": sorted(reports, key=lambda report: report["site"])}
+
+
+# ---------------- Main ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train, forecast and publish all fleet sites.")
+    parser.add_argument("task", nargs="?", default="all", choices=TASKS + ("all",))
+    parser.add_argument("--sites", help="comma-separated site names (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: fleet.json, else CPU count)")
+    args = parser.parse_args(argv)
+
+    problem = None
+    try:
+        sites, workers = load_sites()
+    except (FileNotFoundError, ValueError) as e:
+        sites, workers, problem = [], None, f"Could not load {FLEET_PATH}: {e}"
+    if args.sites and not problem:
+        wanted = set(args.sites.split(","))
+        unknown = wanted - {site["name"] for site in sites}
+        if unknown:
+            problem = f"Unknown sites: {sorted(unknown)}"
+        sites = [site for site in sites if site["name"] in wanted]
+    if problem or not sites:
+        log = get_logger("fleet", LOGFILE, tag="FLEET", console=True).info
+        log(f"[error] {problem}" if problem else "No sites configured.")
+        return 1 if problem else 0
+
+    workers = max(1, min(args.workers or workers or os.cpu_count() or 1, len(sites)))
+    # The workers are forked before the logger starts its listener thread, so no lock that thread
+    # holds can be copied into them locked
+    with start_pool(workers) as pool:
+        log = get_logger("fleet", LOGFILE, tag="FLEET", console=True).info
+        report = run_fleet(pool, workers, sites, TASKS if args.task == "all" else (args.task,), log)
+    tmp = REPORT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, REPORT_PATH)
+    return 0 if all(site["status"] == "ok" for site in report["sites"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Resident consumption forecaster.
+
+Keeps the model and the recent history (at the model's resolution) in memory
+and re-forecasts the next hours shortly after every full hour, or immediately when any message
+arrives on the request topic. Re-forecasts are written to ``predictions_rolling``; the daily
+forecast evaluation.py scores stays with prediction.py. The history is queried from InfluxDB once at
+startup and then follows the consumption readings on MQTT. A new model
+artifact written by train_model.py is picked up without a restart.
+
+All times are UTC: the ingestion daemon stamps readings with the clock of
+its container, which runs in UTC, and live readings and forecast steps use
+the same clock so seeded and live steps line up.
+"""
+
+import os
+import time
+import signal
+import sys
+import json
+import threading
+from datetime import datetime, timezone
+import numpy as np
+import paho.mqtt.client as mqtt
+from influx_db import get_influx
+from plugin_log import get_logger
+from topic_router import TopicRouter, default_routes
+from forecaster import (ROLLING_MEASUREMENT, ForecastModel, RollingHistory, forecast_times, prediction_points,
+                        mqtt_payload)
+from consumption import MODEL_PATH, forecast_hours, quantiles
+
+# ---------------- Setup Logging ----------------
+LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/forecast_service.log"
+logger = get_logger("forecast_service", LOGFILE, tag="CONSUMPTION", console=True)
+log = logger.info
+
+# ---------------- Load Settings ----------------
+file_path = '/opt/loxberry/data/plugins/consumption_prediction/settings.json'
+with open(file_path, 'r') as file:
+    settings = json.load(file)
+
+# ---------------- Configuration ----------------
+MQTT_BROKER = settings['mqtt_broker']
+MQTT_PORT = int(settings['mqtt_port'])
+MQTT_USERNAME = settings['mqtt_username']
+MQTT_PASSWORD = settings['mqtt_password']
+MQTT_TOPIC = settings['mqtt_topic_prediction']
+# Any message on this topic triggers an immediate re-forecast
+REQUEST_TOPIC = settings.get('mqtt_topic_forecast_request') or f"{MQTT_TOPIC}/request"
+# Consumption readings come in on the same topics the ingestion daemon routes to energy_consumption
+ROUTES = [route for route in (settings.get('mqtt_routes') or default_routes(settings))
+          if route.get('measurement') == "energy_consumption" and route.get('field') == "consumption_kwh"]
+CLIENT_ID = "python-forecast-service"
+
+PIDFILE = "/opt/loxberry/data/plugins/consumption_prediction/forecast_service.pid"
+
+FORECAST_HOURS = forecast_hours(settings)
+QUANTILES = quantiles(settings)
+# Minute past every full hour the rolling forecast runs at
+FORECAST_MINUTE = int(settings.get('forecast_service_minute', 1))
+HISTORY_HOURS = 48
+MODEL_CHECK_INTERVAL = float(settings.get('model_reload_interval', 60))
+
+# ---------------- Graceful Shutdown ----------------
+running = True
+def signal_handler(sig, frame):
+    global running
+    running = False
+    print("Shutting down...")
+signal.signal(signal.SIGINT, signal_handler)
+signal.signal(signal.SIGTERM, signal_handler)
+
+# ---------------- Load Model ----------------
+model = ForecastModel(MODEL_PATH, log=log)
+try:
+    model.load()
+except Exception as e:
+    log(f"Error loading model: {e}")
+    sys.exit(1)
+log(f"Loaded model ({model.header.get('kind')}, {model.mode} forecasting)")
+
+# ---------------- InfluxDB Client ----------------
+try:
+    influx = get_influx(settings)
+except Exception as e:
+    log(f"InfluxDB connection failed: {e}")
+    sys.exit(1)
+
+# ---------------- History ----------------
+# UTC, the clock the ingestion daemon stamps readings with
+def now_utc():
+    return datetime.now(timezone.utc)
+
+def now_ns():
+    return int(np.datetime64(now_utc().replace(tzinfo=None), "ns").astype(np.int64))
+
+def hour_start(ns):
+    return ns - ns % (3600 * 10**9)
+
+def flux_time(ns):
+    return f"{np.datetime64(ns, 'ns').astype('datetime64[s]')}Z"
+
+def new_history():
+    steps = max(HISTORY_HOURS * 60 // model.resolution_minutes, model.history_needed)
+    return RollingHistory(steps, model.resolution_minutes)
+
+history = new_history()
+
+def seed_history():
+    """Closed steps from the per-step means in InfluxDB, the open step from its raw readings."""
+    open_step = history.step_start(now_ns())
+    minutes = model.resolution_minutes
+    source = f'''
+from(bucket: "{influx.bucket}")
+  |> range(start: {{start}}, stop: {{stop}})
+  |> filter(fn: (r) => r._measurement == "energy_consumption" and r._field == "consumption_kwh")
+'''
+    means = source.format(start=f"-{history.steps * minutes + 60}m", stop=flux_time(open_step)) + f'''
+  |> aggregateWindow(every: {minutes}m, fn: mean, createEmpty: false, timeSrc: "_start")
+  |> keep(columns: ["_time", "_value"])
+'''
+    raw = source.format(start=flux_time(open_step), stop="now()") + '''
+  |> keep(columns: ["_time", "_value"])
+'''
+    times, values = influx.read_series(means, value_dtype=np.float64)
+    history.seed(times, values, open_step)
+    times, values = influx.read_series(raw, value_dtype=np.float64)
+    for t, value in zip(times, values):
+        history.add(int(t), float(value))
+    log(f"Seeded history with {np.count_nonzero(~np.isnan(history.values))} of {history.steps} "
+        f"{minutes}-minute steps and {len(times)} readings of the current step")
+
+try:
+    seed_history()
+except Exception as e:
+    log(f"Error querying InfluxDB: {e}")
+    sys.exit(1)
+
+# ---------------- Forecast ----------------
+def run_forecast(reason):
+    minutes = model.resolution_minutes
+    now = now_utc()
+    start = now.replace(minute=now.minute - now.minute % minutes, second=0, microsecond=0)
+    times = forecast_times(start, FORECAST_HOURS, minutes)
+    past = history.window(model.history_needed)
+    if past is None:
+        log(f"Not enough history for a forecast (need {model.history_needed} steps), skipping")
+        return
+    started = time.perf_counter()
+    predictions, bands = model.forecast(past, times, QUANTILES)
+    elapsed = time.perf_counter() - started
+
+    try:
+        influx.write_points(prediction_points(times, predictions, QUANTILES, bands, measurement=ROLLING_MEASUREMENT))
+    except Exception as e:
+        logger.error(f"Error writing predictions to InfluxDB: {e}")
+    payload = mqtt_payload(start, times, predictions, minutes, QUANTILES, bands)
+    result = client.publish(MQTT_TOPIC, json.dumps(payload))
+    if result.rc != mqtt.MQTT_ERR_SUCCESS:
+        logger.error(f"Error publishing predictions to MQTT (rc={result.rc})")
+    log(f"Forecast from {start} ({reason}): {len(times)} steps of {minutes} min over {FORECAST_HOURS}h, "
+        f"computed in {elapsed * 1000:.1f} ms")
+
+# ---------------- MQTT ----------------
+router = TopicRouter(ROUTES)
+forecast_requested = threading.Event()
+
+def on_message(client, userdata, msg):
+    try:
+        if msg.topic == REQUEST_TOPIC:
+            forecast_requested.set()
+            return
+        route = router.resolve(msg.topic)
+        if route is None:
+            return
+        try:
+            value = route.parse(msg.payload.decode().strip())
+        except ValueError:
+            return
+        history.add(now_ns(), value)
+    except Exception as e:
+        logger.error(f"Error processing message from topic '{msg.topic}': {e}")
+
+def on_connect(client, userdata, flags, reason_code, properties):
+    # Subscribe here so subscriptions are restored after every reconnect
+    client.subscribe([(pattern, 0) for pattern in router.subscriptions()] + [(REQUEST_TOPIC, 0)])
+
+client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID)
+client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+client.on_connect = on_connect
+client.on_message = on_message
+client.connect(MQTT_BROKER, MQTT_PORT, 60)
+client.loop_start()
+
+# ---------------- Write PID ----------------
+os.makedirs(os.path.dirname(PIDFILE), exist_ok=True)
+with open(PIDFILE, "w") as f:
+    f.write(str(os.getpid()))
+
+log(f"Forecast service launched, listening on {router.subscriptions()} and '{REQUEST_TOPIC}'")
+
+# ---------------- Main Loop ----------------
+def next_slot(ns):
+    slot = hour_start(ns) + FORECAST_MINUTE * 60 * 10**9
+    return slot if slot > ns else slot + 3600 * 10**9
+
+last_model_check = time.monotonic()
+next_forecast = next_slot(now_ns())
+try:
+    try:
+        run_forecast("startup")
+    except Exception as e:
+        logger.error(f"Forecast failed: {e}")
+    while running:
+        reason = "request" if forecast_requested.wait(timeout=1) else None
+        forecast_requested.clear()
+        if time.monotonic() - last_model_check >= MODEL_CHECK_INTERVAL:
+            last_model_check = time.monotonic()
+            if model.reload_if_changed():
+                reason = "new model"
+                # A new resolution or a longer look-back needs a freshly queried history
+                if (history.step_ns != model.resolution_minutes * 60 * 10**9
+                        or model.history_needed > history.steps):
+                    history = new_history()
+                    try:
+                        seed_history()
+                    except Exception as e:
+                        logger.error(f"Error querying InfluxDB: {e}")
+        now = now_ns()
+        history.advance(now)
+        if now >= next_forecast:
+            reason = reason or "hourly"
+            next_forecast = next_slot(now)
+        if reason:
+            try:
+                run_forecast(reason)
+            except Exception as e:
+                logger.error(f"Forecast failed: {e}")
+finally:
+    client.loop_stop()
+    client.disconnect()
+    influx.close()
+    if history.late:
+        log(f"Dropped {history.late} readings that arrived after their hour closed")
+    if os.path.exists(PIDFILE):
+        os.remove(PIDFILE)
+    log("Forecast service stopped")
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Consumption forecasting shared by ``prediction.py`` and ``forecast_service.py``.
+
+``ForecastModel`` holds the loaded model with its feature spec and forecast
+mode and reloads it when a new artifact is written; forests also give quantile
+bands across their trees. ``RollingHistory`` keeps
+the per-step means (hourly, or every ``resolution_minutes`` of the spec) the
+lag features need and is updated reading by reading, so a resident process
+never has to query InfluxDB again after startup.
+"""
+
+import os
+import threading
+from datetime import timedelta
+
+import numpy as np
+from influxdb_client import Point
+
+from features import CONSUMPTION_SPEC, forecast, history_needed, load_spec
+from model_artifact import artifact_path, is_forest, load_model, pack_forest
+
+_NS_PER_MINUTE = 60 * 10**9
+
+
+# ---------------- Model ----------------
+class ForecastModel:
+    """The consumption model at ``model_path`` (artifact or joblib pickle), reloadable in place."""
+
+    def __init__(self, model_path, log=print):
+        self.model_path = model_path
+        self.log = log
+        self.model = None
+        self.header = {}
+        self.spec = None
+        self.mode = "recursive"
+        self._stamp = None
+        self._packed = None
+        self._warned_quantiles = False
+
+    def _file(self):
+        path = artifact_path(self.model_path)
+        return path if os.path.exists(path) else self.model_path
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self._file())
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        stamp = self._file_stamp()
+        if stamp is None:
+            raise FileNotFoundError(f"Model file not found: {self.model_path}")
+        model, header = load_model(self.model_path)
+        self.model, self.header, self._stamp = model, header, stamp
+        self._packed, self._warned_quantiles = None, False
+        self.spec = header.get("feature_spec") or load_spec(self.model_path, CONSUMPTION_SPEC)
+        self.mode = header.get("forecast_mode", "recursive")
+        return self
+
+    def reload_if_changed(self):
+        """Load the model again if its file changed since the last load; True when reloaded.
+
+        train_model.py replaces the artifact atomically, so a changed stamp is
+        always a complete file. A failed reload keeps the previous model.
+        """
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            self.log(f"Model reload failed, keeping the previous model: {e}")
+            self._stamp = stamp
+            return False
+        self.log(f"Reloaded model ({self.header.get('kind')}, trained through "
+                 f"{self.header.get('trained_through', 'unknown')}, {self.mode} forecasting)")
+        return True
+
+    @property
+    def history_needed(self):
+        return history_needed(self.spec)
+
+    @property
+    def resolution_minutes(self):
+        return self.spec.get("resolution_minutes", 60)
+
+    def _forest(self):
+        """The model as a PackedForest (packed once for joblib pickles), or None if it is no forest."""
+        if hasattr(self.model, "predict_trees"):
+            return self.model
+        if self._packed is None and is_forest(self.model):
+            self._packed = pack_forest(self.model)
+        return self._packed
+
+    def forecast(self, history, future_times, quantiles=None):
+        """``(predictions, bands)``; bands is None without ``quantiles`` or when the model is not a forest."""
+        forest = self._forest() if quantiles else None
+        if quantiles and forest is None:
+            if not self._warned_quantiles:
+                self.log(f"Quantile forecasts need a forest model, not '{self.header.get('backend')}'; "
+                         f"writing point forecasts only")
+                self._warned_quantiles = True
+        if forest is None:
+            return forecast(self.model, self.spec, history, future_times, self.mode), None
+        return forecast(forest, self.spec, history, future_times, self.mode, quantiles=quantiles)
+
+
+def forecast_times(start, hours, resolution_minutes=60):
+    """Step start times covering ``hours`` from ``start``."""
+    step = timedelta(minutes=resolution_minutes)
+    return [start + i * step for i in range(hours * 60 // resolution_minutes)]
+
+
+# ---------------- History ----------------
+class RollingHistory:
+    """Means of the last ``steps`` closed steps plus the running mean of the open one.
+
+    Steps are ``step_minutes`` long. Steps without readings are filled with
+    the previous step's mean, as the ``resample().mean().ffill()`` of the
+    queried history did. Readings for steps already closed are dropped.
+    Thread-safe: MQTT callbacks add readings while the main loop forecasts.
+    """
+
+    def __init__(self, steps, step_minutes=60):
+        self.steps = steps
+        self.step_ns = step_minutes * _NS_PER_MINUTE
+        self.values = np.full(steps, np.nan)
+        self.open_step = None  # int64 ns start of the step being accumulated
+        self._sum = 0.0
+        self._count = 0
+        self.late = 0
+        self._lock = threading.Lock()
+
+    def step_start(self, time_ns):
+        return time_ns - time_ns % self.step_ns
+
+    def seed(self, times, values, open_step):
+        """Fill the closed steps from per-step means (int64 ns step starts) before ``open_step``."""
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            self.open_step = int(open_step)
+            self.values[:] = np.nan
+            slot = (times - self.open_step) // self.step_ns + self.steps
+            ok = (slot >= 0) & (slot < self.steps)
+            self.values[slot[ok]] = values[ok]
+            self._sum, self._count = 0.0, 0
+
+    def _close_until(self, step):
+        closed = (step - self.open_step) // self.step_ns
+        mean = self._sum / self._count if self._count else np.nan
+        if closed >= self.steps:
+            self.values[:] = np.nan
+        else:
+            self.values[:-closed] = self.values[closed:]
+            self.values[-closed:] = np.nan
+        if closed <= self.steps:
+            self.values[-closed] = mean
+        self.open_step = step
+        self._sum, self._count = 0.0, 0
+
+    def add(self, time_ns, value):
+        step = self.step_start(time_ns)
+        with self._lock:
+            if self.open_step is None:
+                self.open_step = step
+            if step < self.open_step:
+                self.late += 1
+                return
+            if step > self.open_step:
+                self._close_until(step)
+            self._sum += value
+            self._count += 1
+
+    def advance(self, now_ns):
+        """Close the open step (and any silent ones) once ``now_ns`` is past it."""
+        step = self.step_start(now_ns)
+        with self._lock:
+            if self.open_step is not None and step > self.open_step:
+                self._close_until(step)
+
+    def window(self, need):
+        """The last ``need`` closed step means, forward filled; None while gaps remain."""
+        with self._lock:
+            values = self.values.copy()
+        if need > len(values):
+            return None
+        filled = np.where(np.isnan(values), 0, np.arange(len(values)))
+        values = values[np.maximum.accumulate(filled)][len(values) - need:]
+        return None if np.isnan(values).any() else values
+
+
+# ---------------- Output ----------------
+# The daily forecast from midnight, scored by evaluation.py; the service's hourly re-forecasts go to
+# ROLLING_MEASUREMENT so they don't overwrite it with forecasts made an hour ahead
+DAILY_MEASUREMENT = "predictions"
+ROLLING_MEASUREMENT = "predictions_rolling"
+
+
+def quantile_name(q):
+    """``p10`` for 0.1, ``p97.5`` for 0.975."""
+    return f"p{q * 100:g}"
+
+
+def prediction_points(times, predictions, quantiles=(), bands=None, measurement=DAILY_MEASUREMENT):
+    """``measurement`` points with ``predicted_kwh`` plus ``predicted_p10`` etc. for each quantile band."""
+    names = [f"predicted_{quantile_name(q)}" for q in quantiles] if bands is not None else []
+    points = []
+    for i, (dt, pred) in enumerate(zip(times, predictions)):
+        point = Point(measurement).field("predicted_kwh", float(pred)).time(dt)
+        for name, band in zip(names, bands if bands is not None else ()):
+            point.field(name, float(band[i]))
+        points.append(point)
+    return points
+
+
+def mqtt_payload(start_time, times, predictions, resolution_minutes=60, quantiles=(), bands=None):
+    names = [quantile_name(q) for q in quantiles] if bands is not None else []
+    entries = []
+    for i, (dt, pred) in enumerate(zip(times, predictions)):
+        entry = {"datetime": dt.strftime('%Y-%m-%d %H:%M:%S'), "kwh": round(float(pred), 2)}
+        for name, band in zip(names, bands if bands is not None else ()):
+            entry[name] = round(float(band[i]), 2)
+        entries.append(entry)
+    return {
+        "timestamp": start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        "resolution_minutes": resolution_minutes,
+        "predictions_test": entries
+    }
@@ -1,114 +1,98 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
 import json
-import os
 from datetime import datetime
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+import numpy as np
+import pandas as pd
+from influxdb_client import Point
+from influx_db import get_influx
+from plugin_log import get_logger
+from weather_cache import WeatherUnavailable, cache_from_settings, location, open_meteo
+from weather_archive import archive_from_settings
+from align import align_frame
+from pv_model import power, system_from_settings
 
 # ---------------- Configuration ----------------
-INFLUX_URL = "http://172.20.0.10:8086"
-ORG = "Q-Home"
-BUCKET = "Energy-prediction"
-TOKEN_FILE = "/opt/loxberry/data/plugins/consumption_prediction/.influx_token"
-LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/prediction.log"
+LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/solar_forecast.log"
 
 # ---------------- Logging ----------------
-def log(msg):
-    os.makedirs(os.path.dirname(LOGFILE), exist_ok=True)
-    with open(LOGFILE, "a") as f:
-        timestamp = datetime.now()
-        f.write(f"[{timestamp}] [SOLAR] {msg}\n")
-        print(f"[{timestamp}] [SOLAR] {msg}")
+logger = get_logger("solar_forecast", LOGFILE, tag="SOLAR", console=True)
+log = logger.info
 
 # ---------------- Load Settings ----------------
 file_path = '/opt/loxberry/data/plugins/consumption_prediction/settings.json'
 with open(file_path, 'r') as file:
     settings = json.load(file)
 
-LAT = settings['LAT']
-LON = settings['LON']
-PANEL_AREA = settings['PANEL_AREA']  # in m²
-EFFICIENCY = settings['EFFICIENCY']  # efficiency as a decimal (e.g., 0.18 for 18%)
+# Same location keys as prediction_solar.py, so both share the cached forecast
+LOCATION = location(settings)
+if LOCATION is None:
+    log("ERROR: Missing latitude/longitude in settings.json.")
+    exit(1)
+LAT, LON = LOCATION
+# Panel tilt, azimuth and size from the "pv" block; sized by PANEL_AREA (m²) * EFFICIENCY without peak_kw
+PV = system_from_settings(settings)
+FORECAST_HOURS = int(settings.get('forecast_horizon_hours', 24))
+RESOLUTION = int(settings.get('forecast_resolution_minutes', 60))
 
-# ---------------- Token Load ----------------
-if not os.path.exists(TOKEN_FILE):
+# ---------------- InfluxDB Connection ----------------
+try:
+    influx = get_influx(settings)
+except FileNotFoundError:
     log("ERROR: InfluxDB token file not found.")
     exit(1)
 
-with open(TOKEN_FILE) as f:
-    INFLUX_TOKEN = f.read().strip().strip('"')
-
-client_influx = InfluxDBClient(
-    url=INFLUX_URL,
-    token=INFLUX_TOKEN,
-    org=ORG
-)
-write_api = client_influx.write_api(write_options=SYNCHRONOUS)
-
-# ---------------- Influx Write ----------------
-def write_to_influx(measurement, field_name, value, timestamp=None):
-    timestamp = timestamp or datetime.now()
-    point = (
-        Point(measurement)
-        .field(field_name, value)
-        .time(timestamp)
-    )
-    try:
-        write_api.write(bucket=BUCKET, record=point)
-        log(f"Wrote to InfluxDB: {measurement} - {field_name}={value:.2f} at {timestamp}")
-    except Exception as e:
-        log(f"InfluxDB write failed: {e}")
-
 # ---------------- Fetch Forecast from Open-Meteo ----------------
-openmeteo_url = (
-    "https://api.open-meteo.com/v1/forecast"
-    f"?latitude={LAT}&longitude={LON}"
-    "&hourly=shortwave_radiation"
-    "&timezone=auto"
-)
-
-response = requests.get(openmeteo_url)
-log(f"Open-Meteo API status: {response.status_code}")
-
-if response.status_code != 200:
-    log("Error fetching Open-Meteo forecast.")
-    exit(1)
-
+# Shared with prediction_solar.py through the weather cache
+cache = cache_from_settings(settings, log=log)
 try:
-    data = response.json()
-except json.JSONDecodeError as e:
-    log(f"Failed to decode JSON: {e}")
-    log(f"Raw response: {response.text}")
+    hourly, minutely, status = open_meteo(cache, LAT, LON, FORECAST_HOURS, RESOLUTION)
+except WeatherUnavailable as e:
+    log(f"Error fetching Open-Meteo forecast: {e}")
     exit(1)
+log(f"Open-Meteo forecast: {status}")
+archive = archive_from_settings(settings, "open-meteo")
+if archive is not None and status == "fetched":
+    try:
+        log(f"{archive.record(hourly)} forecast hours archived.")
+    except OSError as e:
+        log(f"[warning] Could not archive the weather forecast: {e}")
 
 # ---------------- Process Forecast ----------------
-times = data.get("hourly", {}).get("time", [])
-radiation_values = data.get("hourly", {}).get("shortwave_radiation", [])
-
-if not times or not radiation_values:
+# Below an hour, Open-Meteo's 15-minute radiation is averaged into steps of this length
+forecast = minutely if minutely is not None else hourly
+forecast = forecast.dropna(subset=["radiation"])
+if forecast.empty:
     log("No forecast data received.")
     exit(1)
 
-for i in range(len(times)):
-    time_str = times[i]
-    radiation = radiation_values[i]
-
-    if radiation is None:
-        continue
-
-    try:
-        dt = datetime.fromisoformat(time_str)
-    except ValueError:
-        log(f"Invalid time format: {time_str}")
-        continue
-
-    # Convert to kWh: radiation is in W/m²
-    kwh = (radiation * PANEL_AREA * EFFICIENCY) / 1000.0
-
-    write_to_influx("solar_forecast", "forecast_kwh", kwh, timestamp=dt)
+# PV output per forecast row: Open-Meteo's radiation is the mean over the preceding hour (15 minutes for
+# minutely_15), so the sun is placed in the middle of it; temperature and wind come from the hourly rows
+period = pd.Timedelta(minutes=15 if minutely is not None else 60)
+weather = align_frame(forecast["datetime"], hourly, ["temp", "wind"], tolerance="2h")
+kw = power(PV, forecast["datetime"] - period / 2, LAT, LON, forecast["radiation"].to_numpy(),
+           weather["temp"], weather["wind"])
+
+# Mean output per forecast step, at local time as before
+steps = {}
+for ts, value in zip(forecast["datetime"], kw):
+    dt = datetime.fromtimestamp(ts.timestamp())
+    if minutely is not None:
+        dt = dt.replace(minute=dt.minute - dt.minute % RESOLUTION)
+    steps.setdefault(dt, []).append(value)
+
+points = []
+for dt, values in steps.items():
+    # Mean kW over the step, i.e. kWh for an hourly step
+    kwh = float(np.mean(values))
+    points.append(Point("solar_forecast").field("forecast_kwh", kwh).time(dt))
+
+# All steps in one request
+try:
+    influx.write_points(points)
+except Exception as e:
+    log(f"InfluxDB write failed: {e}")
+    exit(1)
 
-log("Finished writing Open-Meteo forecast to InfluxDB.")
-client_influx.close()
+log(f"Finished writing {len(points)} Open-Meteo forecast steps to InfluxDB.")
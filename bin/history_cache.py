@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Local columnar cache of an hourly series, partitioned by month.
+
+Each month is stored as two ``.npy`` files, ``YYYY-MM.time.npy`` (int64
+nanoseconds since the epoch, UTC) and ``YYYY-MM.value.npy`` (float32), so
+partitions can be memory-mapped instead of parsed. ``watermark.json``
+records the end of the last fetched range: every run only has to ask
+InfluxDB for data after it.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+WATERMARK_FILE = "watermark.json"
+
+
+class HistoryCache:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------------- Watermark ----------------
+    @property
+    def watermark(self):
+        """UTC datetime up to which the cache is complete, or None when empty."""
+        try:
+            with open(os.path.join(self.directory, WATERMARK_FILE), "r") as f:
+                return datetime.fromisoformat(json.load(f)["watermark"])
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def _set_watermark(self, watermark):
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"watermark": watermark.astimezone(timezone.utc).isoformat()}, f)
+        os.replace(tmp, path)
+
+    # ---------------- Partitions ----------------
+    def months(self):
+        return sorted(name[:7] for name in os.listdir(self.directory) if name.endswith(".time.npy"))
+
+    def _paths(self, month):
+        return (os.path.join(self.directory, f"{month}.time.npy"),
+                os.path.join(self.directory, f"{month}.value.npy"))
+
+    def load_month(self, month, mmap=True):
+        time_path, value_path = self._paths(month)
+        mode = "r" if mmap else None
+        return np.load(time_path, mmap_mode=mode), np.load(value_path, mmap_mode=mode)
+
+    # ---------------- Write ----------------
+    def append(self, times, values, watermark):
+        """Add rows (UTC ns timestamps, values) and move the watermark.
+
+        Rows at or after the first new timestamp in a month are replaced, so
+        re-fetching an overlapping range never duplicates data.
+        """
+        times = np.asarray(times, dtype="int64")
+        values = np.asarray(values, dtype="float32")
+        if len(times):
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+            months = times.astype("datetime64[ns]").astype("datetime64[M]")
+            boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+            for chunk_t, chunk_v in zip(np.split(times, boundaries), np.split(values, boundaries)):
+                self._merge_month(str(chunk_t[0].astype("datetime64[ns]").astype("datetime64[M]")),
+                                  chunk_t, chunk_v)
+        self._set_watermark(watermark)
+
+    def _merge_month(self, month, times, values):
+        time_path, value_path = self._paths(month)
+        if os.path.exists(time_path):
+            old_t, old_v = self.load_month(month, mmap=False)
+            keep = old_t < times[0]
+            times = np.concatenate([old_t[keep], times])
+            values = np.concatenate([old_v[keep], values])
+        for path, array in ((time_path, times), (value_path, values)):
+            tmp = path + ".tmp.npy"
+            np.save(tmp, array)
+            os.replace(tmp, path)
+
+    def clear(self):
+        """Drop all partitions and the watermark, forcing a full rebuild."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ---------------- Read ----------------
+    def read(self, start=None):
+        """Return (times, values) for all cached rows, optionally from ``start`` (UTC datetime).
+
+        Partitions are memory-mapped, so the only copy made is the final
+        concatenation into one contiguous pair of arrays.
+        """
+        start_ns = None
+        if start is not None:
+            start_ns = np.datetime64(start.astimezone(timezone.utc).replace(tzinfo=None), "ns").astype("int64")
+        parts_t, parts_v = [], []
+        for month in self.months():
+            times, values = self.load_month(month)
+            if start_ns is not None:
+                if len(times) == 0 or times[-1] < start_ns:
+                    continue
+                first = np.searchsorted(times, start_ns)
+                times, values = times[first:], values[first:]
+            parts_t.append(times)
+            parts_v.append(values)
+        if not parts_t:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        return np.concatenate(parts_t), np.concatenate(parts_v)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Streaming per-hour aggregates of incoming readings.
+
+Every series (measurement, field, tags) keeps running count/sum/min/max/last per
+hour. An hour is emitted as one ``<measurement>_hourly`` point, timestamped
+at the start of the hour, once ``grace`` seconds have passed after it ended.
+A reading timestamped in an hour that was already emitted updates the
+aggregate and re-emits it; InfluxDB overwrites the earlier point because the
+series and timestamp are identical. Emitted hours are kept, and readings
+accepted, for ``retention_hours`` before the newest hour seen; older readings
+are counted and ignored. ``last`` is the value with the newest timestamp,
+not the one that arrived last.
+
+mqtt_to_db.py stamps readings on arrival, so from the daemon every reading
+falls in an open hour; late updates only happen for callers that pass the
+readings' own (older) timestamps.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+HOUR = timedelta(hours=1)
+
+
+class HourlyRollup:
+    def __init__(self, emit, grace=300, retention_hours=24, state_path=None, log=print):
+        self.emit = emit  # emit(measurement, fields, timestamp, tags)
+        self.grace = timedelta(seconds=grace)
+        self.retention = timedelta(hours=retention_hours)
+        self.state_path = state_path
+        self.log = log
+
+        self.late_updates = 0
+        self.late_dropped = 0
+
+        self._lock = threading.Lock()
+        # (measurement, field, tags, hour) -> [count, sum, min, max, last, last_ts]
+        # tags is a sorted tuple of (key, value) pairs
+        self._open = {}
+        # emitted buckets kept for late readings -> (aggregate, dirty)
+        self._closed = {}
+        self._newest_hour = None
+        # hours emitted by a previous run; their aggregates are gone, so late readings are dropped
+        self._closed_through = None
+        self._load_state()
+
+    # ---------------- Ingest ----------------
+    def add(self, measurement, field_name, value, timestamp, tags=None):
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        key = (measurement, field_name, tuple(sorted(tags.items())) if tags else (), hour)
+        with self._lock:
+            agg = self._open.get(key)
+            if agg is None:
+                closed = self._closed.get(key)
+                if closed is not None:
+                    agg = closed[0]
+                    self._closed[key] = (agg, True)
+                    self.late_updates += 1
+                elif ((self._newest_hour is not None and hour < self._newest_hour - self.retention)
+                        or (self._closed_through is not None and hour <= self._closed_through)):
+                    self.late_dropped += 1
+                    return
+                else:
+                    self._open[key] = [1, value, value, value, value, timestamp]
+                    if self._newest_hour is None or hour > self._newest_hour:
+                        self._newest_hour = hour
+                    return
+            agg[0] += 1
+            agg[1] += value
+            if value < agg[2]:
+                agg[2] = value
+            if value > agg[3]:
+                agg[3] = value
+            if timestamp >= agg[5]:
+                agg[4] = value
+                agg[5] = timestamp
+
+    # ---------------- Emit ----------------
+    def flush_due(self, now=None):
+        """Emit every hour that ended more than ``grace`` ago, plus late corrections."""
+        now = now or datetime.now()
+        due = []
+        with self._lock:
+            for key in [k for k in self._open if now >= k[3] + HOUR + self.grace]:
+                agg = self._open.pop(key)
+                self._closed[key] = (agg, False)
+                due.append((key, agg))
+            for key, (agg, dirty) in list(self._closed.items()):
+                if dirty:
+                    self._closed[key] = (agg, False)
+                    due.append((key, agg))
+                elif key[3] < self._newest_hour - self.retention:
+                    # The same cutoff add() drops late readings at, so a pruned hour is never re-opened
+                    del self._closed[key]
+        for key, agg in due:
+            self._emit(key, agg)
+        return len(due)
+
+    def _emit(self, key, agg):
+        measurement, field_name, tags, hour = key
+        count, total, low, high, last, _ = agg
+        fields = {
+            "count": count,
+            "sum": float(total),
+            "mean": float(total) / count,
+            "min": float(low),
+            "max": float(high),
+            "last": float(last),
+        }
+        try:
+            self.emit(f"{measurement}_hourly", fields, hour, dict(tags, field=field_name))
+        except Exception as e:
+            self.log(f"Failed to emit hourly rollup for {measurement}/{field_name} at {hour}: {e}")
+
+    # ---------------- Persistence ----------------
+    def save_state(self):
+        """Persist open hours so a restart does not emit a partial aggregate over a complete one."""
+        if not self.state_path:
+            return
+        with self._lock:
+            closed_hours = [key[3] for key in self._closed]
+            if self._closed_through is not None:
+                closed_hours.append(self._closed_through)
+            state = {
+                "closed_through": max(closed_hours).isoformat() if closed_hours else None,
+                "open": [
+                    [m, f, list(tags), hour.isoformat(), agg[0], agg[1], agg[2], agg[3], agg[4], agg[5].isoformat()]
+                    for (m, f, tags, hour), agg in self._open.items()
+                ],
+            }
+        try:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except Exception as e:
+            self.log(f"Failed to save hourly rollup state: {e}")
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            if state.get("closed_through"):
+                self._closed_through = datetime.fromisoformat(state["closed_through"])
+            for m, fld, tags, hour, count, total, low, high, last, last_ts in state["open"]:
+                hour = datetime.fromisoformat(hour)
+                tags = tuple(tuple(pair) for pair in tags)
+                self._open[(m, fld, tags, hour)] = [count, total, low, high, last, datetime.fromisoformat(last_ts)]
+                if self._newest_hour is None or hour > self._newest_hour:
+                    self._newest_hour = hour
+            os.remove(self.state_path)
+            self.log(f"Restored {len(state['open'])} open hourly rollups")
+        except Exception as e:
+            self.log(f"Failed to restore hourly rollup state: {e}")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Incremental retraining of the random forest.
+
+Instead of refitting every tree on the full history, an update fits a few
+new trees on a recent window (which always covers every hour since the
+``trained_through`` watermark in the model metadata) and drops the oldest
+trees, so the forest keeps a fixed size and slowly follows changes in
+consumption. A full refit is still done when there is no usable model, the
+feature spec, backend, forecast mode or horizon changed, or the last full
+refit is older than ``full_refit_days``.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from model_artifact import PackedForest, pack_forest
+from model_backends import make_model
+
+
+def refit_reason(model, header, spec, backend, full_refit_days, forecast_mode="recursive", horizon=1, now=None):
+    """Why an incremental update is not possible, or None when it is."""
+    now = now or datetime.now(timezone.utc)
+    if model is None:
+        return "no existing model"
+    if backend != "rf" or header.get("backend", "rf") != "rf":
+        return f"backend '{backend}' does not support incremental updates"
+    if not isinstance(model, PackedForest) and not hasattr(model, "estimators_"):
+        return "existing model is not a forest"
+    if header.get("feature_spec") != spec:
+        return "feature spec changed"
+    if header.get("forecast_mode", "recursive") != forecast_mode:
+        return "forecast mode changed"
+    if header.get("horizon", 1) != horizon:
+        return "forecast horizon changed"
+    if not header.get("trained_through"):
+        return "existing model has no training watermark"
+    last_full = header.get("last_full_training")
+    if not last_full or now - datetime.fromisoformat(last_full) > timedelta(days=full_refit_days):
+        return f"last full refit is older than {full_refit_days} days"
+    return None
+
+
+def update_window(times, trained_through, window_days):
+    """Boolean mask of the rows new trees are fitted on.
+
+    ``times`` are the (UTC) timestamps of the training rows; the window covers
+    the last ``window_days`` and every row after ``trained_through``.
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    end = times[-1]
+    start = min(end - np.timedelta64(window_days, "D"),
+                np.datetime64(datetime.fromisoformat(trained_through).astimezone(timezone.utc).replace(tzinfo=None), "ns"))
+    return times > start
+
+
+def add_trees(model, X, y, spec, params, new_trees, max_trees, random_state, max_depth=None, max_leaf_nodes=None):
+    """``model`` with ``new_trees`` trees fitted on (X, y) appended and the oldest dropped beyond ``max_trees``.
+
+    Works on a PackedForest (new trees are packed with the same limits) and on
+    a scikit-learn forest (via ``warm_start``).
+    """
+    if isinstance(model, PackedForest):
+        grown = make_model("rf", spec, dict(params, n_estimators=new_trees))
+        grown.set_params(random_state=random_state)
+        fresh = pack_forest(grown.fit(X, y), max_depth, max_leaf_nodes)
+        pieces = [(model, t) for t in range(model.n_trees)] + [(fresh, t) for t in range(fresh.n_trees)]
+        return PackedForest.concat(pieces[-max_trees:])
+
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees,
+                     random_state=random_state)
+    model.fit(X, y)
+    model.estimators_ = model.estimators_[-max_trees:]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+    return model
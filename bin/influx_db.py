@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Shared InfluxDB access for all plugin scripts.
+
+The connection is resolved once from settings.json and the token file:
+
+    influx_url                      full URL, e.g. "http://localhost:8087"
+    influxdb_host / influxdb_port   used when influx_url is not set
+    influx_org / influx_bucket      default "Q-Home" / "Energy-prediction"
+
+and falls back to the InfluxDB container on the plugin's Docker network.
+``get_influx()`` returns one client per process, whose urllib3 pool keeps
+connections alive between requests. ``write_points`` sends any number of
+points as line protocol in as few requests as possible, and ``read_series``
+returns a series as NumPy arrays (see influx_stream.py).
+"""
+
+import atexit
+import json
+import threading
+
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+SETTINGS_PATH = "/opt/loxberry/data/plugins/consumption_prediction/settings.json"
+TOKEN_FILE = "/opt/loxberry/data/plugins/consumption_prediction/.influx_token"
+DEFAULT_URL = "http://172.20.0.10:8086"
+DEFAULT_ORG = "Q-Home"
+DEFAULT_BUCKET = "Energy-prediction"
+WRITE_BATCH_LINES = 5000
+POOL_SIZE = 4
+TIMEOUT_MS = 30000
+
+
+class InfluxConfig:
+    __slots__ = ("url", "token", "org", "bucket")
+
+    def __init__(self, url, token, org=DEFAULT_ORG, bucket=DEFAULT_BUCKET):
+        self.url = url
+        self.token = token
+        self.org = org
+        self.bucket = bucket
+
+
+def resolve_config(settings=None, token_file=TOKEN_FILE):
+    """InfluxConfig from ``settings`` (read from settings.json when None) and the token file.
+
+    Raises FileNotFoundError when the token file is missing.
+    """
+    if settings is None:
+        try:
+            with open(SETTINGS_PATH, "r") as f:
+                settings = json.load(f)
+        except (FileNotFoundError, ValueError):
+            settings = {}
+    url = settings.get("influx_url")
+    if not url and settings.get("influxdb_host"):
+        url = f"http://{settings['influxdb_host']}:{settings.get('influxdb_port', 8086)}"
+    with open(token_file, "r") as f:
+        token = f.read().strip().strip('"')
+    return InfluxConfig(url or DEFAULT_URL, token,
+                        settings.get("influx_org") or DEFAULT_ORG,
+                        settings.get("influx_bucket") or DEFAULT_BUCKET)
+
+
+def to_line(point):
+    """Line protocol for a Point, or a line passed through unchanged."""
+    return point if isinstance(point, str) else point.to_line_protocol()
+
+
+class InfluxDB:
+    def __init__(self, config, pool_size=POOL_SIZE, timeout_ms=TIMEOUT_MS):
+        self.config = config
+        self.client = InfluxDBClient(url=config.url, token=config.token, org=config.org,
+                                     timeout=timeout_ms, connection_pool_maxsize=pool_size)
+        self._query_api = None
+        self._write_api = None
+
+    @property
+    def org(self):
+        return self.config.org
+
+    @property
+    def bucket(self):
+        return self.config.bucket
+
+    @property
+    def query_api(self):
+        if self._query_api is None:
+            self._query_api = self.client.query_api()
+        return self._query_api
+
+    @property
+    def write_api(self):
+        if self._write_api is None:
+            self._write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        return self._write_api
+
+    def write_points(self, points, bucket=None, batch_lines=WRITE_BATCH_LINES):
+        """Write Points (or line-protocol strings) in requests of up to ``batch_lines`` lines.
+
+        Returns the number of points written. Errors propagate to the caller.
+        """
+        lines = [to_line(point) for point in points]
+        for start in range(0, len(lines), batch_lines):
+            self.write_api.write(bucket=bucket or self.bucket, org=self.org,
+                                 record="\n".join(lines[start:start + batch_lines]))
+        return len(lines)
+
+    def read_series(self, query, **options):
+        """(int64 ns times, values) of a single-series query, see ``influx_stream.read_series``."""
+        # Imported here: the ingestion daemon's container has no NumPy and only writes
+        from influx_stream import read_series
+        return read_series(self.query_api, query, org=self.org, **options)
+
+    def query(self, query):
+        """FluxTables of ``query``, for callers that need more than one series."""
+        return self.query_api.query(query, org=self.org)
+
+    def close(self):
+        self.client.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_influx(settings=None):
+    """The process-wide InfluxDB connection, created on first use and closed at exit."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = InfluxDB(resolve_config(settings))
+            atexit.register(_shared.close)
+        return _shared
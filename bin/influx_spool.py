@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Disk-backed write-ahead spool for line-protocol points InfluxDB did not accept.
+
+Points are appended to numbered segment files (``000000000001.lp``, ...) in the
+spool directory. Segments are replayed oldest first and deleted once every
+line in them has been written. Total disk usage is bounded by evicting the
+oldest segments. Re-sending a line after a partial replay is harmless because
+InfluxDB overwrites points with the same series and timestamp.
+
+The spool is not thread-safe; it is owned by the batch writer thread.
+"""
+
+import os
+
+SEGMENT_SUFFIX = ".lp"
+
+
+class Spool:
+    def __init__(self, directory, segment_bytes=1024 * 1024, max_bytes=100 * 1024 * 1024, log=print):
+        self.directory = directory
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.max_bytes = max(self.segment_bytes, int(max_bytes))
+        self.log = log
+
+        self.evicted_segments = 0
+        self.evicted_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self._sizes = {seq: os.path.getsize(self._path(seq)) for seq in self._segments}
+        self._next_seq = (self._segments[-1] + 1) if self._segments else 1
+        self._active = None      # seq of the segment currently appended to
+        self._active_file = None
+
+        self._replay_seq = None  # seq of the segment loaded for replay
+        self._replay_lines = []
+        self._replay_pos = 0
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    # ---------------- Append ----------------
+    def append(self, lines):
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        if self._active is None or self._sizes[self._active] >= self.segment_bytes:
+            self._roll()
+        self._active_file.write(data)
+        self._active_file.flush()
+        self._sizes[self._active] += len(data)
+        self._evict()
+
+    def _roll(self):
+        self._seal()
+        seq = self._next_seq
+        self._next_seq += 1
+        self._active_file = open(self._path(seq), "ab")
+        self._active = seq
+        self._segments.append(seq)
+        self._sizes[seq] = 0
+
+    def _seal(self):
+        if self._active_file is not None:
+            self._active_file.close()
+        self._active_file = None
+        self._active = None
+
+    def _evict(self):
+        while self.total_bytes() > self.max_bytes and len(self._segments) > 1:
+            seq = self._segments[0]
+            size = self._sizes[seq]
+            self._remove(seq)
+            self.evicted_segments += 1
+            self.evicted_bytes += size
+            self.log(f"Spool full, evicted oldest segment {seq} ({size} bytes)")
+
+    def _remove(self, seq):
+        if seq == self._active:
+            self._seal()
+        if seq == self._replay_seq:
+            self._replay_seq = None
+            self._replay_lines = []
+            self._replay_pos = 0
+        self._segments.remove(seq)
+        del self._sizes[seq]
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    # ---------------- Replay ----------------
+    def pending(self):
+        return bool(self._segments)
+
+    def total_bytes(self):
+        return sum(self._sizes.values())
+
+    def next_chunk(self, max_lines):
+        """Return up to ``max_lines`` of the oldest unreplayed lines without consuming them."""
+        while self._segments:
+            if self._replay_seq != self._segments[0]:
+                seq = self._segments[0]
+                if seq == self._active:
+                    # Never replay a segment that is still being appended to
+                    self._seal()
+                with open(self._path(seq), "rb") as f:
+                    self._replay_lines = f.read().decode("utf-8", errors="replace").splitlines()
+                self._replay_seq = seq
+                self._replay_pos = 0
+            chunk = self._replay_lines[self._replay_pos:self._replay_pos + max_lines]
+            if chunk:
+                return chunk
+            self._remove(self._replay_seq)
+        return []
+
+    def commit_chunk(self, count):
+        """Mark ``count`` lines returned by next_chunk() as written."""
+        if self._replay_seq is None:
+            return
+        self._replay_pos += count
+        if self._replay_pos >= len(self._replay_lines):
+            self._remove(self._replay_seq)
+
+    def close(self):
+        self._seal()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Memory-bounded reading of a single InfluxDB series into NumPy arrays.
+
+``query_data_frame`` materialises every Flux column (result, table, _start,
+_stop, _measurement, ...) as Python objects before anything is dropped. The
+helpers here expect a query ending in ``keep(columns: ["_time", "_value"])``,
+stream the CSV response row by row, and convert it in chunks of
+``chunk_rows`` into int64 nanosecond timestamps and float32 values, so peak
+memory is one chunk of strings plus the compact arrays.
+"""
+
+import numpy as np
+import pandas as pd
+from influxdb_client.client.query_api import Dialect
+
+CHUNK_ROWS = 100000
+
+_DIALECT = Dialect(header=True, delimiter=",", comment_prefix="#", annotations=[], date_time_format="RFC3339")
+
+
+def _to_arrays(time_strings, value_strings, value_dtype):
+    # RFC3339 with a trailing Z; numpy parses the naive UTC part directly
+    times = np.array([t[:-1] if t.endswith("Z") else t for t in time_strings], dtype="datetime64[ns]")
+    values = np.array(value_strings, dtype="float64").astype(value_dtype, copy=False)
+    return times.astype("int64"), values
+
+
+def stream_series(query_api, query, org=None, chunk_rows=CHUNK_ROWS, value_dtype=np.float32):
+    """Yield (times, values) chunks: int64 UTC nanoseconds and ``value_dtype`` values."""
+    time_idx = value_idx = None
+    time_buf, value_buf = [], []
+    for row in query_api.query_csv(query, org=org, dialect=_DIALECT):
+        if not row or row[0].startswith("#"):
+            continue
+        if "_time" in row and "_value" in row:
+            # Header row, repeated at the start of every table
+            time_idx, value_idx = row.index("_time"), row.index("_value")
+            continue
+        if time_idx is None or len(row) <= max(time_idx, value_idx) or row[value_idx] == "":
+            continue
+        time_buf.append(row[time_idx])
+        value_buf.append(row[value_idx])
+        if len(time_buf) >= chunk_rows:
+            yield _to_arrays(time_buf, value_buf, value_dtype)
+            time_buf, value_buf = [], []
+    if time_buf:
+        yield _to_arrays(time_buf, value_buf, value_dtype)
+
+
+def read_series(query_api, query, org=None, chunk_rows=CHUNK_ROWS, value_dtype=np.float32):
+    """Read a whole series as (times, values) arrays, sorted by time."""
+    chunks = list(stream_series(query_api, query, org, chunk_rows, value_dtype))
+    if not chunks:
+        return np.empty(0, dtype="int64"), np.empty(0, dtype=value_dtype)
+    times = np.concatenate([c[0] for c in chunks])
+    values = np.concatenate([c[1] for c in chunks])
+    del chunks
+    # One table per series arrives already sorted; only sort when it did not
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    return times, values
+
+
+def series_frame(times, values, value_column):
+    """DataFrame with a UTC ``datetime`` column and a float32 value column."""
+    return pd.DataFrame({
+        "datetime": pd.to_datetime(times, utc=True),
+        value_column: np.asarray(values, dtype=np.float32),
+    })
+
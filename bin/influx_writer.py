@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Batched, asynchronous InfluxDB writer used by the MQTT ingestion daemon.
+
+Points are handed to a bounded in-memory queue and written by a background
+thread as line-protocol batches, either when ``batch_size`` points are
+pending or ``flush_interval`` seconds after the first pending point.
+
+With a spool attached, batches InfluxDB rejects are written to disk and
+replayed in ``replay_batch_size`` chunks once InfluxDB accepts writes again.
+Replay is interleaved with live batches so it never starves ingestion.
+"""
+
+import queue
+import threading
+import time
+from influxdb_client import Point
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+_STOP = object()
+
+
+class BatchWriter:
+    def __init__(self, write_api, bucket, org=None, batch_size=500, flush_interval=1.0,
+                 max_queue=10000, backpressure="drop_oldest", block_timeout=1.0,
+                 spool=None, replay_batch_size=5000, retry_interval=5.0, on_write=None, log=print):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{backpressure}', "
+                             f"expected one of {BACKPRESSURE_POLICIES}")
+        self.write_api = write_api
+        self.bucket = bucket
+        self.org = org
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.backpressure = backpressure
+        self.block_timeout = float(block_timeout)
+        self.spool = spool
+        self.replay_batch_size = max(1, int(replay_batch_size))
+        self.retry_interval = float(retry_interval)
+        # on_write(seconds, points) is called after every successful InfluxDB request
+        self.on_write = on_write
+        self.log = log
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+
+        # While InfluxDB is unreachable, batches go straight to the spool until this time
+        self._retry_at = 0.0
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="influx-batch-writer", daemon=True)
+        self._thread.start()
+
+    # ---------------- Producer Side ----------------
+    def submit(self, measurement, field_name, value, timestamp=None, tags=None):
+        """Queue a single-field point. Returns False if the point was dropped."""
+        return self.submit_fields(measurement, {field_name: value}, timestamp, tags)
+
+    def submit_fields(self, measurement, fields, timestamp=None, tags=None):
+        """Queue a point with several fields. Returns False if the point was dropped."""
+        if self._closed:
+            return False
+        item = (measurement, tags, fields, timestamp)
+
+        if self.backpressure == "block":
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.backpressure == "drop_newest":
+            self.dropped += 1
+            return False
+
+        # drop_oldest: make room by discarding the head of the queue
+        try:
+            self._queue.get_nowait()
+            self.dropped += 1
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=10.0):
+        """Stop accepting points, flush everything still queued and join the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.log(f"InfluxDB batch writer did not finish within {timeout}s, "
+                     f"{self._queue.qsize()} points left unwritten")
+
+    # ---------------- Writer Thread ----------------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            replaying = self._replay_pending()
+            try:
+                # Don't wait for live points while there is spooled data to replay
+                item = self._queue.get_nowait() if replaying else self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if replaying:
+                    self._replay_chunk()
+                continue
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if self._replay_pending():
+                # One replay chunk per live batch keeps both moving
+                self._replay_chunk()
+
+        # Drain whatever arrived before close() in full-size batches
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+        if self.spool is not None:
+            self.spool.close()
+
+    def _write(self, batch):
+        lines = [_to_line(*item) for item in batch]
+        if self.spool is not None and time.monotonic() < self._retry_at:
+            self._spool(lines)
+            return
+        try:
+            self._send(lines)
+            self.written += len(lines)
+            self._retry_at = 0.0
+        except Exception as e:
+            self.log(f"InfluxDB batch write failed ({len(lines)} points): {e}")
+            if self.spool is None:
+                self.failed += len(lines)
+                return
+            self._retry_at = time.monotonic() + self.retry_interval
+            self._spool(lines)
+
+    def _send(self, lines):
+        start = time.monotonic()
+        self.write_api.write(bucket=self.bucket, org=self.org, record=lines)
+        if self.on_write is not None:
+            self.on_write(time.monotonic() - start, len(lines))
+
+    def _spool(self, lines):
+        try:
+            self.spool.append(lines)
+            self.spooled += len(lines)
+        except Exception as e:
+            self.failed += len(lines)
+            self.log(f"Spool append failed ({len(lines)} points): {e}")
+
+    # ---------------- Spool Replay ----------------
+    def _replay_pending(self):
+        return (self.spool is not None and self.spool.pending()
+                and time.monotonic() >= self._retry_at)
+
+    def _replay_chunk(self):
+        try:
+            lines = self.spool.next_chunk(self.replay_batch_size)
+        except Exception as e:
+            self.log(f"Spool read failed: {e}")
+            self._retry_at = time.monotonic() + self.retry_interval
+            return
+        if not lines:
+            return
+        try:
+            self._send(lines)
+        except Exception as e:
+            self.log(f"Spool replay failed ({len(lines)} points): {e}")
+            self._retry_at = time.monotonic() + self.retry_interval
+            return
+        self.spool.commit_chunk(len(lines))
+        self.replayed += len(lines)
+        if not self.spool.pending():
+            self.log(f"Spool drained, {self.replayed} points replayed in total")
+
+
+def _to_line(measurement, tags, fields, timestamp):
+    point = Point(measurement)
+    if tags:
+        for key, value in tags.items():
+            point.tag(key, value)
+    for key, value in fields.items():
+        point.field(key, value)
+    return point.time(timestamp).to_line_protocol()
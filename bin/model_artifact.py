@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compact model artifacts with a metadata header readable without unpickling.
+
+Layout of ``<model>.model``::
+
+    b"CPMODEL1"  uint32 header length  JSON header  padding  array payload
+
+The header holds the metadata (feature spec, training range, library
+versions, ...) and the name, dtype, shape and offset of every array in the
+payload. Tree ensembles (random forests) are packed into flat NumPy arrays:
+float32 thresholds and leaf values, int32 child indices, int16 feature
+indices. Uncompressed payloads are memory-mapped, so loading reads only the
+header and predicting touches only the pages it needs. Other backends are
+stored as a pickle inside the payload.
+
+Thresholds are rounded down to the nearest float32, so every comparison with
+a float32 feature value (scikit-learn casts inputs to float32 too) takes the
+same branch as the original tree.
+
+Models saved with joblib (``<model>.pkl``) are still loaded when no artifact
+exists. joblib and scikit-learn are imported only when needed, so loading a
+packed forest costs no more than importing NumPy.
+"""
+
+import heapq
+import json
+import lzma
+import os
+import pickle
+import platform
+import struct
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAGIC = b"CPMODEL1"
+FORMAT_VERSION = 1
+ALIGN = 64
+COMPRESSION = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def artifact_path(model_path):
+    return os.path.splitext(model_path)[0] + ".model"
+
+
+def library_versions():
+    import sklearn
+    return {"python": platform.python_version(), "numpy": np.__version__, "scikit-learn": sklearn.__version__}
+
+
+# ---------------- Packed Forest ----------------
+class PackedForest:
+    """Prediction-only tree ensemble over flat arrays.
+
+    Leaves point to themselves with an infinite threshold, so traversal runs
+    for all trees and rows at once without masking, for at most ``depth``
+    steps and until no node changes any more.
+    """
+
+    def __init__(self, roots, feature, threshold, left, right, value, depth):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value  # (nodes, outputs)
+        self.depth = int(depth)
+        self.n_features_in_ = int(feature.max()) + 1 if len(feature) else 0
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def arrays(self):
+        return {"roots": self.roots, "feature": self.feature, "threshold": self.threshold,
+                "left": self.left, "right": self.right, "value": self.value}
+
+    def leaves(self, X):
+        """Leaf node index per (tree, row)."""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        node = np.repeat(np.asarray(self.roots)[:, None], len(X), axis=1)
+        for step in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            moved = np.where(go_left, self.left[node], self.right[node])
+            # Most paths end well above the deepest leaf; checking every few steps keeps the test cheap
+            if step % 4 == 3 and np.array_equal(moved, node):
+                return moved
+            node = moved
+        return node
+
+    def predict_trees(self, X):
+        """Per-tree predictions, shape (trees, rows, outputs)."""
+        return self.value[self.leaves(X)]
+
+    def predict(self, X):
+        out = self.predict_trees(X).mean(axis=0, dtype=np.float64)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+    def tree_slices(self):
+        ends = list(self.roots[1:]) + [len(self.feature)]
+        return [slice(int(start), int(end)) for start, end in zip(self.roots, ends)]
+
+    @staticmethod
+    def concat(pieces):
+        """Forest made of (forest, tree index) pieces, in the order given."""
+        arrays = {name: [] for name in ("feature", "threshold", "left", "right", "value")}
+        roots, offset, depth = [], 0, 0
+        for forest, tree in pieces:
+            part = forest.tree_slices()[tree]
+            shift = offset - part.start
+            roots.append(offset)
+            arrays["feature"].append(forest.feature[part])
+            arrays["threshold"].append(forest.threshold[part])
+            arrays["left"].append(forest.left[part] + shift)
+            arrays["right"].append(forest.right[part] + shift)
+            arrays["value"].append(forest.value[part])
+            offset += part.stop - part.start
+            depth = max(depth, forest.depth)
+        return PackedForest(np.asarray(roots, dtype=np.int32),
+                            **{name: np.concatenate(parts) for name, parts in arrays.items()}, depth=depth)
+
+
+def _node_depths(tree):
+    depth = np.zeros(tree.node_count, dtype=np.int64)
+    level, d = np.array([0]), 0
+    while len(level):
+        depth[level] = d
+        children = np.concatenate([tree.children_left[level], tree.children_right[level]])
+        level, d = children[children != -1], d + 1
+    return depth
+
+
+def _prune(tree, max_depth=None, max_leaf_nodes=None):
+    """(kept node ids, is_leaf) of a fitted sklearn tree, limited in depth and leaf count.
+
+    With a leaf limit, splits are kept best-first by weighted impurity decrease,
+    the same order scikit-learn grows trees with ``max_leaf_nodes``.
+    """
+    left, right = tree.children_left, tree.children_right
+    depth = _node_depths(tree)
+    if max_leaf_nodes is None:
+        nodes = np.arange(tree.node_count) if max_depth is None else np.flatnonzero(depth <= max_depth)
+        is_leaf = left[nodes] == -1
+        if max_depth is not None:
+            is_leaf |= depth[nodes] == max_depth
+        return nodes, is_leaf
+
+    weight, impurity = tree.weighted_n_node_samples, tree.impurity
+    internal = set()
+    kept = [0]
+    frontier = []
+
+    def push(node):
+        if left[node] != -1 and (max_depth is None or depth[node] < max_depth):
+            l, r = left[node], right[node]
+            gain = weight[node] * impurity[node] - weight[l] * impurity[l] - weight[r] * impurity[r]
+            heapq.heappush(frontier, (-gain, node))
+
+    push(0)
+    while frontier and len(kept) - len(internal) < max_leaf_nodes:
+        _, node = heapq.heappop(frontier)
+        internal.add(node)
+        for child in (left[node], right[node]):
+            kept.append(child)
+            push(child)
+    nodes = np.sort(np.asarray(kept))
+    return nodes, np.array([n not in internal for n in nodes])
+
+
+def pack_forest(model, max_depth=None, max_leaf_nodes=None):
+    """PackedForest from a fitted RandomForestRegressor (single or multi-output)."""
+    roots, feature, threshold, left, right, value = [], [], [], [], [], []
+    depth_reached = 0
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes, is_leaf = _prune(tree, max_depth, max_leaf_nodes)
+        idx = offset + np.arange(len(nodes))
+        remap = np.zeros(tree.node_count, dtype=np.int64)
+        remap[nodes] = idx
+
+        t64 = tree.threshold[nodes]
+        t32 = t64.astype(np.float32)
+        t32 = np.where(t32 > t64, np.nextafter(t32, np.float32(-np.inf)), t32)
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature[nodes]))
+        threshold.append(np.where(is_leaf, np.float32(np.inf), t32))
+        left.append(np.where(is_leaf, idx, remap[tree.children_left[nodes]]))
+        right.append(np.where(is_leaf, idx, remap[tree.children_right[nodes]]))
+        value.append(tree.value[nodes][:, :, 0])
+        depth_reached = max(depth_reached, int(_node_depths(tree)[nodes].max()))
+        offset += len(nodes)
+    return PackedForest(
+        np.asarray(roots, dtype=np.int32),
+        np.concatenate(feature).astype(np.int16),
+        np.concatenate(threshold).astype(np.float32),
+        np.concatenate(left).astype(np.int32),
+        np.concatenate(right).astype(np.int32),
+        np.concatenate(value).astype(np.float32),
+        depth_reached,
+    )
+
+
+def is_forest(model):
+    """Averaging tree ensembles only; boosted ensembles sum their trees and are pickled instead."""
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor))
+
+
+# ---------------- Save / Load ----------------
+def save_model(model, model_path, metadata=None, compression=None, max_depth=None, max_leaf_nodes=None):
+    """Write ``model`` to ``<model>.model``; forests are packed, anything else is pickled."""
+    if compression and compression not in COMPRESSION:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {tuple(COMPRESSION)}")
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "versions": library_versions(),
+        "compression": compression or None,
+        **(metadata or {}),
+    }
+    if isinstance(model, PackedForest) or is_forest(model):
+        forest = model if isinstance(model, PackedForest) else pack_forest(model, max_depth, max_leaf_nodes)
+        header["kind"] = "packed_forest"
+        header["trees"] = forest.n_trees
+        header["nodes"] = len(forest.feature)
+        header["depth"] = forest.depth
+        header["max_depth"] = max_depth
+        header["max_leaf_nodes"] = max_leaf_nodes
+        arrays = forest.arrays()
+    else:
+        header["kind"] = "pickle"
+        arrays = {"pickle": np.frombuffer(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)}
+
+    offset = 0
+    header["arrays"] = {}
+    blobs = []
+    for name, array in arrays.items():
+        data = np.ascontiguousarray(array).tobytes()
+        if compression:
+            data = COMPRESSION[compression][0](data)
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape),
+                                  "offset": offset, "bytes": len(data)}
+        padded = -len(data) % ALIGN
+        blobs.append(data + b"\0" * padded)
+        offset += len(data) + padded
+
+    encoded = json.dumps(header).encode("utf-8")
+    prefix = len(MAGIC) + 4 + len(encoded)
+    encoded += b" " * (-prefix % ALIGN)
+
+    path = artifact_path(model_path)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+    return path
+
+
+def store_model(model, model_path, metadata=None, model_format="packed", **options):
+    """Save as a ``.model`` artifact ("packed") or a joblib pickle ("joblib") and remove the other file.
+
+    The loader prefers the artifact, so a stale one must not outlive a newer pickle.
+    """
+    if model_format == "joblib":
+        import joblib
+        model.metadata_ = metadata or {}
+        joblib.dump(model, model_path)
+        stale, path = artifact_path(model_path), model_path
+    else:
+        path = save_model(model, model_path, metadata, **options)
+        stale = model_path
+    if os.path.exists(stale):
+        os.remove(stale)
+    return path
+
+
+def _read_prefix(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a model artifact")
+    (length,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length)), len(MAGIC) + 4 + length
+
+
+def read_header(model_path):
+    """Metadata of the artifact for ``model_path``, without loading the model."""
+    with open(artifact_path(model_path), "rb") as f:
+        return _read_prefix(f)[0]
+
+
+def load_model(model_path, mmap=True):
+    """(model, header) from ``<model>.model``, falling back to the joblib pickle at ``model_path``."""
+    path = artifact_path(model_path)
+    if not os.path.exists(path):
+        import joblib
+        model = joblib.load(model_path)
+        return model, {**getattr(model, "metadata_", {}), "kind": "joblib"}
+
+    with open(path, "rb") as f:
+        header, start = _read_prefix(f)
+        arrays = {}
+        for name, info in header["arrays"].items():
+            dtype, shape = np.dtype(info["dtype"]), tuple(info["shape"])
+            if header.get("compression"):
+                f.seek(start + info["offset"])
+                data = COMPRESSION[header["compression"]][1](f.read(info["bytes"]))
+                arrays[name] = np.frombuffer(data, dtype=dtype).reshape(shape)
+            elif mmap and info["bytes"]:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=start + info["offset"], shape=shape)
+            else:
+                f.seek(start + info["offset"])
+                arrays[name] = np.frombuffer(f.read(info["bytes"]), dtype=dtype).reshape(shape)
+
+    if header["kind"] == "pickle":
+        return pickle.loads(arrays["pickle"].tobytes()), header
+    return PackedForest(depth=header["depth"], **arrays), header
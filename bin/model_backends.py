@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Model backends selectable with ``model_backend`` / ``solar_model_backend`` in settings.json.
+
+    rf              RandomForestRegressor (the previous hard-coded model)
+    hgb             HistGradientBoostingRegressor: much smaller artifact and
+                    faster single-row prediction
+    ridge           Ridge regression on one-hot calendar fields and scaled
+                    lag/weather features
+    seasonal_naive  predicts the value 24 hours earlier (``lag_24h``); a
+                    baseline every other backend should beat
+
+Every backend builds a scikit-learn compatible estimator from the feature
+spec, so training, the hyperparameter search and prediction treat them alike.
+For direct multi-horizon forecasting (``outputs`` > 1) rf and ridge fit all
+horizons in one multi-output model; hgb fits one model per horizon.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from features import feature_names
+
+DEFAULT_BACKEND = "rf"
+_ONE_HOT = ("hour", "day_of_week", "month")
+
+
+class SeasonalNaive(RegressorMixin, BaseEstimator):
+    """Predicts the value of one of the lag columns unchanged."""
+
+    def __init__(self, column=0):
+        self.column = column
+
+    def fit(self, X, y):
+        self.n_features_in_ = np.shape(X)[1]
+        return self
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64)[:, self.column]
+
+
+def _random_forest(spec, params, n_jobs, outputs):
+    return RandomForestRegressor(random_state=42, n_jobs=n_jobs, **params)
+
+
+def _hist_gradient_boosting(spec, params, n_jobs, outputs):
+    model = HistGradientBoostingRegressor(random_state=42, **params)
+    return MultiOutputRegressor(model, n_jobs=n_jobs) if outputs > 1 else model
+
+
+def _ridge(spec, params, n_jobs, outputs):
+    names = feature_names(spec)
+    categorical = [i for i, name in enumerate(names) if name in _ONE_HOT]
+    numeric = [i for i in range(len(names)) if i not in categorical]
+    encode = ColumnTransformer([
+        ("calendar", OneHotEncoder(handle_unknown="ignore"), categorical),
+        ("numeric", StandardScaler(), numeric),
+    ])
+    return make_pipeline(encode, Ridge(**params))
+
+
+def _seasonal_naive(spec, params, n_jobs, outputs):
+    if outputs > 1:
+        raise ValueError("seasonal_naive only supports recursive forecasting")
+    names = feature_names(spec)
+    if "lag_24h" not in names:
+        raise ValueError("seasonal_naive needs a 24h lag in the feature spec")
+    return SeasonalNaive(column=names.index("lag_24h"))
+
+
+class Backend:
+    __slots__ = ("name", "build", "defaults", "grid")
+
+    def __init__(self, name, build, defaults, grid):
+        self.name = name
+        self.build = build
+        self.defaults = defaults
+        self.grid = grid
+
+
+BACKENDS = {
+    "rf": Backend("rf", _random_forest, {"n_estimators": 100}, {
+        "n_estimators": [100, 200],
+        "max_depth": [None, 20, 12],
+        "min_samples_leaf": [1, 5],
+        "max_features": [1.0, 0.5],
+    }),
+    "hgb": Backend("hgb", _hist_gradient_boosting, {"max_iter": 200}, {
+        "max_iter": [200, 400],
+        "learning_rate": [0.05, 0.1],
+        "max_leaf_nodes": [15, 31, 63],
+        "l2_regularization": [0.0, 1.0],
+    }),
+    "ridge": Backend("ridge", _ridge, {"alpha": 1.0}, {
+        "alpha": [0.1, 1.0, 10.0, 100.0],
+    }),
+    "seasonal_naive": Backend("seasonal_naive", _seasonal_naive, {}, {}),
+}
+
+
+def get_backend(name):
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {tuple(BACKENDS)}")
+    return backend
+
+
+def make_model(name, spec, params=None, n_jobs=-1, outputs=1):
+    """Unfitted estimator for backend ``name``; ``params`` defaults to the backend's defaults."""
+    backend = get_backend(name)
+    return backend.build(spec, dict(backend.defaults if params is None else params), n_jobs, outputs)
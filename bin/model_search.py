@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Time-ordered cross-validated hyperparameter search for the consumption model.
+
+Candidates from a backend's grid (see model_backends.py) are scored with rolling-origin validation: each
+fold trains on everything before a cut-off and is scored on the block right
+after it, so no fold ever sees the future. Candidates run in a process pool
+(one single-threaded fit per worker) in order of estimated cost, and the
+search stops at a wall-clock budget, keeping the best configuration found so
+far. Results are saved next to the model as ``<model>.search.json``.
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from model_backends import get_backend, make_model
+
+# Set in each worker by _init_worker, so the data is sent once per process
+_DATA = {}
+
+
+# ---------------- Grid & Splits ----------------
+def expand_grid(grid):
+    """All parameter combinations, cheapest (fewest trees/iterations, smallest trees) first."""
+    keys = sorted(grid)
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+    def cost(params):
+        rounds = params.get("n_estimators") or params.get("max_iter") or 1
+        size = params.get("max_depth") or params.get("max_leaf_nodes") or 64
+        return rounds * size * params.get("max_features", 1.0)
+
+    return sorted(candidates, key=cost)
+
+
+def rolling_origin_splits(n, folds=4, test_size=None):
+    """(train_end, test_end) index pairs: train on [0, train_end), test on [train_end, test_end)."""
+    test_size = test_size or n // (folds + 1)
+    if test_size < 1 or n - folds * test_size < test_size:
+        raise ValueError(f"Not enough rows ({n}) for {folds} folds")
+    return [(n - (folds - i) * test_size, n - (folds - i - 1) * test_size) for i in range(folds)]
+
+
+# ---------------- Workers ----------------
+def _init_worker(X, y, splits, backend, spec, gap):
+    _DATA.update(X=X, y=y, splits=splits, backend=backend, spec=spec, gap=gap)
+
+
+def _evaluate(params):
+    X, y = _DATA["X"], _DATA["y"]
+    start = time.monotonic()
+    fold_mae = []
+    outputs = y.shape[1] if y.ndim > 1 else 1
+    for train_end, test_end in _DATA["splits"]:
+        model = make_model(_DATA["backend"], _DATA["spec"], params, n_jobs=1, outputs=outputs)
+        # Rows whose targets reach into the test block are left out of training
+        model.fit(X[:train_end - _DATA["gap"]], y[:train_end - _DATA["gap"]])
+        error = model.predict(X[train_end:test_end]) - y[train_end:test_end]
+        fold_mae.append(float(np.mean(np.abs(error))))
+    return params, fold_mae, time.monotonic() - start
+
+
+# ---------------- Search ----------------
+def search(X, y, spec, backend="rf", grid=None, folds=4, budget_seconds=2400, workers=None, gap=0, log=print):
+    """Score ``grid`` (default: the backend's) within ``budget_seconds`` and return a result dict.
+
+    ``y`` may be a (rows, horizons) matrix for direct forecasting; ``gap``
+    then drops the last ``horizons - 1`` training rows before every test block.
+    """
+    started = time.monotonic()
+    deadline = started + budget_seconds
+    candidates = expand_grid(get_backend(backend).grid if grid is None else grid)
+    splits = rolling_origin_splits(len(y), folds)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(candidates)))
+    log(f"Searching {len(candidates)} {backend} candidates with {folds} rolling-origin folds on {workers} "
+        f"worker(s), budget {budget_seconds:.0f}s.")
+
+    results = []
+    if workers == 1:
+        # In this process: fleet workers are daemonic and cannot start a pool of their own.
+        # The budget is checked between candidates, so the last one may run past it.
+        _init_worker(X, y, splits, backend, spec, gap)
+        pool, pending = None, map(_evaluate, candidates)
+    else:
+        # fork: the training scripts run at module level and must not be re-imported by workers
+        context = multiprocessing.get_context("fork")
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(X, y, splits, backend, spec, gap))
+        pending = pool.imap_unordered(_evaluate, candidates)
+    try:
+        for _ in candidates:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise multiprocessing.TimeoutError
+            params, fold_mae, seconds = next(pending) if pool is None else pending.next(timeout=remaining)
+            results.append({"params": params, "fold_mae": fold_mae,
+                            "mean_mae": float(np.mean(fold_mae)), "seconds": round(seconds, 2)})
+            log(f"Candidate {params}: MAE {results[-1]['mean_mae']:.4f} ({seconds:.1f}s)")
+        if pool is not None:
+            pool.close()
+    except multiprocessing.TimeoutError:
+        log(f"Search budget reached after {len(results)} of {len(candidates)} candidates.")
+    finally:
+        if pool is None:
+            _DATA.clear()
+        else:
+            pool.terminate()
+            pool.join()
+
+    results.sort(key=lambda r: r["mean_mae"])
+    best = results[0] if results else None
+    return {
+        "backend": backend,
+        "metric": "mae",
+        "folds": [{"train_rows": a, "test_rows": b - a} for a, b in splits],
+        "best_params": best["params"] if best else dict(get_backend(backend).defaults),
+        "best_mae": best["mean_mae"] if best else None,
+        "completed": len(results),
+        "total": len(candidates),
+        "budget_seconds": budget_seconds,
+        "elapsed_seconds": round(time.monotonic() - started, 1),
+        "candidates": results,
+    }
+
+
+def search_path(model_path):
+    return os.path.splitext(model_path)[0] + ".search.json"
+
+
+def save_search(result, model_path):
+    path = search_path(model_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp, path)
@@ -7,16 +7,22 @@ import signal
 import sys
 import paho.mqtt.client as mqtt
 from datetime import datetime
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import Point
 import json
+from influx_db import InfluxDB, resolve_config
+from influx_writer import BatchWriter
+from influx_spool import Spool
+from plugin_log import get_logger
+from plugin_settings import flag
+from hourly_rollup import HourlyRollup
+from topic_router import TopicRouter, default_routes
+from compression import CompressionStage, make_filter
+import daemon_metrics
 
 # ---------------- Setup Logging ----------------
 LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/mqtt_daemon.log"
-def log(msg):
-    os.makedirs(os.path.dirname(LOGFILE), exist_ok=True)
-    with open(LOGFILE, "a") as f:
-        f.write(f"[{datetime.now()}] {msg}\n")
+logger = get_logger("mqtt_daemon", LOGFILE)
+log = logger.info
 
 # ---------------- Load Settings ----------------
 file_path = '/opt/loxberry/data/plugins/consumption_prediction/settings.json'
@@ -26,25 +32,47 @@ with open(file_path, 'r') as file:
 # ---------------- Configuration ----------------
 SERVER = settings['mqtt_broker']
 PORT = int(settings['mqtt_port'])
-TOPIC_CONSUMPTION = settings['mqtt_topic_consumption']
-TOPIC_PRODUCTION = settings['mqtt_topic_production']  
-TOPIC_LOGS = "home/energy/logs"
 MQTT_USERNAME = settings['mqtt_username']
 MQTT_PASSWORD = settings['mqtt_password']
-print(TOPIC_PRODUCTION)
+# Without an explicit routing table, route the consumption/production/logs topics as before
+ROUTES = settings.get('mqtt_routes') or default_routes(settings)
 CLIENT_ID = "python-influx-listener"
-TOKEN_FILE = "/opt/loxberry/data/plugins/consumption_prediction/.influx_token"
 PIDFILE = "/opt/loxberry/data/plugins/consumption_prediction/daemon_script.pid"
-ORG = "Q-Home"
-BUCKET = "Energy-prediction"
-INFLUX_URL = "http://172.20.0.10:8086"
 
-# ---------------- Read InfluxDB Token ----------------
-if not os.path.exists(TOKEN_FILE):
-    raise FileNotFoundError(f"Token file not found: {TOKEN_FILE}")
+# "batch" queues points for a background writer, "sync" writes every reading immediately
+WRITE_MODE = settings.get('influx_write_mode', 'batch')
+BATCH_SIZE = int(settings.get('influx_batch_size', 500))
+FLUSH_INTERVAL = float(settings.get('influx_flush_interval', 1.0))
+QUEUE_SIZE = int(settings.get('influx_queue_size', 10000))
+BACKPRESSURE = settings.get('influx_backpressure', 'drop_oldest')
 
-with open(TOKEN_FILE) as f:
-    INFLUX_TOKEN = f.read().strip().strip('"')
+# Points InfluxDB rejects are kept on disk and replayed (batch mode only)
+SPOOL_DIR = "/opt/loxberry/data/plugins/consumption_prediction/spool"
+SPOOL_ENABLED = flag(settings, 'spool_enabled', True)
+SPOOL_MAX_MB = float(settings.get('spool_max_mb', 100))
+SPOOL_SEGMENT_KB = float(settings.get('spool_segment_kb', 1024))
+SPOOL_REPLAY_BATCH = int(settings.get('spool_replay_batch', 5000))
+SPOOL_RETRY_INTERVAL = float(settings.get('spool_retry_interval', 5.0))
+
+# Per-hour aggregates written to "<measurement>_hourly" when each hour closes
+ROLLUP_ENABLED = flag(settings, 'hourly_rollup', True)
+ROLLUP_GRACE = float(settings.get('rollup_grace_seconds', 300))
+ROLLUP_RETENTION_HOURS = float(settings.get('rollup_retention_hours', 24))
+ROLLUP_STATE_FILE = "/opt/loxberry/data/plugins/consumption_prediction/hourly_rollup.json"
+
+# Seconds between compression ratio log lines (routes with a "compression" block only)
+COMPRESSION_REPORT_INTERVAL = float(settings.get('compression_report_interval', 3600))
+
+# Prometheus text endpoint on localhost (0 disables) and optional MQTT status topic
+METRICS_PORT = int(settings.get('metrics_port', 9105))
+METRICS_TOPIC = settings.get('metrics_mqtt_topic', '')
+METRICS_PUBLISH_INTERVAL = float(settings.get('metrics_publish_interval', 60))
+
+# ---------------- InfluxDB Connection ----------------
+# URL, org, bucket and token as every other script resolves them (see influx_db.py)
+INFLUX = resolve_config(settings)
+ORG = INFLUX.org
+BUCKET = INFLUX.bucket
 
 # ---------------- Graceful Shutdown ----------------
 running = True
@@ -55,27 +83,117 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+# ---------------- Metrics ----------------
+metrics = daemon_metrics.Registry()
+m_messages = metrics.counter("mqtt_messages_total", "MQTT messages received", label="topic")
+m_parse_failures = metrics.counter("mqtt_parse_failures_total", "Payloads that could not be parsed", label="topic")
+m_unknown = metrics.counter("mqtt_unknown_topic_total", "Messages on topics without a route")
+m_reconnects = metrics.counter("mqtt_reconnects_total", "Reconnects to the MQTT broker")
+m_write_latency = metrics.histogram("influx_write_seconds", "InfluxDB write request latency",
+                                    daemon_metrics.LATENCY_BUCKETS)
+m_batch_size = metrics.histogram("influx_batch_points", "Points per InfluxDB write request",
+                                 daemon_metrics.SIZE_BUCKETS)
+
+def observe_write(seconds, points):
+    m_write_latency.observe(seconds)
+    m_batch_size.observe(points)
+
 # ---------------- InfluxDB Client ----------------
-client_influx = InfluxDBClient(
-    url=INFLUX_URL,
-    token=INFLUX_TOKEN,
-    org=ORG
-)
-write_api = client_influx.write_api(write_options=SYNCHRONOUS)
-
-# ---------------- InfluxDB Write Function ----------------
-def write_to_influx(measurement, field_name, value, timestamp=None):
-    timestamp = timestamp or datetime.now()
-    point = (
-        Point(measurement)
-        .field(field_name, value)
-        .time(timestamp)
+influx = InfluxDB(INFLUX)
+write_api = influx.write_api
+
+batch_writer = None
+if WRITE_MODE == "batch":
+    spool = None
+    if SPOOL_ENABLED:
+        spool = Spool(
+            SPOOL_DIR,
+            segment_bytes=int(SPOOL_SEGMENT_KB * 1024),
+            max_bytes=int(SPOOL_MAX_MB * 1024 * 1024),
+            log=log
+        )
+        if spool.pending():
+            log(f"Found {spool.total_bytes()} bytes of spooled points, replaying")
+    batch_writer = BatchWriter(
+        write_api,
+        bucket=BUCKET,
+        org=ORG,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        max_queue=QUEUE_SIZE,
+        backpressure=BACKPRESSURE,
+        spool=spool,
+        replay_batch_size=SPOOL_REPLAY_BATCH,
+        retry_interval=SPOOL_RETRY_INTERVAL,
+        on_write=observe_write,
+        log=log
     )
+
+# ---------------- InfluxDB Write Functions ----------------
+def write_fields_to_influx(measurement, fields, timestamp, tags=None):
+    if batch_writer is not None:
+        if not batch_writer.submit_fields(measurement, fields, timestamp, tags):
+            logger.debug(f"Write queue full, dropped: {measurement} - {fields}")
+        return
+    point = Point(measurement).time(timestamp)
+    for key, value in (tags or {}).items():
+        point.tag(key, value)
+    for key, value in fields.items():
+        point.field(key, value)
     try:
+        start = time.monotonic()
         write_api.write(bucket=BUCKET, record=point)
-        log(f"Wrote to InfluxDB: {measurement} - {field_name}={value}")
+        observe_write(time.monotonic() - start, 1)
+        logger.debug(f"Wrote to InfluxDB: {measurement} - {fields}")
     except Exception as e:
-        log(f"InfluxDB write failed: {measurement} - {field_name}={value}. Error: {e}")
+        logger.error(f"InfluxDB write failed: {measurement} - {fields}. Error: {e}")
+
+rollup = None
+if ROLLUP_ENABLED:
+    rollup = HourlyRollup(
+        write_fields_to_influx,
+        grace=ROLLUP_GRACE,
+        retention_hours=ROLLUP_RETENTION_HOURS,
+        state_path=ROLLUP_STATE_FILE,
+        log=log
+    )
+
+compressor = CompressionStage()
+
+metrics.gauge("write_queue_depth", "Points waiting for the batch writer",
+              lambda: batch_writer.qsize() if batch_writer else 0)
+for name, attr, help_text in (
+    ("influx_points_written_total", "written", "Points written to InfluxDB by the batch writer"),
+    ("influx_points_dropped_total", "dropped", "Points dropped because the write queue was full"),
+    ("influx_points_failed_total", "failed", "Points lost after a failed write"),
+    ("influx_points_spooled_total", "spooled", "Points written to the disk spool"),
+    ("influx_points_replayed_total", "replayed", "Points replayed from the disk spool"),
+):
+    metrics.counter_func(name, help_text, lambda attr=attr: getattr(batch_writer, attr, 0))
+metrics.gauge("spool_bytes", "Bytes waiting in the disk spool",
+              lambda: batch_writer.spool.total_bytes() if batch_writer and batch_writer.spool else 0)
+metrics.counter_func("compression_received_total", "Readings offered to compression",
+                     lambda: compressor.received)
+metrics.counter_func("compression_emitted_total", "Points kept by compression", lambda: compressor.emitted)
+
+def write_to_influx(measurement, field_name, value, timestamp=None, tags=None, compression=None):
+    timestamp = timestamp or datetime.now()
+    # Rollups always see every raw reading, compression only thins out the raw series
+    if rollup is not None:
+        rollup.add(measurement, field_name, value, timestamp, tags)
+    if compression:
+        key = (measurement, field_name, tuple(sorted(tags.items())) if tags else ())
+        for kept_value, kept_time in compressor.offer(key, compression, value, timestamp):
+            write_fields_to_influx(measurement, {field_name: kept_value}, kept_time, tags)
+        return
+    write_fields_to_influx(measurement, {field_name: value}, timestamp, tags)
+
+# ---------------- Topic Routing ----------------
+router = TopicRouter(ROUTES)
+for route in router.routes:
+    if route.options.get("compression"):
+        make_filter(route.options["compression"])  # fail on bad settings at startup, not per message
+log(f"Loaded {len(router.routes)} MQTT routes")
 
 # ---------------- MQTT Callback ----------------
 def on_message(client, userdata, msg):
@@ -86,47 +204,54 @@ def on_message(client, userdata, msg):
         if not message:
             return
 
+        m_messages.inc(topic)
+        route = router.resolve(topic)
+        if route is None:
+            m_unknown.inc()
+            log(f"Received message on unknown topic '{topic}': {message}")
+            return
 
-        if topic == TOPIC_CONSUMPTION:
-            try:
-                consumption = float(message)
-            except ValueError:
-                log(f"Warning: Invalid float on topic '{topic}': '{message}'")
-                return
-            write_to_influx("energy_consumption", "consumption_kwh", consumption)
-
-        elif topic == TOPIC_PRODUCTION:
-            try:
-                production = float(message)
-                print(f"type of production: {type(production)}")
-            except ValueError:
-                log(f"Warning: Invalid float on topic '{topic}': '{message}'")
-                print(f"Warning: Invalid float on topic '{topic}': '{message}'")
-                return
-            write_to_influx("solar_production", "production_kwh", production)
-            print("wrote" + str(production) + " kWh to productiondb")
-
-        elif topic == TOPIC_LOGS:
+        if route.parser == "log":
             log(f"[MQTT LOG] {message}")
+            return
 
-        else:
-            log(f"Received message on unknown topic '{topic}': {message}")
+        try:
+            value = route.parse(message)
+        except ValueError:
+            m_parse_failures.inc(topic)
+            logger.warning(f"Warning: Invalid value on topic '{topic}': '{message}'")
+            return
+        write_to_influx(route.measurement, route.field, value, tags=route.tags,
+                        compression=route.route.options.get("compression"))
 
     except Exception as e:
-        log(f"Error processing message from topic '{msg.topic}': {e}")
+        logger.error(f"Error processing message from topic '{msg.topic}': {e}")
 
 # ---------------- Start MQTT ----------------
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+connected_once = False
+def on_connect(client, userdata, flags, reason_code, properties):
+    global connected_once
+    if connected_once:
+        m_reconnects.inc()
+        log(f"Reconnected to MQTT broker ({reason_code})")
+    connected_once = True
+    # Subscribe here so subscriptions are restored after every reconnect
+    client.subscribe([(pattern, 0) for pattern in router.subscriptions()])
+
+client.on_connect = on_connect
 client.on_message = on_message
 client.connect(SERVER, PORT, 60)
-client.subscribe([
-    (TOPIC_CONSUMPTION, 0),
-    (TOPIC_PRODUCTION, 0),
-    (TOPIC_LOGS, 0)
-])
 client.loop_start()
 
+metrics_server = None
+if METRICS_PORT:
+    try:
+        metrics_server = daemon_metrics.MetricsServer(metrics, METRICS_PORT, log=log)
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+
 # ---------------- Write PID ----------------
 os.makedirs(os.path.dirname(PIDFILE), exist_ok=True)
 with open(PIDFILE, "w") as f:
@@ -135,13 +260,38 @@ with open(PIDFILE, "w") as f:
 log("Daemon script launched")
 
 # ---------------- Main Loop ----------------
+last_compression_report = time.monotonic()
+last_metrics_publish = time.monotonic()
 try:
     while running:
         time.sleep(1)
+        if METRICS_TOPIC and time.monotonic() - last_metrics_publish >= METRICS_PUBLISH_INTERVAL:
+            daemon_metrics.publish_status(client, METRICS_TOPIC, metrics)
+            last_metrics_publish = time.monotonic()
+        if rollup is not None:
+            rollup.flush_due()
+        if compressor.received and time.monotonic() - last_compression_report >= COMPRESSION_REPORT_INTERVAL:
+            log(compressor.report())
+            last_compression_report = time.monotonic()
 finally:
     client.loop_stop()
     client.disconnect()
-    client_influx.close()
+    if metrics_server is not None:
+        metrics_server.close()
+    # Write readings swinging-door filters are still holding back
+    for (measurement, field_name, tags), value, timestamp in compressor.flush():
+        write_fields_to_influx(measurement, {field_name: value}, timestamp, dict(tags) or None)
+    if compressor.received:
+        log(compressor.report())
+    if rollup is not None:
+        rollup.flush_due()
+        rollup.save_state()
+    if batch_writer is not None:
+        batch_writer.close()
+        log(f"Batch writer flushed: {batch_writer.written} written, "
+            f"{batch_writer.dropped} dropped, {batch_writer.failed} failed, "
+            f"{batch_writer.spooled} spooled, {batch_writer.replayed} replayed")
+    influx.close()
     if os.path.exists(PIDFILE):
         os.remove(PIDFILE)
     log("Daemon script stopped")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Shared logging for all plugin scripts.
+
+Records are handed to a queue and written by a background listener thread,
+so callers never block on file I/O. Log files rotate by size and age, and
+each log keeps a small ``<logfile>.idx`` sidecar with the byte offsets of
+its most recent records so the web frontend can serve the last N lines
+without reading the whole file. Both are kept per process, so every log
+file must have a single writing script.
+
+Optional keys in settings.json:
+    log_level        DEBUG, INFO (default), WARNING or ERROR
+    log_max_kb       rotate when the file exceeds this size (default 1024)
+    log_backups      number of rotated files to keep (default 3)
+    log_rotate_days  rotate when the current file is older than this (default 7, 0 disables)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+LOG_DIR = "/opt/loxberry/data/plugins/consumption_prediction"
+SETTINGS_PATH = "/opt/loxberry/data/plugins/consumption_prediction/settings.json"
+
+TAIL_LINES = 500
+INDEX_INTERVAL = 2.0  # seconds between index rewrites
+
+_listeners = {}
+
+
+def _load_settings():
+    try:
+        with open(SETTINGS_PATH, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+class _Formatter(logging.Formatter):
+    """Keeps the ``[<datetime>] [TAG] message`` layout the scripts always wrote."""
+
+    def __init__(self, tag=None):
+        super().__init__()
+        self.prefix = f"[{tag}] " if tag else ""
+
+    def format(self, record):
+        msg = record.getMessage()
+        if record.exc_info:
+            msg = f"{msg}\n{self.formatException(record.exc_info)}"
+        return f"[{datetime.fromtimestamp(record.created)}] {self.prefix}{msg}"
+
+
+class TailIndexedFileHandler(logging.handlers.RotatingFileHandler):
+    """Size- and age-rotating file handler that maintains a tail index sidecar."""
+
+    def __init__(self, filename, max_bytes, backup_count, rotate_days, tail_lines=TAIL_LINES):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.index_path = self.baseFilename + ".idx"
+        self.rotate_seconds = rotate_days * 86400
+        self._offsets = deque(maxlen=tail_lines)
+        self._started = time.time()
+        self._index_written = 0.0
+        self._load_index()
+
+    # ---------------- Tail Index ----------------
+    def _load_index(self):
+        try:
+            size = os.path.getsize(self.baseFilename)
+        except OSError:
+            size = 0
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            self._started = float(index.get("started", self._started))
+            if index.get("size", -1) == size:
+                self._offsets.extend(index.get("offsets", []))
+                return
+        except Exception:
+            pass
+        # Index missing or stale: seed it from the end of the existing file
+        self._offsets.extend(self._scan_tail(size))
+
+    def _scan_tail(self, size, block=64 * 1024):
+        if size == 0:
+            return []
+        with open(self.baseFilename, "rb") as f:
+            start = max(0, size - block)
+            f.seek(start)
+            data = f.read()
+        offsets = [start + i + 1 for i, c in enumerate(data) if c == 0x0A and start + i + 1 < size]
+        if start == 0:
+            offsets.insert(0, 0)
+        return offsets
+
+    def write_index(self):
+        try:
+            size = self.stream.tell() if self.stream else os.path.getsize(self.baseFilename)
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"size": size, "started": self._started, "offsets": list(self._offsets)}, f)
+            os.replace(tmp, self.index_path)
+            self._index_written = time.monotonic()
+        except Exception:
+            pass
+
+    # ---------------- Rotation ----------------
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() - self._started >= self.rotate_seconds:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._offsets.clear()
+        self._started = time.time()
+        self.write_index()
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            offset = self.stream.tell()
+            logging.FileHandler.emit(self, record)
+            self._offsets.append(offset)
+            if time.monotonic() - self._index_written >= INDEX_INTERVAL:
+                self.write_index()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.stream:
+            self.write_index()
+        super().close()
+
+
+def get_logger(name, logfile=None, tag=None, console=False):
+    """Return a queue-backed logger writing to ``logfile`` (default ``<LOG_DIR>/<name>.log``)."""
+    logger = logging.getLogger(f"consumption_prediction.{name}")
+    if logger.handlers:
+        return logger
+
+    settings = _load_settings()
+    level = getattr(logging, str(settings.get("log_level", "INFO")).upper(), logging.INFO)
+    logfile = logfile or os.path.join(LOG_DIR, f"{name}.log")
+
+    formatter = _Formatter(tag)
+    handlers = []
+    file_handler = TailIndexedFileHandler(
+        logfile,
+        max_bytes=int(float(settings.get("log_max_kb", 1024)) * 1024),
+        backup_count=int(settings.get("log_backups", 3)),
+        rotate_days=float(settings.get("log_rotate_days", 7)),
+    )
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    _listeners[name] = listener
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def shutdown():
+    """Flush all pending records and close the log files."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown)
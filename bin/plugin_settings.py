@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Typed reads of settings.json values.
+
+settings.json is written by hand and by the web frontend, so an on/off
+switch may arrive as a JSON boolean, a number or a string such as
+``"false"``, and ``bool("false")`` is True.
+"""
+
+TRUE = ("true", "1", "yes", "on")
+FALSE = ("false", "0", "no", "off", "")
+
+
+def flag(settings, key, default=False):
+    """``settings[key]`` as a bool, ``default`` when missing or null.
+
+    Accepts booleans, 0/1 and the strings true/false, 1/0, yes/no and on/off
+    in any case; raises ValueError for anything else.
+    """
+    value = settings.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE:
+            return True
+        if text in FALSE:
+            return False
+    raise ValueError(f"Setting '{key}' must be true or false, got {value!r}")
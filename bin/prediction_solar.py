@@ -3,232 +3,165 @@
 
 import os
 import json
-import requests
-import pandas as pd
-import joblib
-from sklearn.ensemble import RandomForestRegressor
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+import time
+from influxdb_client import Point
 from datetime import datetime, timedelta
+from plugin_log import get_logger
+from influx_db import get_influx
+from weather_cache import PROVIDERS, WeatherUnavailable, cache_from_settings, location
+from weather_archive import archive_from_settings
+from pv_model import system_from_settings
+from align import align_frame
+from features import SOLAR_SPEC, history_needed, recursive_forecast, save_spec, with_resolution
+from model_backends import DEFAULT_BACKEND
+from model_artifact import load_model, store_model
+from solar_model import (ARCHIVE_TRAINING_DAYS, MAX_MODEL_AGE_HOURS, MODEL_PATH, RETRAIN_HOURS, TRAINING_DAYS,
+                         WEATHER_TOLERANCE, fetch_production, fetch_weather, retrain_reason, train, training_data)
 
 # ---------------- Logging Setup ----------------
-LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/prediction.log"
+LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/prediction_solar.log"
 
-def log(msg):
-    os.makedirs(os.path.dirname(LOGFILE), exist_ok=True)
-    with open(LOGFILE, "a") as f:
-        f.write(f"[{datetime.now()}] [SOLAR] {msg}\n")
+logger = get_logger("prediction_solar", LOGFILE, tag="SOLAR")
+log = logger.info
 
 log("Starting solar prediction script.")
 
 # ---------------- Config & Settings ----------------
 SETTINGS_PATH = "/opt/loxberry/data/plugins/consumption_prediction/settings.json"
-TOKEN_FILE = "/opt/loxberry/data/plugins/consumption_prediction/.influx_token"
-MODEL_PATH = "/opt/loxberry/data/plugins/consumption_prediction/solar_model.pkl"
 
 try:
     with open(SETTINGS_PATH, "r") as f:
         settings = json.load(f)
+    # "open-meteo" shares get_solar_prediction.py's cached forecast; "openweathermap" needs an API key
+    WEATHER_PROVIDER = settings.get("weather_provider", "open-meteo")
     API_KEY = settings.get("openweathermap_api_key")
-    print(f"api key: {API_KEY}")
-    LAT = settings.get("latitude")
-    LON = settings.get("longitude")
-    INFLUX_URL = settings.get("influx_url", "http://localhost:8086")
-    ORG = settings.get("influx_org", "Q-Home")
-    BUCKET = settings.get("influx_bucket", "Energy-prediction")
-    if not API_KEY or not LAT or not LON:
+    LOCATION = location(settings)
+    MODEL_BACKEND = settings.get("solar_model_backend", settings.get("model_backend", DEFAULT_BACKEND))
+    MODEL_FORMAT = settings.get("model_format", "packed")
+    MODEL_COMPRESSION = settings.get("model_compression")
+    FORECAST_HOURS = int(settings.get("forecast_horizon_hours", 24))
+    RESOLUTION = int(settings.get("forecast_resolution_minutes", 60))
+    # The saved model is reused until it is stale (see solar_model.py); train_solar_model.py retrains it explicitly
+    TRAINING_DAYS = int(settings.get("solar_training_days", TRAINING_DAYS))
+    RETRAIN_HOURS = float(settings.get("solar_retrain_hours", RETRAIN_HOURS))
+    MAX_MODEL_AGE_HOURS = float(settings.get("solar_max_model_age_hours", MAX_MODEL_AGE_HOURS))
+    ARCHIVE_TRAINING_DAYS = int(settings.get("solar_archive_training_days", ARCHIVE_TRAINING_DAYS))
+    PV = system_from_settings(settings)
+    spec = with_resolution(SOLAR_SPEC, RESOLUTION)
+    if WEATHER_PROVIDER not in PROVIDERS:
+        log(f"[error] Unknown weather_provider '{WEATHER_PROVIDER}', expected one of {PROVIDERS}")
+        exit(1)
+    if LOCATION is None or (WEATHER_PROVIDER == "openweathermap" and not API_KEY):
         log("[error] Missing API key or location in settings.json")
         exit(1)
+    LAT, LON = LOCATION
     log("Settings loaded successfully.")
 except Exception as e:
     log(f"[error] Failed to load settings.json: {e}")
     exit(1)
 
-try:
-    with open(TOKEN_FILE, "r") as f:
-        INFLUX_TOKEN = f.read().strip()
-    log("InfluxDB token loaded successfully.")
-except Exception as e:
-    log(f"[error] Failed to load InfluxDB token: {e}")
-    exit(1)
-
 # ---------------- InfluxDB Client ----------------
 try:
-    client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=ORG)
-    query_api = client.query_api()
-    write_api = client.write_api(write_options=SYNCHRONOUS)
+    influx = get_influx(settings)
     log("Connected to InfluxDB.")
 except Exception as e:
     log(f"[error] Failed to connect to InfluxDB: {e}")
     exit(1)
 
-# ---------------- Fetch Solar Production Data ----------------
-query = f'''
-from(bucket: "{BUCKET}")
-|> range(start: -14d)
-|> filter(fn: (r) => r["_measurement"] == "solar_production" and r["_field"] == "production_kwh")
-|> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
-'''
+# ---------------- Load Model ----------------
+try:
+    model, header = load_model(MODEL_PATH)
+except FileNotFoundError:
+    model, header = None, None
+except Exception as e:
+    log(f"[warning] Could not load the solar model: {e}")
+    model, header = None, None
 
+# ---------------- Fetch Solar Production Data ----------------
+need = history_needed(spec)
 try:
-    df = query_api.query_data_frame(org=ORG, query=query)
-    if isinstance(df, list) and len(df) > 0:
-        df = df[0]
-    log("Solar production data queried from InfluxDB.")
+    production = fetch_production(influx, f"-{max(48 * 60, need * RESOLUTION)}m", RESOLUTION)
+    log(f"Solar production data queried from InfluxDB: {len(production)} {RESOLUTION}-minute rows.")
 except Exception as e:
     log(f"[error] Failed to query solar production data: {e}")
     exit(1)
 
-if df.empty or len(df) < 48:
-    log("[warning] Not enough solar production data (need at least 2 days). Exiting.")
+if production.empty:
+    log("[warning] No recent solar production data. Exiting.")
     exit(0)
 
-df = df.rename(columns={"_time": "datetime", "production_kwh": "production_kwh"})
-df['datetime'] = pd.to_datetime(df['datetime'], utc=True).dt.floor('h')
+cache = cache_from_settings(settings, log=log)
+archive = archive_from_settings(settings, WEATHER_PROVIDER)
 
-# ---------------- Fetch Weather Forecast ----------------
-def fetch_weather_forecast():
-    url = (
-        f"https://api.openweathermap.org/data/2.5/forecast?"
-        f"lat={LAT}&lon={LON}&appid={API_KEY}&units=metric"
-    )
+# ---------------- Retrain When Stale ----------------
+reason = retrain_reason(header, spec, MODEL_BACKEND, production["datetime"].iloc[-1], RETRAIN_HOURS,
+                        MAX_MODEL_AGE_HOURS)
+if reason:
+    log(f"Retraining the solar model: {reason}.")
+    started = time.perf_counter()
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        log("Weather forecast fetched successfully.")
-        return data
+        training, past_weather = training_data(influx, cache, WEATHER_PROVIDER, LAT, LON, FORECAST_HOURS,
+                                               RESOLUTION, spec["exogenous"], API_KEY, TRAINING_DAYS, archive,
+                                               ARCHIVE_TRAINING_DAYS, pv=PV, log=log)
+        if len(training) < 48 * 60 // RESOLUTION:
+            log("[warning] Not enough solar production data (need at least 2 days). Exiting.")
+            exit(0)
+        model, header = train(spec, MODEL_BACKEND, training, past_weather)
     except Exception as e:
-        log(f"[error] Failed to fetch weather data: {e}")
-        return None
-
-forecast_data = fetch_weather_forecast()
-if not forecast_data:
-    exit(1)
-
-weather_list = forecast_data.get("list", [])
-if not weather_list:
-    log("[error] No forecast data found in API response.")
-    exit(1)
-
-weather_rows = []
-for entry in weather_list:
-    dt = datetime.utcfromtimestamp(entry["dt"])
-    clouds = entry["clouds"]["all"]
-    temp = entry["main"]["temp"]
-    wind = entry["wind"]["speed"]
-    weather_rows.append({"datetime": dt, "clouds": clouds, "temp": temp, "wind": wind})
-
-weather_df = pd.DataFrame(weather_rows)
-weather_df['datetime'] = pd.to_datetime(weather_df['datetime'], utc=True).dt.floor('h')
-
-# Interpolate to get hourly data
-weather_df = weather_df.set_index('datetime').resample('h').interpolate().reset_index()
-print(f"[DEBUG] Weather forecast after interpolation: {len(weather_df)} rows")
-
-# ---------------- Preprocessing ----------------
-print(f"[DEBUG] Solar data rows before merge: {len(df)}")
-print(f"[DEBUG] Weather forecast rows: {len(weather_df)}")
-print(f"[DEBUG] Solar datetime range: {df['datetime'].min()} to {df['datetime'].max()}")
-print(f"[DEBUG] Weather datetime range: {weather_df['datetime'].min()} to {weather_df['datetime'].max()}")
-
-# Align data to overlapping period
-min_weather_time = weather_df['datetime'].min() - pd.Timedelta('4h')
-max_weather_time = weather_df['datetime'].max() + pd.Timedelta('4h')
-df = df[(df['datetime'] >= min_weather_time) & (df['datetime'] <= max_weather_time)]
-
-assert df['datetime'].is_unique, "[ERROR] Duplicate datetimes in solar data"
-assert weather_df['datetime'].is_unique, "[ERROR] Duplicate datetimes in weather data"
-
-
-# Merge
-merged_df = pd.merge_asof(df.sort_values('datetime'), weather_df.sort_values('datetime'), on='datetime', direction='nearest', tolerance=pd.Timedelta('4h'))
-print(f"[DEBUG] Rows after merge: {len(merged_df)}")
-print(f"[DEBUG] Rows before dropping NaNs: {len(merged_df)}")
-
-merged_df = merged_df.dropna(subset=['clouds', 'temp', 'wind'])
-print(f"[DEBUG] Rows after dropping NaNs: {len(merged_df)}")
-
-# Add time features and lag features
-merged_df['hour'] = merged_df['datetime'].dt.hour
-merged_df['day_of_week'] = merged_df['datetime'].dt.dayofweek
-merged_df['day'] = merged_df['datetime'].dt.day
-merged_df['month'] = merged_df['datetime'].dt.month
-merged_df['year'] = merged_df['datetime'].dt.year
-merged_df = merged_df.sort_values('datetime')
-merged_df['lag_1h'] = merged_df['production_kwh'].shift(1)
-merged_df['lag_24h'] = merged_df['production_kwh'].shift(24)
-
-print(f"[DEBUG] Rows before dropping NaNs from lag features: {len(merged_df)}")
-merged_df = merged_df.dropna(subset=['lag_1h', 'lag_24h'])
-print(f"[DEBUG] Rows after dropping NaNs from lag features: {len(merged_df)}")
-
-if merged_df.empty:
-    print("[DEBUG] Dataframe is empty after all preprocessing. Exiting.")
-    exit(0)
-
-# ---------------- Model Training ----------------
-feature_cols = ['hour', 'day_of_week', 'day', 'month', 'year', 'clouds', 'temp', 'wind', 'lag_1h', 'lag_24h']
-X_train = merged_df[feature_cols]
-y_train = merged_df['production_kwh']
-
-try:
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    log("Random Forest model trained successfully.")
-except Exception as e:
-    log(f"[error] Model training failed: {e}")
-    exit(1)
+        log(f"[error] Model training failed: {e}")
+        exit(1)
+    try:
+        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+        saved = store_model(model, MODEL_PATH, header, MODEL_FORMAT, compression=MODEL_COMPRESSION)
+        save_spec(spec, MODEL_PATH)
+        log(f"Solar model trained on {header['rows']} rows ({MODEL_BACKEND}) and saved to {saved} "
+            f"in {time.perf_counter() - started:.1f}s.")
+    except Exception as e:
+        log(f"[error] Failed to save model: {e}")
+        exit(1)
+else:
+    log(f"Using the solar model trained through {header['trained_through']}.")
 
-# ---------------- Save Model ----------------
+# ---------------- Fetch Weather Forecast ----------------
+# The same request get_solar_prediction.py makes, so the cached forecast serves both
 try:
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump(model, MODEL_PATH)
-    log(f"Model saved to: {MODEL_PATH}")
-except Exception as e:
-    log(f"[error] Failed to save model: {e}")
+    weather_df, status = fetch_weather(cache, WEATHER_PROVIDER, LAT, LON, FORECAST_HOURS, RESOLUTION,
+                                       spec["exogenous"], API_KEY, archive=archive, pv=PV, log=log)
+except (WeatherUnavailable, ValueError) as e:
+    log(f"[error] {e}")
     exit(1)
+log(f"Weather forecast from {WEATHER_PROVIDER}: {status}.")
 
 # ---------------- Predict ----------------
+started = time.perf_counter()
 now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
-future_times = [now + timedelta(hours=i) for i in range(24)]
-
-weather_pred_rows = []
-for t in future_times:
-    closest = weather_df.iloc[(weather_df['datetime'] - t).abs().argsort()[:1]].iloc[0]
-    weather_pred_rows.append({
-        "datetime": t,
-        "hour": t.hour,
-        "day_of_week": t.weekday(),
-        "day": t.day,
-        "month": t.month,
-        "year": t.year,
-        "clouds": closest['clouds'],
-        "temp": closest['temp'],
-        "wind": closest['wind']
-    })
-
-pred_df = pd.DataFrame(weather_pred_rows)
-last_known = merged_df.set_index('datetime').sort_index().iloc[-24:]
-predictions = []
-for i, row in pred_df.iterrows():
-    lag_1h = predictions[i-1] if i > 0 else last_known['production_kwh'].iloc[-1]
-    lag_24h = last_known['production_kwh'].iloc[-24 + i] if i < 24 else last_known['production_kwh'].iloc[0]
-    features = [row[col] for col in ['hour', 'day_of_week', 'day', 'month', 'year', 'clouds', 'temp', 'wind']] + [lag_1h, lag_24h]
-    pred = model.predict([features])[0]
-    predictions.append(pred)
-
-pred_df['predicted_production_kwh'] = predictions
+future_times = [now + timedelta(minutes=RESOLUTION * i) for i in range(FORECAST_HOURS * 60 // RESOLUTION)]
+# The weather forecast covers a limited number of days; don't extrapolate past its last row
+last_weather = weather_df['datetime'].max().tz_localize(None)
+if future_times[-1] > last_weather:
+    future_times = [t for t in future_times if t <= last_weather]
+    log(f"[warning] Weather forecast ends at {last_weather}; predicting {len(future_times)} steps.")
+
+# Forecast weather interpolated to every future step in one pass
+future_weather = align_frame(future_times, weather_df, spec['exogenous'], WEATHER_TOLERANCE)
+
+# Lags from the latest production on a gapless grid
+recent = production.set_index('datetime')['production_kwh'].resample(f'{RESOLUTION}min').mean().ffill()
+history = recent.to_numpy()[-need:]
+if len(history) < need:
+    log(f"[warning] Not enough solar history for prediction (need {need} steps). Exiting.")
+    exit(0)
+predictions = recursive_forecast(model, spec, history, future_times, future_weather)
+elapsed = time.perf_counter() - started
+if not reason:
+    log(f"Forecast computed in {elapsed:.2f}s with the saved model; "
+        f"{header.get('training_seconds', 0):.1f}s of training saved.")
 
 try:
-    for _, r in pred_df.iterrows():
-        point = (
-            Point("solar_production_prediction")
-            .field("predicted_w", float(r['predicted_production_kwh']))
-            .time(r['datetime'])
-        )
-        write_api.write(bucket=BUCKET, record=point)
-    log("Predictions for next 24 hours written to InfluxDB.")
+    points = [Point("solar_production_prediction").field("predicted_w", float(pred)).time(dt)
+              for dt, pred in zip(future_times, predictions)]
+    influx.write_points(points)
+    log(f"{len(points)} predictions ({RESOLUTION}-minute steps) written to InfluxDB.")
 except Exception as e:
     log(f"[error] Failed to write predictions to InfluxDB: {e}")
     exit(1)
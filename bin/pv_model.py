@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Physical PV model, vectorized over timestamps.
+
+For arrays of UTC timestamps (anything ``features.to_ns`` accepts) it
+computes, with plain NumPy and no per-step Python:
+
+    solar_position     zenith and azimuth (NOAA equations, ~0.5 degrees)
+    clear_sky          clear-sky GHI / DNI / DHI (simplified Ineichen, Linke turbidity 3)
+    decompose          DNI / DHI from a forecast GHI (Erbs)
+    plane_of_array     irradiance on the tilted panels (isotropic sky plus ground reflection)
+    cell_temperature   module temperature from irradiance, air temperature and wind (Faiman)
+    power              AC output in kW from all of the above
+
+``get_solar_prediction.py`` uses ``power`` as its forecast, and the solar
+model gets it as the ``pv_kw`` feature. Without radiation (OpenWeatherMap)
+GHI is estimated from the clear sky and the cloud cover.
+
+Optional ``pv`` block in settings.json:
+    tilt              panel tilt in degrees from horizontal (default 35)
+    azimuth           panel azimuth in degrees, 180 = south (default 180)
+    peak_kw           DC power at 1000 W/m² and 25 °C (default PANEL_AREA * EFFICIENCY)
+    temp_coefficient  relative power change per °C above 25 °C (default -0.004)
+    losses            inverter, wiring and soiling losses as a fraction (default 0.14)
+    albedo            ground reflectance (default 0.2)
+    altitude          site altitude in metres (default 0)
+"""
+
+import numpy as np
+
+from features import to_ns
+
+SOLAR_CONSTANT = 1361.0
+LINKE_TURBIDITY = 3.0
+_NS_PER_DAY = 86400 * 10**9
+_J2000_NS = 946728000 * 10**9  # 2000-01-01 12:00 UTC
+
+
+class PVSystem:
+    __slots__ = ("tilt", "azimuth", "peak_kw", "temp_coefficient", "losses", "albedo", "altitude")
+
+    def __init__(self, tilt=35.0, azimuth=180.0, peak_kw=1.0, temp_coefficient=-0.004, losses=0.14,
+                 albedo=0.2, altitude=0.0):
+        self.tilt = tilt
+        self.azimuth = azimuth
+        self.peak_kw = peak_kw
+        self.temp_coefficient = temp_coefficient
+        self.losses = losses
+        self.albedo = albedo
+        self.altitude = altitude
+
+
+def system_from_settings(settings):
+    """PVSystem from the ``pv`` block, sized by PANEL_AREA * EFFICIENCY unless ``peak_kw`` is set."""
+    pv = settings.get("pv") or {}
+    peak_kw = pv.get("peak_kw")
+    if peak_kw is None:
+        peak_kw = float(settings.get("PANEL_AREA", 5)) * float(settings.get("EFFICIENCY", 0.2))
+    return PVSystem(tilt=float(pv.get("tilt", 35)), azimuth=float(pv.get("azimuth", 180)), peak_kw=float(peak_kw),
+                    temp_coefficient=float(pv.get("temp_coefficient", -0.004)), losses=float(pv.get("losses", 0.14)),
+                    albedo=float(pv.get("albedo", 0.2)), altitude=float(pv.get("altitude", 0)))
+
+
+# ---------------- Sun ----------------
+def solar_position(times, lat, lon):
+    """``(zenith, azimuth)`` in degrees; azimuth clockwise from north."""
+    ns = to_ns(times)
+    days = (ns - _J2000_NS) / _NS_PER_DAY
+    # Fractional year of the NOAA equations, from the day number since J2000
+    gamma = 2 * np.pi / 365.2422 * ((days + 0.5) % 365.2422)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma) - 0.006758 * np.cos(2 * gamma)
+            + 0.000907 * np.sin(2 * gamma) - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    minutes = (ns % _NS_PER_DAY) / 6e10
+    hour_angle = np.radians((minutes + eqtime + 4 * lon) / 4 - 180)
+
+    phi = np.radians(lat)
+    cos_zenith = np.clip(np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(hour_angle), -1, 1)
+    zenith = np.arccos(cos_zenith)
+    azimuth = np.arctan2(np.sin(hour_angle),
+                         np.cos(hour_angle) * np.sin(phi) - np.tan(decl) * np.cos(phi)) + np.pi
+    return np.degrees(zenith), np.degrees(azimuth) % 360
+
+
+def extraterrestrial(times):
+    """Irradiance at the top of the atmosphere (W/m²), following the Earth-Sun distance."""
+    day_angle = 2 * np.pi * ((to_ns(times) - _J2000_NS) / _NS_PER_DAY % 365.2422) / 365.2422
+    return SOLAR_CONSTANT * (1.00011 + 0.034221 * np.cos(day_angle) + 0.00128 * np.sin(day_angle)
+                             + 0.000719 * np.cos(2 * day_angle) + 0.000077 * np.sin(2 * day_angle))
+
+
+def _air_mass(zenith):
+    """Relative air mass (Kasten-Young); NaN with the sun below the horizon."""
+    zenith = np.where(zenith < 90, zenith, np.nan)
+    return 1 / (np.cos(np.radians(zenith)) + 0.50572 * (96.07995 - zenith) ** -1.6364)
+
+
+# ---------------- Irradiance ----------------
+def clear_sky(zenith, e0, altitude=0.0, turbidity=LINKE_TURBIDITY):
+    """``(ghi, dni, dhi)`` under a clear sky (W/m²), zero at night."""
+    am = _air_mass(zenith) * np.exp(-altitude / 8434.5)
+    fh1, fh2 = np.exp(-altitude / 8000), np.exp(-altitude / 1250)
+    cg1, cg2 = 5.09e-5 * altitude + 0.868, 3.92e-5 * altitude + 0.0387
+    cos_zenith = np.cos(np.radians(zenith))
+    ghi = cg1 * e0 * cos_zenith * np.exp(-cg2 * am * (fh1 + fh2 * (turbidity - 1))) * np.exp(0.01 * am ** 1.8)
+    dni = (0.664 + 0.163 / fh1) * e0 * np.exp(-0.09 * am * (turbidity - 1))
+    dni = np.minimum(dni, ghi / np.maximum(cos_zenith, 1e-3))
+    ghi, dni = np.nan_to_num(ghi), np.nan_to_num(dni)
+    return ghi, dni, np.maximum(ghi - dni * np.maximum(cos_zenith, 0), 0)
+
+
+def cloudy_ghi(clear_ghi, clouds):
+    """GHI from the clear-sky GHI and cloud cover in % (Kasten-Czeplak)."""
+    return clear_ghi * (1 - 0.75 * (np.clip(clouds, 0, 100) / 100) ** 3.4)
+
+
+def decompose(ghi, zenith, e0):
+    """``(dni, dhi)`` from GHI with the Erbs diffuse fraction; no beam with the sun below 87 degrees zenith."""
+    cos_zenith = np.cos(np.radians(zenith))
+    day = zenith < 87
+    kt = np.clip(np.divide(ghi, e0 * cos_zenith, out=np.zeros_like(ghi, dtype=np.float64), where=day), 0, 1)
+    diffuse = np.where(kt <= 0.22, 1 - 0.09 * kt,
+                       np.where(kt <= 0.8, 0.9511 - 0.1604 * kt + 4.388 * kt**2 - 16.638 * kt**3 + 12.336 * kt**4,
+                                0.165))
+    dhi = np.where(day, ghi * diffuse, ghi)
+    dni = np.divide(ghi - dhi, cos_zenith, out=np.zeros_like(dhi), where=day)
+    return np.minimum(dni, e0), dhi
+
+
+def plane_of_array(ghi, dni, dhi, zenith, azimuth, tilt, surface_azimuth, albedo=0.2):
+    """Irradiance on the panel plane (W/m²): beam, isotropic sky diffuse and ground-reflected."""
+    zenith_r, tilt_r = np.radians(zenith), np.radians(tilt)
+    cos_aoi = (np.cos(zenith_r) * np.cos(tilt_r)
+               + np.sin(zenith_r) * np.sin(tilt_r) * np.cos(np.radians(azimuth - surface_azimuth)))
+    beam = dni * np.clip(cos_aoi, 0, None)
+    sky = dhi * (1 + np.cos(tilt_r)) / 2
+    ground = ghi * albedo * (1 - np.cos(tilt_r)) / 2
+    return beam + sky + ground
+
+
+def cell_temperature(poa, temp_air, wind, u0=25.0, u1=6.84):
+    """Module temperature (°C) with the Faiman heat-loss model."""
+    return temp_air + poa / (u0 + u1 * np.clip(wind, 0, None))
+
+
+# ---------------- Power ----------------
+def power(system, times, lat, lon, ghi=None, temp=None, wind=None, clouds=None):
+    """AC power in kW at ``times``.
+
+    ``ghi`` is the forecast radiation; where it is missing, GHI comes from
+    ``clouds``, and without either from the clear sky. Missing ``temp`` and
+    ``wind`` count as 25 °C and 1 m/s.
+    """
+    ns = to_ns(times)
+    zenith, azimuth = solar_position(ns, lat, lon)
+    e0 = extraterrestrial(ns)
+    clear_ghi, _, _ = clear_sky(zenith, e0, system.altitude)
+    estimate = clear_ghi if clouds is None else cloudy_ghi(clear_ghi, np.asarray(clouds, dtype=np.float64))
+    if ghi is None:
+        ghi = estimate
+    else:
+        ghi = np.asarray(ghi, dtype=np.float64)
+        ghi = np.where(np.isnan(ghi), estimate, np.clip(ghi, 0, None))
+    dni, dhi = decompose(ghi, zenith, e0)
+    poa = plane_of_array(ghi, dni, dhi, zenith, azimuth, system.tilt, system.azimuth, system.albedo)
+    temp = 25.0 if temp is None else np.nan_to_num(np.asarray(temp, dtype=np.float64), nan=25.0)
+    wind = 1.0 if wind is None else np.nan_to_num(np.asarray(wind, dtype=np.float64), nan=1.0)
+    derate = 1 + system.temp_coefficient * (cell_temperature(poa, temp, wind) - 25)
+    return np.clip(system.peak_kw * poa / 1000 * derate * (1 - system.losses), 0, None)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Solar production model shared by ``train_solar_model.py`` and ``prediction_solar.py``.
+
+The model maps recent production (lags), the weather (clouds, temp, wind)
+and the physical model's output for that weather (``pv_kw``, ``pv_model.py``)
+to production. ``train_solar_model.py`` fits it on the last
+``solar_training_days`` of production joined to the weather of those days
+and saves the artifact; ``prediction_solar.py`` only loads it and retrains
+when ``retrain_reason`` says the model is stale:
+
+    solar_training_days          days of production the model is fitted on (default 14)
+    solar_retrain_hours          retrain once production data has moved this far past
+                                 the model's ``trained_through`` watermark (default 24)
+    solar_max_model_age_hours    retrain a model older than this regardless (default 168)
+    solar_archive_training_days  with a weather archive (``weather_archive.py``), train on
+                                 up to this many days of archived forecasts (default 365)
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from align import align_frame
+from features import build_matrix, complete_rows, to_ns
+from influx_stream import series_frame
+from model_backends import make_model
+from pv_model import PVSystem, power
+from weather_cache import open_meteo, openweathermap
+
+MODEL_PATH = "/opt/loxberry/data/plugins/consumption_prediction/solar_model.pkl"
+TRAINING_DAYS = 14
+RETRAIN_HOURS = 24
+MAX_MODEL_AGE_HOURS = 168
+ARCHIVE_TRAINING_DAYS = 365
+# Furthest a production step or forecast step may be from a weather row (OpenWeatherMap is 3-hourly)
+WEATHER_TOLERANCE = pd.Timedelta("4h")
+
+
+# ---------------- Data ----------------
+def fetch_production(influx, start, resolution):
+    """Per-step mean production since ``start`` (a Flux duration or time) as a datetime/production_kwh frame."""
+    times, values = influx.read_series(f'''
+from(bucket: "{influx.bucket}")
+|> range(start: {start})
+|> filter(fn: (r) => r["_measurement"] == "solar_production" and r["_field"] == "production_kwh")
+|> aggregateWindow(every: {resolution}m, fn: mean, createEmpty: false, timeSrc: "_start")
+|> keep(columns: ["_time", "_value"])
+''')
+    return series_frame(times, values, "production_kwh")
+
+
+def add_pv(frame, lat, lon, pv=None):
+    """``frame`` with a ``pv_kw`` column: ``pv_model.power`` of ``pv`` (a PVSystem) for its weather."""
+    radiation = frame["radiation"].to_numpy() if "radiation" in frame else np.full(len(frame), np.nan)
+    # Open-Meteo radiation is the mean over the preceding hour; cloud cover is for the hour itself
+    times = to_ns(frame["datetime"]) - np.where(np.isnan(radiation), 0, 1800 * 10**9)
+    return frame.assign(pv_kw=power(pv or PVSystem(), times, lat, lon, radiation, frame.get("temp"),
+                                    frame.get("wind"), frame.get("clouds")))
+
+
+def fetch_weather(cache, provider, lat, lon, hours, resolution, exogenous, api_key=None, past_days=0,
+                  archive=None, pv=None, log=print):
+    """``(frame, status)``: the forecast rows, sorted by UTC ``datetime``, with every ``exogenous`` column set.
+
+    Rows stay at the provider's own spacing; ``align.align_frame`` puts them
+    on the production or forecast steps. ``past_days`` only applies to
+    Open-Meteo; OpenWeatherMap has no past weather, so its forecasts only
+    cover the newest few training rows. A newly downloaded forecast is
+    recorded in ``archive`` (a ``WeatherArchive``) when one is given.
+    Raises WeatherUnavailable, or ValueError when the response holds no rows.
+    """
+    if provider == "openweathermap":
+        frame, status = openweathermap(cache, lat, lon, api_key)
+    else:
+        frame, _, status = open_meteo(cache, lat, lon, hours, resolution, past_days=past_days)
+    if archive is not None and status == "fetched":
+        try:
+            archive.record(frame)
+        except OSError as e:
+            log(f"[warning] Could not archive the weather forecast: {e}")
+    frame = add_pv(frame, lat, lon, pv).dropna(subset=exogenous)
+    if frame.empty:
+        raise ValueError("No forecast data found in API response.")
+    frame = frame.sort_values("datetime").drop_duplicates("datetime", keep="last")
+    return frame.reset_index(drop=True), status
+
+
+def training_data(influx, cache, provider, lat, lon, hours, resolution, exogenous, api_key=None,
+                  days=TRAINING_DAYS, archive=None, archive_days=ARCHIVE_TRAINING_DAYS, pv=None, log=print):
+    """``(production, weather)`` to train on.
+
+    Without an archive that is the last ``days`` of production and the
+    provider's weather for them. With one, the window reaches back to the
+    oldest archived forecast (at most ``archive_days``), and the archive
+    fills in the weather before the first row of the provider's response.
+    Once the archive covers the last ``days``, the provider is asked for the
+    forecast window only: the same request as the forecast, so it is served
+    from the weather cache instead of costing a fetch of its own. Until then
+    ``past_days`` are requested, and archived with the rest of the response.
+    """
+    window_start = pd.Timestamp.now(tz="UTC").floor("h") - pd.Timedelta(days=days)
+    archived_from = archive.start() if archive is not None else None
+    past_days = 0 if archived_from is not None and archived_from <= window_start else days
+    weather, status = fetch_weather(cache, provider, lat, lon, hours, resolution, exogenous, api_key,
+                                    past_days=past_days, archive=archive, pv=pv, log=log)
+    start = window_start
+    if archive is not None:
+        archived = add_pv(archive.read(end=weather["datetime"].iloc[0]), lat, lon, pv).dropna(subset=exogenous)
+        archived = archived[archived["datetime"] >= pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=archive_days)]
+        if not archived.empty:
+            start = min(start, archived["datetime"].iloc[0])
+            weather = pd.concat([archived.drop(columns="issued"), weather], ignore_index=True)
+        log(f"Weather for training: {len(archived)} archived rows, {len(weather) - len(archived)} "
+            f"from {provider} ({status}).")
+    production = fetch_production(influx, start.strftime("%Y-%m-%dT%H:%M:%SZ"), resolution)
+    return production, weather
+
+
+# ---------------- Training ----------------
+def training_rows(spec, production, weather, tolerance=WEATHER_TOLERANCE):
+    """(X, y, times) of every production step with weather within ``tolerance`` and complete lags."""
+    # Reindex onto a gapless grid so shift(n) always means n steps, as prediction_solar.py's history does;
+    # steps without production or weather leave NaN features and are dropped
+    production = (production.drop_duplicates("datetime", keep="last").set_index("datetime").sort_index()
+                  .asfreq(f"{spec.get('resolution_minutes', 60)}min").reset_index())
+    exogenous = align_frame(production["datetime"], weather, spec["exogenous"], tolerance)
+    target = production["production_kwh"].to_numpy()
+    X = build_matrix(spec, production["datetime"], target, exogenous)
+    keep = complete_rows(X, target)
+    return X[keep], target[keep], production["datetime"][keep]
+
+
+def train(spec, backend, production, weather):
+    """``(model, metadata)`` fitted on ``production`` joined to ``weather``; ValueError when no row is usable."""
+    X, y, times = training_rows(spec, production, weather)
+    if len(y) == 0:
+        raise ValueError("no training rows after joining production and weather")
+    started = time.perf_counter()
+    model = make_model(backend, spec)
+    model.fit(X, y)
+    metadata = {
+        "backend": backend,
+        "feature_spec": spec,
+        "training_range": {"start": times.iloc[0].isoformat(), "end": times.iloc[-1].isoformat()},
+        "rows": int(len(y)),
+        "trained_through": times.iloc[-1].isoformat(),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "training_seconds": round(time.perf_counter() - started, 3),
+    }
+    return model, metadata
+
+
+def retrain_reason(header, spec, backend, data_through, retrain_hours=RETRAIN_HOURS,
+                   max_age_hours=MAX_MODEL_AGE_HOURS, now=None):
+    """Why the saved model must be retrained before forecasting, or None when it can be used.
+
+    ``data_through`` is the (UTC) time of the newest production step.
+    """
+    now = now or datetime.now(timezone.utc)
+    if header is None:
+        return "no existing model"
+    if header.get("feature_spec") != spec:
+        return "feature spec changed"
+    if header.get("backend") != backend:
+        return f"backend changed to '{backend}'"
+    if not header.get("trained_through") or not header.get("trained_at"):
+        return "existing model has no training watermark"
+    age = now - datetime.fromisoformat(header["trained_at"])
+    if age > timedelta(hours=max_age_hours):
+        return f"model is {age.total_seconds() / 3600:.0f}h old"
+    moved = data_through - datetime.fromisoformat(header["trained_through"])
+    if moved >= timedelta(hours=retrain_hours):
+        return f"{moved.total_seconds() / 3600:.0f}h of new production data"
+    return None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Routing table mapping MQTT topics to InfluxDB series.
+
+Routes are configured in settings.json under ``mqtt_routes``::
+
+    "mqtt_routes": [
+        {"topic": "home/energy/consumption", "measurement": "energy_consumption", "field": "consumption_kwh"},
+        {"topic": "home/meters/+/power", "measurement": "submeter_power", "field": "power_w",
+         "tags": {"meter": "{2}"}, "parser": "json", "json_path": "data.value"},
+        {"topic": "home/energy/logs", "parser": "log"}
+    ]
+
+``topic`` may use the MQTT ``+`` and ``#`` wildcards. Tag values may refer to
+topic levels by index (``{2}`` is the third level). ``parser`` is ``float``
+(default), ``json`` (with a dotted ``json_path``, list indexes allowed) or
+``log``, which writes the payload to the daemon log instead of InfluxDB.
+
+Patterns are compiled into a trie over topic levels, so resolving a topic
+costs one step per level however many routes there are, and every resolved
+topic is cached. When several routes match, the first one listed wins.
+"""
+
+import json
+
+PARSERS = ("float", "json", "log")
+CACHE_SIZE = 10000
+
+# Trie key for routes ending at a node; '/' can never be a topic level
+_END = "/"
+
+
+class Route:
+    __slots__ = ("index", "pattern", "measurement", "field", "tags", "parser", "json_path", "options")
+
+    def __init__(self, index, config):
+        self.index = index
+        self.pattern = config["topic"]
+        self.parser = config.get("parser", "float")
+        if self.parser not in PARSERS:
+            raise ValueError(f"Route '{self.pattern}': unknown parser '{self.parser}', expected one of {PARSERS}")
+        if self.parser != "log" and not (config.get("measurement") and config.get("field")):
+            raise ValueError(f"Route '{self.pattern}': 'measurement' and 'field' are required")
+        self.measurement = config.get("measurement")
+        self.field = config.get("field")
+        self.tags = dict(config.get("tags") or {})
+        path = config.get("json_path", "")
+        self.json_path = [int(p) if p.isdigit() else p for p in path.split(".") if p]
+        # Extra keys (e.g. per-route compression settings) for later pipeline stages
+        self.options = config
+
+
+class ResolvedRoute:
+    """A route bound to one concrete topic, with its tag templates filled in."""
+    __slots__ = ("route", "topic", "measurement", "field", "tags", "parser", "json_path")
+
+    def __init__(self, route, topic):
+        levels = topic.split("/")
+        self.route = route
+        self.topic = topic
+        self.measurement = route.measurement
+        self.field = route.field
+        self.tags = {key: _fill(value, levels) for key, value in route.tags.items()} or None
+        self.parser = route.parser
+        self.json_path = route.json_path
+
+    def parse(self, payload):
+        """Turn a decoded payload into a float. Raises ValueError on bad input."""
+        if self.parser == "float":
+            return float(payload)
+        try:
+            value = json.loads(payload)
+            for key in self.json_path:
+                value = value[key]
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"no value at '{'.'.join(map(str, self.json_path))}': {e}") from None
+        return float(value)
+
+
+def _fill(template, levels):
+    if "{" not in template:
+        return template
+    try:
+        return template.format(*levels)
+    except (IndexError, KeyError, ValueError):
+        return template
+
+
+class TopicRouter:
+    def __init__(self, routes_config):
+        self.routes = [Route(i, cfg) for i, cfg in enumerate(routes_config)]
+        self._exact = {}
+        self._trie = {}
+        for route in self.routes:
+            if "+" in route.pattern or "#" in route.pattern:
+                self._insert(route)
+            else:
+                self._exact.setdefault(route.pattern, route)
+        self._cache = {}
+
+    def _insert(self, route):
+        node = self._trie
+        levels = route.pattern.split("/")
+        for i, level in enumerate(levels):
+            if level == "#":
+                if i != len(levels) - 1:
+                    raise ValueError(f"Route '{route.pattern}': '#' must be the last level")
+                node.setdefault("#", []).append(route)
+                return
+            node = node.setdefault(level, {})
+        node.setdefault(_END, []).append(route)
+
+    def subscriptions(self):
+        """Unique topic patterns to subscribe to, in route order."""
+        return list(dict.fromkeys(route.pattern for route in self.routes))
+
+    def resolve(self, topic):
+        """Return the ResolvedRoute for ``topic`` or None if no route matches."""
+        resolved = self._cache.get(topic)
+        if resolved is not None or topic in self._cache:
+            return resolved
+
+        best = self._exact.get(topic)
+        for route in self._match(topic.split("/")):
+            if best is None or route.index < best.index:
+                best = route
+        resolved = ResolvedRoute(best, topic) if best is not None else None
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[topic] = resolved
+        return resolved
+
+    def _match(self, levels):
+        matches = []
+        nodes = [self._trie]
+        for i, level in enumerate(levels):
+            # Wildcards at the first level don't match $SYS-style topics
+            wildcards = not (i == 0 and level.startswith("$"))
+            next_nodes = []
+            for node in nodes:
+                if wildcards:
+                    matches.extend(node.get("#", ()))
+                    if "+" in node:
+                        next_nodes.append(node["+"])
+                if level in node:
+                    next_nodes.append(node[level])
+            nodes = next_nodes
+            if not nodes:
+                return matches
+        for node in nodes:
+            matches.extend(node.get(_END, ()))
+            # "a/#" also matches "a" itself
+            matches.extend(node.get("#", ()))
+        return matches
+
+
+def default_routes(settings):
+    """Routes equivalent to the single consumption/production topic settings."""
+    routes = []
+    if settings.get("mqtt_topic_consumption"):
+        routes.append({"topic": settings["mqtt_topic_consumption"],
+                       "measurement": "energy_consumption", "field": "consumption_kwh"})
+    if settings.get("mqtt_topic_production"):
+        routes.append({"topic": settings["mqtt_topic_production"],
+                       "measurement": "solar_production", "field": "production_kwh"})
+    routes.append({"topic": "home/energy/logs", "parser": "log"})
+    return routes
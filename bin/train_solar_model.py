@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+from plugin_log import get_logger
+from influx_db import get_influx
+from weather_cache import PROVIDERS, WeatherUnavailable, cache_from_settings, location
+from weather_archive import archive_from_settings
+from pv_model import system_from_settings
+from features import SOLAR_SPEC, save_spec, with_resolution
+from model_backends import DEFAULT_BACKEND
+from model_artifact import store_model
+from solar_model import ARCHIVE_TRAINING_DAYS, MODEL_PATH, TRAINING_DAYS, train, training_data
+
+# ---------------- Logging Setup ----------------
+LOGFILE = "/opt/loxberry/data/plugins/consumption_prediction/train_solar_model.log"
+
+logger = get_logger("train_solar_model", LOGFILE, tag="SOLAR", console=True)
+log = logger.info
+
+log("Starting solar model training script.")
+
+# ---------------- Config & Settings ----------------
+SETTINGS_PATH = "/opt/loxberry/data/plugins/consumption_prediction/settings.json"
+
+try:
+    with open(SETTINGS_PATH, "r") as f:
+        settings = json.load(f)
+    WEATHER_PROVIDER = settings.get("weather_provider", "open-meteo")
+    API_KEY = settings.get("openweathermap_api_key")
+    LOCATION = location(settings)
+    MODEL_BACKEND = settings.get("solar_model_backend", settings.get("model_backend", DEFAULT_BACKEND))
+    MODEL_FORMAT = settings.get("model_format", "packed")
+    MODEL_COMPRESSION = settings.get("model_compression")
+    FORECAST_HOURS = int(settings.get("forecast_horizon_hours", 24))
+    RESOLUTION = int(settings.get("forecast_resolution_minutes", 60))
+    TRAINING_DAYS = int(settings.get("solar_training_days", TRAINING_DAYS))
+    ARCHIVE_TRAINING_DAYS = int(settings.get("solar_archive_training_days", ARCHIVE_TRAINING_DAYS))
+    PV = system_from_settings(settings)
+    spec = with_resolution(SOLAR_SPEC, RESOLUTION)
+    if WEATHER_PROVIDER not in PROVIDERS:
+        log(f"[error] Unknown weather_provider '{WEATHER_PROVIDER}', expected one of {PROVIDERS}")
+        sys.exit(1)
+    if LOCATION is None or (WEATHER_PROVIDER == "openweathermap" and not API_KEY):
+        log("[error] Missing API key or location in settings.json")
+        sys.exit(1)
+    LAT, LON = LOCATION
+except Exception as e:
+    log(f"[error] Failed to load settings.json: {e}")
+    sys.exit(1)
+
+# ---------------- InfluxDB Client ----------------
+try:
+    influx = get_influx(settings)
+except Exception as e:
+    log(f"[error] Failed to connect to InfluxDB: {e}")
+    sys.exit(1)
+
+# ---------------- Training Data ----------------
+# The weather of the training days (Open-Meteo), extended back by the forecast archive
+try:
+    production, weather = training_data(influx, cache_from_settings(settings, log=log), WEATHER_PROVIDER, LAT, LON,
+                                        FORECAST_HOURS, RESOLUTION, spec["exogenous"], API_KEY, TRAINING_DAYS,
+                                        archive_from_settings(settings, WEATHER_PROVIDER), ARCHIVE_TRAINING_DAYS,
+                                        pv=PV, log=log)
+    log(f"Solar production data queried from InfluxDB: {len(production)} {RESOLUTION}-minute rows; "
+        f"{len(weather)} weather rows.")
+except (WeatherUnavailable, ValueError) as e:
+    log(f"[error] {e}")
+    sys.exit(1)
+except Exception as e:
+    log(f"[error] Failed to query solar production data: {e}")
+    sys.exit(1)
+
+if len(production) < 48 * 60 // RESOLUTION:
+    log("[warning] Not enough solar production data (need at least 2 days). Exiting.")
+    sys.exit(0)
+
+# ---------------- Train & Save ----------------
+started = time.perf_counter()
+try:
+    model, metadata = train(spec, MODEL_BACKEND, production, weather)
+    log(f"Solar model trained on {metadata['rows']} rows ({MODEL_BACKEND}) in {metadata['training_seconds']:.1f}s.")
+except Exception as e:
+    log(f"[error] Model training failed: {e}")
+    sys.exit(1)
+
+try:
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    saved = store_model(model, MODEL_PATH, metadata, MODEL_FORMAT, compression=MODEL_COMPRESSION)
+    save_spec(spec, MODEL_PATH)
+    log(f"Model saved to {saved} ({os.path.getsize(saved) / 1024:.0f} KB) in {time.perf_counter() - started:.1f}s.")
+except Exception as e:
+    log(f"[error] Failed to save model: {e}")
+    sys.exit(1)
+
+log("Solar model training complete.")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Local archive of every weather forecast the solar scripts download.
+
+A forecast provider only serves the next few days (plus, for Open-Meteo,
+``past_days`` of modelled weather), so without an archive the solar model
+can only train on the production that overlaps the current response. Each
+downloaded forecast is appended here, and training joins months of it with
+the actual ``solar_production``.
+
+Rows are (issue time, valid time, clouds, temp, wind, radiation): the issue
+time is when the forecast was downloaded, the valid time the hour it is
+for. They are stored per provider and per month of valid time, in the
+layout of ``history_cache.py``::
+
+    weather_archive/<provider>/YYYY-MM.valid.npy    int64 UTC ns, sorted
+    weather_archive/<provider>/YYYY-MM.issued.npy   int64 UTC ns
+    weather_archive/<provider>/YYYY-MM.<column>.npy float32, NaN when the provider has no such column
+
+Partitions are sorted by (valid, issued), so a range read is one
+``searchsorted`` per memory-mapped month and the latest forecast of each
+hour is the last row of its run.
+
+Optional keys in settings.json:
+    weather_archive        false disables archiving and training on the archive (default true)
+    weather_archive_days   months entirely older than this are deleted (default 730)
+"""
+
+import fcntl
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from plugin_settings import flag
+
+ARCHIVE_DIR = "/opt/loxberry/data/plugins/consumption_prediction/weather_archive"
+RETENTION_DAYS = 730
+COLUMNS = ("clouds", "temp", "wind", "radiation")
+
+
+class WeatherArchive:
+    def __init__(self, directory, retention_days=RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------------- Partitions ----------------
+    def months(self):
+        return sorted(name[:7] for name in os.listdir(self.directory) if name.endswith(".valid.npy"))
+
+    def _path(self, month, column):
+        return os.path.join(self.directory, f"{month}.{column}.npy")
+
+    def load_month(self, month, mmap=True):
+        """``{"valid", "issued", *COLUMNS}`` arrays of one month."""
+        mode = "r" if mmap else None
+        return {column: np.load(self._path(month, column), mmap_mode=mode)
+                for column in ("valid", "issued") + COLUMNS}
+
+    # ---------------- Write ----------------
+    def record(self, frame, issued=None):
+        """Append a forecast frame (UTC ``datetime`` plus any of COLUMNS); returns the rows written.
+
+        ``issued`` (UTC ns, default: now, floored to the hour) is the
+        forecast's issue time. Recording a valid time again with the same
+        issue time replaces that row; the other rows of that issue time (from
+        a different request in the same hour) are kept.
+        """
+        if issued is None:
+            issued = int(time.time()) // 3600 * 3600 * 10**9
+        frame = frame.dropna(subset=[column for column in COLUMNS if column in frame], how="all")
+        if frame.empty:
+            return 0
+        valid = pd.DatetimeIndex(frame["datetime"]).as_unit("ns").asi8
+        rows = {"valid": valid, "issued": np.full(len(valid), issued, dtype="int64")}
+        for column in COLUMNS:
+            rows[column] = (frame[column].to_numpy(dtype="float32") if column in frame
+                            else np.full(len(valid), np.nan, dtype="float32"))
+
+        months = valid.astype("datetime64[ns]").astype("datetime64[M]")
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            # get_solar_prediction.py and prediction_solar.py may record at the same time
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            for month in np.unique(months):
+                in_month = months == month
+                self._merge_month(str(month), {column: values[in_month] for column, values in rows.items()})
+            self._prune()
+        return len(valid)
+
+    def _merge_month(self, month, rows):
+        if os.path.exists(self._path(month, "valid")):
+            old = self.load_month(month, mmap=False)
+            # Only (issued, valid) pairs recorded again are replaced
+            keep = (old["issued"] != rows["issued"][0]) | ~np.isin(old["valid"], rows["valid"])
+            rows = {column: np.concatenate([old[column][keep], rows[column]]) for column in rows}
+        order = np.lexsort((rows["issued"], rows["valid"]))
+        for column, values in rows.items():
+            path = self._path(month, column)
+            tmp = path + ".tmp.npy"
+            np.save(tmp, values[order])
+            os.replace(tmp, path)
+
+    def _prune(self):
+        cutoff = (np.datetime64(int(time.time()), "s") - np.timedelta64(self.retention_days, "D")).astype("datetime64[M]")
+        for month in self.months():
+            # Only whole months before the cutoff month are dropped
+            if np.datetime64(month, "M") < cutoff:
+                for column in ("valid", "issued") + COLUMNS:
+                    os.remove(self._path(month, column))
+
+    # ---------------- Read ----------------
+    def start(self):
+        """UTC Timestamp of the oldest archived valid time, or None when empty."""
+        for month in self.months():
+            valid = self.load_month(month)["valid"]
+            if len(valid):
+                return pd.Timestamp(int(valid[0]), tz="UTC")
+        return None
+
+    def read(self, start=None, end=None):
+        """Latest archived forecast of every valid time in [start, end) as a frame.
+
+        Columns are ``datetime`` (UTC), ``issued`` (UTC) and COLUMNS. Only
+        the months overlapping the range are opened, and each is cut with
+        ``searchsorted`` on its memory-mapped valid times.
+        """
+        start_ns = None if start is None else pd.Timestamp(start).tz_convert("UTC").value
+        end_ns = None if end is None else pd.Timestamp(end).tz_convert("UTC").value
+        parts = []
+        for month in self.months():
+            month_start = np.datetime64(month, "M").astype("datetime64[ns]").astype("int64")
+            month_end = (np.datetime64(month, "M") + 1).astype("datetime64[ns]").astype("int64")
+            if (end_ns is not None and month_start >= end_ns) or (start_ns is not None and month_end <= start_ns):
+                continue
+            data = self.load_month(month)
+            valid = data["valid"]
+            first = 0 if start_ns is None else np.searchsorted(valid, start_ns, side="left")
+            last = len(valid) if end_ns is None else np.searchsorted(valid, end_ns, side="left")
+            if last > first:
+                parts.append({column: np.asarray(values[first:last]) for column, values in data.items()})
+        if not parts:
+            return pd.DataFrame({"datetime": pd.DatetimeIndex([], tz="UTC"),
+                                 "issued": pd.DatetimeIndex([], tz="UTC"),
+                                 **{column: np.empty(0, dtype="float32") for column in COLUMNS}})
+        rows = {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+        # Sorted by (valid, issued): the last row of each valid time is its latest forecast
+        latest = np.append(rows["valid"][1:] != rows["valid"][:-1], True)
+        frame = pd.DataFrame({"datetime": pd.to_datetime(rows["valid"][latest], utc=True),
+                              "issued": pd.to_datetime(rows["issued"][latest], utc=True)})
+        for column in COLUMNS:
+            frame[column] = rows[column][latest]
+        return frame
+
+
+def archive_from_settings(settings, provider, directory=ARCHIVE_DIR):
+    """The archive of ``provider``'s forecasts, or None when ``weather_archive`` is off."""
+    if not flag(settings, "weather_archive", True):
+        return None
+    return WeatherArchive(os.path.join(directory, provider),
+                          retention_days=int(settings.get("weather_archive_days", RETENTION_DAYS)))
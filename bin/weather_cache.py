@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Weather forecasts for the solar scripts, cached on disk.
+
+Responses are cached per provider, location (rounded to 4 decimals) and
+variables in ``weather_cache/<provider>-<key>.json``. A cached forecast
+younger than the TTL is used as is; an older one is revalidated with
+``If-None-Match`` / ``If-Modified-Since``, so an unchanged forecast costs a
+304 instead of a download. When the provider is slow or failing, a cached
+forecast up to ``weather_max_stale_seconds`` old is used instead of aborting
+the run. A lock file per key makes scripts running at the same time share
+one request.
+
+Both scripts request the same Open-Meteo variables, so one fetch per
+forecast cycle serves ``get_solar_prediction.py`` and ``prediction_solar.py``.
+
+Optional keys in settings.json:
+    weather_provider           "open-meteo" (default) or "openweathermap" for prediction_solar.py
+    weather_cache_ttl_seconds  age at which a cached forecast is revalidated (default 3600)
+    weather_max_stale_seconds  oldest forecast used when the provider fails (default 43200)
+    weather_timeout_seconds    request timeout (default 10)
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate
+
+import numpy as np
+import pandas as pd
+import requests
+
+CACHE_DIR = "/opt/loxberry/data/plugins/consumption_prediction/weather_cache"
+DEFAULT_TTL = 3600
+DEFAULT_MAX_STALE = 12 * 3600
+DEFAULT_TIMEOUT = 10
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+OPENWEATHERMAP_URL = "https://api.openweathermap.org/data/2.5/forecast"
+# Open-Meteo variable -> column name used by the solar model and scripts
+OPEN_METEO_VARIABLES = {
+    "shortwave_radiation": "radiation",
+    "cloud_cover": "clouds",
+    "temperature_2m": "temp",
+    "wind_speed_10m": "wind",
+}
+PROVIDERS = ("open-meteo", "openweathermap")
+# Request parameters that never become part of the cache key or the cache file
+_SECRETS = ("appid",)
+
+
+class WeatherUnavailable(Exception):
+    """No forecast from the provider and none usable in the cache."""
+
+
+class WeatherCache:
+    def __init__(self, directory=CACHE_DIR, ttl=DEFAULT_TTL, max_stale=DEFAULT_MAX_STALE,
+                 timeout=DEFAULT_TIMEOUT, session=None, log=print):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.log = log
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(provider, lat, lon, params):
+        """Cache key of a request: provider, rounded location and the non-secret parameters."""
+        identity = {name: value for name, value in params.items() if name not in _SECRETS}
+        identity.update(provider=provider, lat=round(float(lat), 4), lon=round(float(lon), 4))
+        digest = hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:16]
+        return f"{provider}-{digest}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def get(self, provider, url, params, lat, lon):
+        """``(data, status)`` for a JSON request; status is fresh, revalidated, fetched or stale.
+
+        Raises WeatherUnavailable when the request fails and nothing usable is cached.
+        """
+        key = self.key(provider, lat, lon, params)
+        with open(self._path(key) + ".lock", "w") as lock:
+            # Held while fetching: a second script waits and then finds a fresh entry
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._get_locked(key, url, params)
+
+    def _get_locked(self, key, url, params):
+        entry = self._read(key)
+        now = time.time()
+        if entry is not None and now - entry["fetched_at"] < self.ttl:
+            return entry["data"], "fresh"
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            headers["If-Modified-Since"] = entry.get("last_modified") or formatdate(entry["fetched_at"], usegmt=True)
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and entry is not None:
+                entry["fetched_at"] = now
+                self._write(key, entry)
+                return entry["data"], "revalidated"
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            if entry is not None and now - entry["fetched_at"] <= self.max_stale:
+                self.log(f"[warning] Weather request failed ({e}); using the forecast cached "
+                         f"{(now - entry['fetched_at']) / 3600:.1f}h ago.")
+                return entry["data"], "stale"
+            raise WeatherUnavailable(f"Weather request failed and no usable cached forecast: {e}") from e
+
+        self._write(key, {"fetched_at": now, "etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified"), "data": data})
+        return data, "fetched"
+
+
+def cache_from_settings(settings, log=print, directory=CACHE_DIR):
+    return WeatherCache(directory,
+                        ttl=float(settings.get("weather_cache_ttl_seconds", DEFAULT_TTL)),
+                        max_stale=float(settings.get("weather_max_stale_seconds", DEFAULT_MAX_STALE)),
+                        timeout=float(settings.get("weather_timeout_seconds", DEFAULT_TIMEOUT)),
+                        log=log)
+
+
+def location(settings):
+    """(lat, lon) from ``latitude``/``longitude`` or the older ``LAT``/``LON`` keys; None when missing."""
+    lat = settings.get("latitude") or settings.get("LAT")
+    lon = settings.get("longitude") or settings.get("LON")
+    if lat in (None, "") or lon in (None, ""):
+        return None
+    return float(lat), float(lon)
+
+
+# ---------------- Providers ----------------
+def _open_meteo_frame(block, variables):
+    frame = pd.DataFrame({"datetime": pd.to_datetime(np.asarray(block.get("time", []), dtype="int64"),
+                                                     unit="s", utc=True)})
+    for variable in variables:
+        values = block.get(variable)
+        frame[OPEN_METEO_VARIABLES[variable]] = np.nan if values is None else np.asarray(values, dtype="float64")
+    return frame
+
+
+def open_meteo(cache, lat, lon, hours, resolution=60, past_days=0, url=OPEN_METEO_URL):
+    """``(hourly, minutely_15, status)`` frames with UTC ``datetime`` and radiation/clouds/temp/wind.
+
+    Below an hour's resolution the same request also asks for 15-minute
+    radiation; ``minutely_15`` is None otherwise. ``past_days`` adds the
+    modelled weather of the days before, for training.
+    """
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(OPEN_METEO_VARIABLES),
+        "forecast_hours": hours,
+        "wind_speed_unit": "ms",
+        "timeformat": "unixtime",
+    }
+    if past_days:
+        params["past_days"] = past_days
+    if resolution < 60:
+        params.update(minutely_15="shortwave_radiation", forecast_minutely_15=hours * 4)
+    data, status = cache.get("open-meteo", url, params, lat, lon)
+    hourly = _open_meteo_frame(data.get("hourly", {}), OPEN_METEO_VARIABLES)
+    minutely = _open_meteo_frame(data["minutely_15"], ["shortwave_radiation"]) if "minutely_15" in data else None
+    return hourly, minutely, status
+
+
+def openweathermap(cache, lat, lon, api_key, url=OPENWEATHERMAP_URL):
+    """``(frame, status)``: OpenWeatherMap's 3-hourly forecast with UTC ``datetime``, clouds, temp and wind."""
+    data, status = cache.get("openweathermap", url, {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"},
+                             lat, lon)
+    entries = data.get("list", [])
+    frame = pd.DataFrame({
+        "datetime": pd.to_datetime([entry["dt"] for entry in entries], unit="s", utc=True),
+        "clouds": [entry["clouds"]["all"] for entry in entries],
+        "temp": [entry["main"]["temp"] for entry in entries],
+        "wind": [entry["wind"]["speed"] for entry in entries],
+    })
+    return frame, status
@@ -1,6 +1,10 @@
 <?php
+require_once "log_tail.php";
+
 $log_dir = "/opt/loxberry/data/plugins/consumption_prediction/";
-$log_files = ["mqtt_daemon.log", "prediction.log", "train_model.log", "eval.log", "send_predictions.log"];
+$log_files = ["mqtt_daemon.log", "prediction.log", "forecast_service.log", "prediction_solar.log", "solar_forecast.log",
+              "train_model.log", "train_solar_model.log", "eval.log", "loxone_publish.log", "archive_weather.log",
+              "fleet.log"];
 
 $selected_log = $_GET['log'] ?? 'mqtt_daemon.log';
 $log_path = realpath($log_dir . basename($selected_log));
@@ -12,8 +16,8 @@ if (!$log_path || strpos($log_path, realpath($log_dir)) !== 0 || !in_array(basen
     exit;
 }
 
-$lines = file($log_path, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES);
-$lines = array_reverse($lines);
+$count = max(1, min(5000, intval($_GET['lines'] ?? 500)));
+$lines = tail_log_lines($log_path, $count);
 
 header('Content-Type: application/json');
 echo json_encode($lines);
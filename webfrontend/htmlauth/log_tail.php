@@ -0,0 +1,56 @@
+<?php
+// Returns the last $count lines of a plugin log, newest first.
+// Uses the <logfile>.idx sidecar written by bin/plugin_log.py to seek straight to
+// the tail; falls back to reading backwards from the end of the file in blocks when
+// the index is missing, stale or holds fewer than $count lines.
+function tail_log_lines($log_path, $count = 500) {
+    $size = @filesize($log_path);
+    if (!$size) {
+        return [];
+    }
+
+    $start = null;
+    $index = @json_decode(@file_get_contents($log_path . ".idx"), true);
+    // The index holds the newest TAIL_LINES offsets, unless the whole file is shorter
+    if (is_array($index) && !empty($index['offsets'])
+            && (count($index['offsets']) >= $count || $index['offsets'][0] === 0)) {
+        $offsets = $index['offsets'];
+        $offset = $offsets[max(0, count($offsets) - $count)];
+        if ($offset >= 0 && $offset < $size) {
+            $start = $offset;
+        }
+    }
+
+    $handle = fopen($log_path, 'rb');
+    if (!$handle) {
+        return [];
+    }
+
+    // The offset must sit at the start of a line, otherwise the index is stale
+    if ($start !== null && $start > 0) {
+        fseek($handle, $start - 1);
+        if (fread($handle, 1) !== "\n") {
+            $start = null;
+        }
+    }
+
+    if ($start === null) {
+        $block = 65536;
+        $start = $size;
+        $newlines = 0;
+        while ($start > 0 && $newlines <= $count) {
+            $read = min($block, $start);
+            $start -= $read;
+            fseek($handle, $start);
+            $newlines += substr_count(fread($handle, $read), "\n");
+        }
+    }
+
+    fseek($handle, $start);
+    $data = stream_get_contents($handle);
+    fclose($handle);
+
+    $lines = preg_split('/\r?\n/', $data, -1, PREG_SPLIT_NO_EMPTY);
+    return array_reverse(array_slice($lines, -$count));
+}
+?>
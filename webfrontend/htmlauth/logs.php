@@ -1,6 +1,7 @@
 <?php
 require_once "loxberry_web.php";
 require_once "loxberry_system.php";
+require_once "log_tail.php";
 
 $L = LBSystem::readlanguage("language.ini");
 $template_title = "Plugin Logs";
@@ -23,9 +24,15 @@ $log_dir = "/opt/loxberry/data/plugins/consumption_prediction/";
 $log_files = [
     "mqtt_daemon.log" => "MQTT Listener",
     "prediction.log" => "Prediction",
+    "forecast_service.log" => "Forecast Service",
+    "prediction_solar.log" => "Solar Prediction",
+    "solar_forecast.log" => "Solar Forecast",
     "train_model.log" => "Model Training",
+    "train_solar_model.log" => "Solar Model Training",
     "eval.log" => "Model Evaluation ",
-    "send_predictions.loh" => "Prediction Sending",
+    "loxone_publish.log" => "Prediction Sending",
+    "archive_weather.log" => "Weather Archive",
+    "fleet.log" => "Fleet",
 
 ];
 
@@ -37,9 +44,7 @@ $valid = ($log_path && strpos($log_path, realpath($log_dir)) === 0 && file_exist
 $log_lines = [];
 
 if ($valid) {
-    $log_lines = file($log_path, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES);
-    $log_lines = array_reverse($log_lines); // Newest entries first
-     $log_lines = array_slice($log_lines, 0, 500); // Only show the 500 newest lines
+    $log_lines = tail_log_lines($log_path, 500); // Only the 500 newest lines, newest first
 }
 ?>
 